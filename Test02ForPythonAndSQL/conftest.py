@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 测试公共夹具
+功能：在临时目录中建立带基础数据的数据库，供各模块的pytest测试使用
+作者：AI Assistant
+日期：2024
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from warehouse_manager_tool import WarehouseManagerTool
+
+
+def seed_database(tool: WarehouseManagerTool, items=(("K1", "一号库", 10, 2.5), ("K2", "二号库", 5, 4.0))):
+    """写入一个操作员、供应商、两个仓库和给定的库存"""
+    tool.add_operator("张三", "13800000000")
+    tool.add_supplier("S1", "供应商1", "李四", "13900000000")
+    tool.add_warehouse("一号库", "张三", "王五")
+    tool.add_warehouse("二号库", "张三", "赵六")
+    for item in items:
+        tool.add_inventory(*item)
+
+
+def make_tool(tmp_path, pool_readers: int = 0, **kwargs) -> WarehouseManagerTool:
+    """在tmp_path中新建带基础数据的数据库并连接，不生成Excel报表"""
+    db_path = str(tmp_path / "warehouse.db")
+    options = dict(report_delay=None, auto_report=False)
+    options.update(kwargs)
+    builder = WarehouseManagerTool(db_path, str(tmp_path / "report.xlsx"), **options)
+    builder.create_blank_database()
+    seed_database(builder)
+    if pool_readers == 0:
+        return builder
+    builder.close_database()
+    tool = WarehouseManagerTool(db_path, str(tmp_path / "report.xlsx"), pool_readers=pool_readers, **options)
+    tool.connect_database()
+    return tool
+
+
+@pytest.fixture
+def tool(tmp_path):
+    """已建库并写入基础数据的仓库管理工具（单连接）"""
+    tool = make_tool(tmp_path)
+    yield tool
+    tool.close_database()
+
+
+@pytest.fixture
+def pooled_tool(tmp_path):
+    """启用连接池的仓库管理工具，可被多个线程共享"""
+    tool = make_tool(tmp_path, pool_readers=2)
+    yield tool
+    tool.close_database()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - SQLite连接池
+功能：提供一个写连接和N个只读连接，按上下文管理器借出，
+      写连接由锁串行化，读连接在WAL模式下可与写入并行
+作者：AI Assistant
+日期：2024
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Union
+
+from connection_profiles import open_connection
+
+
+class ConnectionPool:
+    """一写多读的SQLite连接池"""
+
+    def __init__(self, db_path: str, readers: int = 4,
+                 writer_profile: Union[str, Dict, None] = "durable",
+                 reader_profile: Union[str, Dict, None] = "read-replica",
+                 checkout_timeout: Optional[float] = 30.0):
+        """
+        初始化连接池
+
+        Args:
+            db_path: 数据库文件路径
+            readers: 只读连接数量
+            writer_profile: 写连接的连接配置
+            reader_profile: 读连接的连接配置
+            checkout_timeout: 借出读连接的最长等待时间（秒），None表示一直等待
+        """
+        if readers < 1:
+            raise ValueError("只读连接数量至少为1")
+        self.db_path = db_path
+        self.checkout_timeout = checkout_timeout
+        # 连接会在不同线程间传递，借出期间只被一个线程使用
+        self.writer_connection = open_connection(db_path, writer_profile, check_same_thread=False)
+        self.write_lock = threading.RLock()
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._reader_profile = reader_profile
+        self._reader_count = readers
+        self._local = threading.local()
+        self._closed = False
+
+    def _open_readers(self):
+        """首次借出读连接时再打开，保证写连接已完成建表和结构升级"""
+        with self.write_lock:
+            if self._all_readers:
+                return
+            for _ in range(self._reader_count):
+                conn = open_connection(self.db_path, self._reader_profile, check_same_thread=False)
+                self._all_readers.append(conn)
+                self._readers.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Cursor]:
+        """
+        借出写连接的游标，退出时提交，发生异常时回滚
+
+        同一线程可以嵌套借出，只有最外层退出时才提交。
+        """
+        with self.write_lock:
+            depth = getattr(self._local, "write_depth", 0)
+            self._local.write_depth = depth + 1
+            cursor = self.writer_connection.cursor()
+            try:
+                yield cursor
+                if depth == 0:
+                    self.writer_connection.commit()
+            except Exception:
+                if depth == 0:
+                    self.writer_connection.rollback()
+                raise
+            finally:
+                cursor.close()
+                self._local.write_depth = depth
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Cursor]:
+        """借出一个只读连接的游标，退出时归还连接"""
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        if not self._all_readers:
+            self._open_readers()
+        try:
+            conn = self._readers.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"等待只读连接超时（{self.checkout_timeout} 秒）")
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            # 结束可能残留的读事务，避免长期占用WAL快照
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def close(self):
+        """关闭全部连接"""
+        self._closed = True
+        with self.write_lock:
+            self.writer_connection.close()
+        for conn in self._all_readers:
+            conn.close()
+        self._all_readers = []
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - Excel报表增量更新
+功能：记录入库/出库记录工作表的导出水位（rowid）；增量模式把流水工作表的sheetData缓存为XML片段，
+      每次只把水位之后的新行渲染后接在片段末尾，再与整体重写的快照工作表一起打包，不加载已有的工作簿
+作者：AI Assistant
+日期：2024
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+
+from excel_parallel import (
+    STYLE_HEADER, column_letter, column_widths, package_workbook, row_xml, write_sheet_rows
+)
+from row_source import REPORT_QUERIES, RowSource, report_query
+
+# 只增不改的流水工作表：工作表名 -> (数据表, 表头, 按rowid区间取数的SQL)
+LEDGER_SHEETS = {
+    "入库记录": (
+        "ruku",
+        ['入库编号', '货物编号', '货物名称', '数量', '单价', '入库日期', '供应商', '入库金额'],
+        '''
+            SELECT r.rukubianhao, r.huowubianhao, r.mingcheng, r.shuliang,
+                   r.danjia, r.rukuriqi, r.gongyingshangmingcheng,
+                   (r.shuliang * r.danjia) as 入库金额
+            FROM ruku r
+            WHERE r.rowid > ? AND r.rowid <= ?
+            ORDER BY r.rowid
+        '''
+    ),
+    "出库记录": (
+        "chuku",
+        ['出库编号', '货物编号', '货物名称', '数量', '单价', '出库日期', '出库金额'],
+        '''
+            SELECT c.chukubianhao, c.huowubianhao, c.mingcheng, c.shuliang,
+                   c.danjia, c.chukuriqi, (c.shuliang * c.danjia) as 出库金额
+            FROM chuku c
+            WHERE c.rowid > ? AND c.rowid <= ?
+            ORDER BY c.rowid
+        '''
+    ),
+}
+
+# 保存导出水位的隐藏工作表
+MARK_SHEET = "_导出水位"
+
+# 流水工作表片段缓存目录中的登记文件：工作表名 -> {水位, 水位处的单据编号, 行数, 片段字节数, 列宽}
+PARTS_INDEX = "parts.json"
+
+
+@contextmanager
+def read_snapshot(cursor: sqlite3.Cursor):
+    """在一个读事务中执行多条查询，保证水位与导出数据一致"""
+    conn = cursor.connection
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        cursor.execute("BEGIN")
+    try:
+        yield cursor
+    finally:
+        if own_transaction:
+            conn.commit()
+
+
+def read_ledger_marks(cursor: sqlite3.Cursor) -> Dict[str, int]:
+    """读取各流水表当前的最大rowid"""
+    marks = {}
+    for sheet_name, (table, _, _) in LEDGER_SHEETS.items():
+        cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}")
+        marks[sheet_name] = cursor.fetchone()[0]
+    return marks
+
+
+def write_mark_sheet(wb, marks: Dict[str, int]):
+    """把导出水位写入隐藏工作表"""
+    if MARK_SHEET in wb.sheetnames:
+        wb.remove(wb[MARK_SHEET])
+    ws = wb.create_sheet(title=MARK_SHEET)
+    ws.append(["工作表", "已导出rowid"])
+    for sheet_name, mark in marks.items():
+        ws.append([sheet_name, mark])
+    ws.sheet_state = "hidden"
+
+
+def write_rows_sheet(ws, source: RowSource):
+    """把行数据写入工作表，并设置表头样式、列宽和边框"""
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+
+    # 列宽在写入时顺带统计，不再回头扫描工作表
+    widths = [len(str(header)) for header in source.headers]
+    ws.append(source.headers)
+    for row in source.rows:
+        ws.append(row)
+        for index, value in enumerate(row):
+            length = len(str(value))
+            if length > widths[index]:
+                widths[index] = length
+
+    for cell in ws[1]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = min(width + 2, 50)
+
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    for row in ws.iter_rows(min_row=1, max_row=len(source) + 1, min_col=1, max_col=len(source.columns)):
+        for cell in row:
+            cell.border = thin_border
+
+
+def load_parts_index(cache_dir: str) -> Dict[str, Dict]:
+    """读取片段缓存的登记，不存在或损坏时返回空字典（全部流水工作表从头渲染）"""
+    try:
+        with open(os.path.join(cache_dir, PARTS_INDEX), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_parts_index(cache_dir: str, index: Dict[str, Dict]):
+    """先写临时文件再改名，登记与片段文件要么都是旧的要么都是新的"""
+    path = os.path.join(cache_dir, PARTS_INDEX)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def part_is_current(cursor: sqlite3.Cursor, table: str, entry: Optional[Dict],
+                    part_path: str, mark: int) -> bool:
+    """
+    缓存片段是否仍可续写：水位没有回退、水位内的行数和水位处的单据没有变化
+    （流水归档会删除行，重建数据库会换掉行）、片段文件完整
+    """
+    if not entry or entry["mark"] > mark:
+        return False
+    if not os.path.exists(part_path) or os.path.getsize(part_path) < entry["bytes"]:
+        return False
+    cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE rowid <= ?", (entry["mark"],))
+    if cursor.fetchone()[0] != entry["rows"]:
+        return False
+    return ledger_key(cursor, table, entry["mark"]) == entry["key"]
+
+
+def ledger_key(cursor: sqlite3.Cursor, table: str, rowid: int) -> Optional[str]:
+    """流水表中某rowid的单据编号（第一列），不存在时为None"""
+    row = cursor.execute(f"SELECT * FROM {table} WHERE rowid = ?", (rowid,)).fetchone()
+    return row[0] if row else None
+
+
+def incremental_excel_report(cursor: sqlite3.Cursor, excel_path: str, db_path: str,
+                             operation_name: str = "", cache_dir: Optional[str] = None,
+                             chunk_size: int = 5000) -> Tuple[Dict[str, int], int]:
+    """
+    增量生成Excel报表
+
+    流水工作表的sheetData片段缓存在cache_dir中，每次只把水位之后的新行按写入顺序接在片段末尾，
+    快照工作表整体重写，然后用excel_parallel.package_workbook重新打包，耗时与新增行数和快照工作表
+    大小成正比，加上一次对缓存片段的压缩复制。缓存缺失或不再可续写时该工作表从头渲染。
+    片段登记在打包完成后才更新，中途失败时下次先截掉片段中多写的尾部。
+
+    Args:
+        cursor: 读取数据使用的游标
+        excel_path: Excel报表文件路径
+        db_path: 数据库文件路径（写入报表信息）
+        operation_name: 触发生成的操作说明
+        cache_dir: 片段缓存目录，默认为报表路径加 .parts
+        chunk_size: 每批从游标读取的行数
+
+    Returns:
+        (各工作表的数据行数, 本次追加的流水行数)
+    """
+    cache_dir = cache_dir or f"{excel_path}.parts"
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_parts_index(cache_dir)
+    work_dir = tempfile.mkdtemp(prefix="warehouse_report_")
+    try:
+        sheets, new_index, appended = [], {}, 0
+        with read_snapshot(cursor):
+            marks = read_ledger_marks(cursor)
+            for name, columns, _, ledger_table in REPORT_QUERIES:
+                headers = [column.name for column in columns]
+                letters = [column_letter(i) for i in range(1, len(headers) + 1)]
+                if ledger_table is None:
+                    path = os.path.join(work_dir, f"{len(sheets)}.xml")
+                    widths = [len(header) for header in headers]
+                    _, query, params = report_query(name, marks)
+                    cursor.execute(query, params)
+                    with open(path, "w", encoding="utf-8") as out:
+                        out.write(row_xml(1, letters, headers, STYLE_HEADER))
+                        count = write_sheet_rows(out, cursor, letters, widths, 2, chunk_size)
+                    sheets.append((name, count, column_widths(widths), path))
+                    continue
+
+                path = os.path.join(cache_dir, f"{ledger_table}.xml")
+                entry = index.get(name)
+                if not part_is_current(cursor, ledger_table, entry, path, marks[name]):
+                    entry = {"mark": 0, "key": None, "rows": 0, "bytes": 0,
+                             "widths": [len(header) for header in headers]}
+                    open(path, "wb").close()
+                os.truncate(path, entry["bytes"])
+                widths = list(entry["widths"])
+                cursor.execute(LEDGER_SHEETS[name][2], (entry["mark"], marks[name]))
+                with open(path, "a", encoding="utf-8") as out:
+                    if entry["bytes"] == 0:
+                        out.write(row_xml(1, letters, headers, STYLE_HEADER))
+                    count = write_sheet_rows(out, cursor, letters, widths, entry["rows"] + 2, chunk_size)
+                appended += count
+                new_index[name] = {"mark": marks[name], "key": ledger_key(cursor, ledger_table, marks[name]),
+                                   "rows": entry["rows"] + count,
+                                   "bytes": os.path.getsize(path), "widths": widths}
+                sheets.append((name, new_index[name]["rows"], column_widths(widths), path))
+
+        package_workbook(excel_path, db_path, operation_name, marks, sheets)
+        save_parts_index(cache_dir, new_index)
+        return {name: count for name, count, _, _ in sheets}, appended
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
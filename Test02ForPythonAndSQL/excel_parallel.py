@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 并行Excel报表导出
+功能：每个工作表由进程池中的一个进程生成工作表XML，各进程使用自己的只读SQLite连接，
+      父进程只负责拼装xlsx容器（工作簿、样式、关系文件和ZIP打包），总耗时接近最大工作表的生成时间
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from connection_profiles import open_connection
+from row_source import REPORT_QUERIES, report_query
+
+# 与excel_incremental.MARK_SHEET相同，这里不导入该模块以免子进程加载openpyxl
+MARK_SHEET = "_导出水位"
+INFO_SHEET = "报表信息"
+
+# styles.xml中cellXfs的下标
+STYLE_HEADER = 1
+STYLE_DATA = 2
+STYLE_TITLE = 3
+
+# XML 1.0不允许的控制字符
+_ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+STYLES_XML = (
+    _XML_DECLARATION
+    + f'<styleSheet xmlns="{_MAIN_NS}">'
+    '<fonts count="3">'
+    '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="16"/><name val="Calibri"/><family val="2"/></font>'
+    '</fonts>'
+    '<fills count="3">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF366092"/><bgColor rgb="FF366092"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="2">'
+    '<border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+    '</borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="1" xfId="0" applyFont="1" applyFill="1" '
+    'applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="0" applyBorder="1"/>'
+    '<xf numFmtId="0" fontId="2" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+ROOT_RELS_XML = (
+    _XML_DECLARATION
+    + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+
+def column_letter(index: int) -> str:
+    """列序号（从1开始）转换为列字母"""
+    letters = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def cell_xml(reference: str, value, style: int) -> str:
+    """一个单元格的XML：数值直接写入，其余转为内联字符串，None只保留样式"""
+    if value is None:
+        return f'<c r="{reference}" s="{style}"/>'
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f'<c r="{reference}" s="{style}"><v>{value}</v></c>'
+    if isinstance(value, float):
+        # 与openpyxl相同的 %.16g 格式；NaN和无穷大写成空单元格
+        if math.isnan(value) or math.isinf(value):
+            return f'<c r="{reference}" s="{style}"/>'
+        return f'<c r="{reference}" s="{style}"><v>{value:.16g}</v></c>'
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    text = escape(_ILLEGAL_XML_CHARS.sub("", str(value)))
+    return f'<c r="{reference}" s="{style}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def row_xml(number: int, letters: Sequence[str], values: Sequence, style: int) -> str:
+    """一行的XML"""
+    cells = "".join(cell_xml(f"{letter}{number}", value, style) for letter, value in zip(letters, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+def write_sheet_rows(out, cursor, letters: Sequence[str], widths: List[int], first_row: int,
+                     chunk_size: int = 5000) -> int:
+    """
+    把游标中的行按行号first_row起写成行XML，同时放宽widths中的列宽（原始字符数）
+
+    Returns:
+        写入的行数
+    """
+    count = 0
+    chunk = cursor.fetchmany(chunk_size)
+    while chunk:
+        lines = []
+        for row in chunk:
+            for index, value in enumerate(row):
+                length = len(str(value))
+                if length > widths[index]:
+                    widths[index] = length
+            lines.append(row_xml(first_row + count, letters, row, STYLE_DATA))
+            count += 1
+        out.write("".join(lines))
+        chunk = cursor.fetchmany(chunk_size)
+    return count
+
+
+def column_widths(widths: List[int]) -> List[int]:
+    """与全量报表相同的列宽：长度+2，上限50"""
+    return [min(width + 2, 50) for width in widths]
+
+
+def render_sheet(db_path: str, sheet_name: str, marks: Dict[str, int], output_path: str,
+                 chunk_size: int = 5000) -> Tuple[str, int, List[int]]:
+    """
+    在子进程中生成一个工作表的sheetData内容
+
+    列宽要写在sheetData之前，而生成过程中才能统计出来，因此这里只把行写入output_path，
+    列宽随结果返回，由父进程写入工作表XML的头部。
+
+    Returns:
+        (工作表名, 数据行数, 列宽)
+    """
+    conn = open_connection(db_path, "read-replica")
+    try:
+        columns, query, params = report_query(sheet_name, marks)
+        headers = [column.name for column in columns]
+        letters = [column_letter(index) for index in range(1, len(headers) + 1)]
+        widths = [len(header) for header in headers]
+
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        with open(output_path, "w", encoding="utf-8") as out:
+            out.write(row_xml(1, letters, headers, STYLE_HEADER))
+            count = write_sheet_rows(out, cursor, letters, widths, 2, chunk_size)
+        return sheet_name, count, column_widths(widths)
+    finally:
+        conn.close()
+
+
+def sheet_prefix(widths: Optional[List[int]] = None) -> str:
+    """工作表XML在sheetData内容之前的部分"""
+    cols = ""
+    if widths:
+        cols = "<cols>" + "".join(
+            f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+            for index, width in enumerate(widths, 1)
+        ) + "</cols>"
+    return _XML_DECLARATION + f'<worksheet xmlns="{_MAIN_NS}">{cols}<sheetData>'
+
+
+SHEET_SUFFIX = "</sheetData></worksheet>"
+
+
+def small_sheet_xml(rows: List[Tuple[int, List, int]]) -> str:
+    """父进程直接生成的小工作表：rows为 (行号, 值列表, 样式)"""
+    body = "".join(
+        row_xml(number, [column_letter(i) for i in range(1, len(values) + 1)], values, style)
+        for number, values, style in rows
+    )
+    return sheet_prefix() + body + SHEET_SUFFIX
+
+
+def workbook_xml(sheet_names: List[str]) -> str:
+    """xl/workbook.xml，水位工作表隐藏"""
+    sheets = "".join(
+        f'<sheet name="{escape(name)}" sheetId="{index}" '
+        + ('state="hidden" ' if name == MARK_SHEET else '')
+        + f'r:id="rId{index}"/>'
+        for index, name in enumerate(sheet_names, 1)
+    )
+    return (_XML_DECLARATION + f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+            f'<bookViews><workbookView/></bookViews><sheets>{sheets}</sheets></workbook>')
+
+
+def workbook_rels_xml(sheet_count: int) -> str:
+    """xl/_rels/workbook.xml.rels：各工作表加样式"""
+    relations = "".join(
+        f'<Relationship Id="rId{index}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{index}.xml"/>'
+        for index in range(1, sheet_count + 1)
+    )
+    relations += (f'<Relationship Id="rId{sheet_count + 1}" Type="{_REL_NS}/styles" '
+                  'Target="styles.xml"/>')
+    return (_XML_DECLARATION
+            + f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{relations}</Relationships>')
+
+
+def content_types_xml(sheet_count: int) -> str:
+    """[Content_Types].xml"""
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for index in range(1, sheet_count + 1)
+    )
+    return (
+        _XML_DECLARATION
+        + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'{overrides}</Types>'
+    )
+
+
+def read_marks(db_path: str) -> Dict[str, int]:
+    """读取各流水工作表的导出水位（流水表当前的最大rowid）"""
+    conn = open_connection(db_path, "read-replica")
+    try:
+        return {
+            name: conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {ledger_table}").fetchone()[0]
+            for name, _, _, ledger_table in REPORT_QUERIES if ledger_table
+        }
+    finally:
+        conn.close()
+
+
+def package_workbook(excel_path: str, db_path: str, operation_name: str, marks: Dict[str, int],
+                     sheets: List[Tuple[str, int, List[int], str]]):
+    """
+    把已生成的工作表内容打包为xlsx：报表信息在最前，水位工作表隐藏在最后
+
+    先写临时文件再替换，读者不会看到写了一半的报表。
+
+    Args:
+        sheets: 按报表顺序的 (工作表名, 数据行数, 列宽, sheetData内容文件)，数据行数为0的工作表不写入
+    """
+    generated = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    info_xml = small_sheet_xml([
+        (1, ["仓库管理系统 - Excel报表"], STYLE_TITLE),
+        (3, [f"生成时间: {generated}"], 0),
+        (4, [f"操作类型: {operation_name}" if operation_name else "操作类型: 系统状态查看"], 0),
+        (5, [f"数据库文件: {db_path}"], 0),
+    ])
+    mark_xml = small_sheet_xml(
+        [(1, ["工作表", "已导出rowid"], 0)]
+        + [(number, [name, mark], 0) for number, (name, mark) in enumerate(marks.items(), 2)]
+    )
+
+    # 查询结果为空的工作表不写入（与全量报表一致）
+    data_sheets = [(name, widths, path) for name, count, widths, path in sheets if count]
+    workbook_sheets = [INFO_SHEET] + [name for name, _, _ in data_sheets] + [MARK_SHEET]
+    sheet_count = len(workbook_sheets)
+
+    temp_path = f"{excel_path}.tmp"
+    with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", content_types_xml(sheet_count))
+        zf.writestr("_rels/.rels", ROOT_RELS_XML)
+        zf.writestr("xl/workbook.xml", workbook_xml(workbook_sheets))
+        zf.writestr("xl/_rels/workbook.xml.rels", workbook_rels_xml(sheet_count))
+        zf.writestr("xl/styles.xml", STYLES_XML)
+        zf.writestr("xl/worksheets/sheet1.xml", info_xml)
+        for index, (name, widths, path) in enumerate(data_sheets, 2):
+            with zf.open(f"xl/worksheets/sheet{index}.xml", "w", force_zip64=True) as part:
+                part.write(sheet_prefix(widths).encode("utf-8"))
+                with open(path, "rb") as body:
+                    shutil.copyfileobj(body, part, 1024 * 1024)
+                part.write(SHEET_SUFFIX.encode("utf-8"))
+        zf.writestr(f"xl/worksheets/sheet{sheet_count}.xml", mark_xml)
+    os.replace(temp_path, excel_path)
+
+
+def parallel_excel_report(db_path: str, excel_path: str, operation_name: str = "",
+                          workers: Optional[int] = None, chunk_size: int = 5000) -> Dict[str, int]:
+    """
+    并行生成完整的Excel报表
+
+    父进程先确定流水表水位，各工作表交给进程池，每个子进程打开自己的只读连接、
+    把sheetData写入临时文件；全部完成后父进程按报表顺序打包（package_workbook）。
+    流水工作表受水位约束，快照工作表各自读取提交时刻的数据。
+
+    Args:
+        db_path: 数据库文件路径（必须是文件数据库，子进程需要独立打开）
+        excel_path: Excel报表文件路径
+        operation_name: 触发生成的操作说明
+        workers: 进程数，默认取工作表数与CPU核数中较小者；为1时在当前进程中依次生成
+        chunk_size: 每批从游标读取的行数
+
+    Returns:
+        各工作表写入的数据行数
+    """
+    marks = read_marks(db_path)
+    sheet_names = [name for name, _, _, _ in REPORT_QUERIES]
+    # 流水工作表通常最大，先提交，缩短最后一个工作表的等待
+    ledger_sheets = {name for name, _, _, ledger_table in REPORT_QUERIES if ledger_table}
+    submit_order = sorted(sheet_names, key=lambda name: name not in ledger_sheets)
+    if workers is None:
+        workers = min(len(sheet_names), os.cpu_count() or 1)
+
+    work_dir = tempfile.mkdtemp(prefix="warehouse_report_")
+    try:
+        paths = {name: os.path.join(work_dir, f"{index}.xml") for index, name in enumerate(sheet_names)}
+        if workers <= 1:
+            results = [render_sheet(db_path, name, marks, paths[name], chunk_size) for name in submit_order]
+        else:
+            # 调用方常是多线程进程（报表调度线程、HTTP服务的写线程和读线程池），fork会把其他线程持有的锁
+            # 复制进子进程而可能死锁，工作进程改用spawn启动
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [pool.submit(render_sheet, db_path, name, marks, paths[name], chunk_size)
+                           for name in submit_order]
+                results = [future.result() for future in futures]
+        rendered = {name: (count, widths) for name, count, widths in results}
+        package_workbook(excel_path, db_path, operation_name, marks,
+                         [(name, rendered[name][0], rendered[name][1], paths[name]) for name in sheet_names])
+        return {name: rendered[name][0] for name in sheet_names}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
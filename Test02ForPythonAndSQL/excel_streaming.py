@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 流式Excel报表导出
+功能：从SQLite游标分批读取数据，写入只写模式（write_only）工作簿，
+      列宽由首批数据估算，表头和数据单元格共用命名样式，内存占用与流水行数无关
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
+
+from excel_incremental import MARK_SHEET, read_ledger_marks
+from row_source import REPORT_QUERIES
+
+# 报表工作表定义：(工作表名, 表头, SQL, 流水表名)，与全量报表共用row_source中的查询
+# 流水表的查询带有 rowid <= ? 条件，只导出水位之内的行，无需在整个导出期间持有读事务
+REPORT_SHEETS: List[Tuple[str, List[str], str, Optional[str]]] = [
+    (name, [column.name for column in columns], query, ledger_table)
+    for name, columns, query, ledger_table in REPORT_QUERIES
+]
+
+HEADER_STYLE = "仓库报表表头"
+DATA_STYLE = "仓库报表数据"
+
+
+def register_report_styles(wb: Workbook):
+    """注册报表共用的命名样式，所有单元格只引用样式名"""
+    thin_side = Side(style='thin')
+    thin_border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
+
+    header_style = NamedStyle(name=HEADER_STYLE)
+    header_style.font = Font(bold=True, color="FFFFFF")
+    header_style.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_style.alignment = Alignment(horizontal="center", vertical="center")
+    header_style.border = thin_border
+    wb.add_named_style(header_style)
+
+    data_style = NamedStyle(name=DATA_STYLE)
+    data_style.border = thin_border
+    wb.add_named_style(data_style)
+
+
+def styled_row(ws, values, style_name: str) -> List[WriteOnlyCell]:
+    """把一行数据包装成引用命名样式的只写单元格"""
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style_name
+        row.append(cell)
+    return row
+
+
+def column_widths(headers: List[str], rows: List[Tuple]) -> List[int]:
+    """按表头和样本行估算列宽（与全量报表相同的 长度+2，上限50）"""
+    widths = [len(str(header)) for header in headers]
+    for row in rows:
+        for index, value in enumerate(row):
+            widths[index] = max(widths[index], len(str(value)))
+    return [min(width + 2, 50) for width in widths]
+
+
+def stream_sheet(wb: Workbook, cursor: sqlite3.Cursor, sheet_name: str, headers: List[str],
+                 query: str, params: Tuple = (), chunk_size: int = 5000) -> int:
+    """
+    流式导出一个工作表
+
+    只写模式下列宽必须在写入第一行之前设置，因此先取出第一批数据估算列宽，之后逐批写入。
+
+    Returns:
+        写入的数据行数；查询结果为空时不创建工作表（与全量报表一致），返回0
+    """
+    cursor.execute(query, params)
+    chunk = cursor.fetchmany(chunk_size)
+    if not chunk:
+        return 0
+
+    ws = wb.create_sheet(title=sheet_name)
+    for index, width in enumerate(column_widths(headers, chunk), 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    ws.append(styled_row(ws, headers, HEADER_STYLE))
+    count = 0
+    while chunk:
+        for row in chunk:
+            ws.append(styled_row(ws, row, DATA_STYLE))
+        count += len(chunk)
+        chunk = cursor.fetchmany(chunk_size)
+    return count
+
+
+def stream_excel_report(cursor: sqlite3.Cursor, excel_path: str, db_path: str,
+                        operation_name: str = "", chunk_size: int = 5000) -> Dict[str, int]:
+    """
+    以只写模式流式生成完整的Excel报表
+
+    Args:
+        cursor: 读取数据使用的游标
+        excel_path: Excel报表文件路径
+        db_path: 数据库文件路径（写入报表信息）
+        operation_name: 触发生成的操作说明
+        chunk_size: 每批从游标读取的行数
+
+    Returns:
+        各工作表写入的数据行数
+    """
+    # 先确定流水表水位，后续查询只导出水位之内的行，并写入隐藏工作表供增量模式使用
+    marks = read_ledger_marks(cursor)
+    ledger_marks = {"ruku": marks["入库记录"], "chuku": marks["出库记录"]}
+
+    wb = Workbook(write_only=True)
+    register_report_styles(wb)
+
+    info_sheet = wb.create_sheet(title="报表信息")
+    title = WriteOnlyCell(info_sheet, value="仓库管理系统 - Excel报表")
+    title.font = Font(bold=True, size=16)
+    info_sheet.append([title])
+    info_sheet.append([])
+    info_sheet.append([f"生成时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
+    info_sheet.append([f"操作类型: {operation_name}" if operation_name else "操作类型: 系统状态查看"])
+    info_sheet.append([f"数据库文件: {db_path}"])
+
+    counts = {}
+    for sheet_name, headers, query, ledger_table in REPORT_SHEETS:
+        params = (ledger_marks[ledger_table],) if ledger_table else ()
+        counts[sheet_name] = stream_sheet(wb, cursor, sheet_name, headers, query, params, chunk_size)
+
+    mark_sheet = wb.create_sheet(title=MARK_SHEET)
+    mark_sheet.sheet_state = "hidden"
+    mark_sheet.append(["工作表", "已导出rowid"])
+    for sheet_name, mark in marks.items():
+        mark_sheet.append([sheet_name, mark])
+
+    wb.save(excel_path)
+    return counts
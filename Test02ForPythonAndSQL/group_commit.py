@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 分组提交写入器
+功能：收集多个调用方提交的入库/出库操作，由一个写线程每轮把排队中的操作放进同一个事务执行，
+      一次提交（一次fsync）完成一组操作；每个操作使用独立的保存点，库存不足等校验失败只撤销该操作，
+      各调用方通过Future取得自己的结果
+作者：AI Assistant
+日期：2024
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from warehouse_manager_tool import WarehouseManagerTool
+
+# 单个操作的处理结果 (入库/出库编号, 是否成功, 说明)
+OperationResult = Tuple[str, bool, str]
+
+
+class _Request(NamedTuple):
+    """写队列中的一项：一个或一组操作及其Future"""
+    operations: List[Tuple[str, object]]
+    atomic: bool
+    future: Future
+    single: bool
+
+
+# 停止写线程的队列标记
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """分组提交写入器：多个线程并发提交，单个写线程按轮次合并提交"""
+
+    def __init__(self, tool: WarehouseManagerTool, max_batch: int = 500,
+                 max_delay: float = 0.0, max_pending: int = 10000):
+        """
+        Args:
+            tool: 已连接数据库并启用连接池（pool_readers > 0）的仓库管理工具，
+                  写操作由写线程通过其run_operations执行
+            max_batch: 每轮事务最多包含的操作数
+            max_delay: 每轮收到第一个操作后最多再等待的秒数，用于凑满一组；
+                       为0时只合并已经在排队的操作，空闲时没有额外延迟
+            max_pending: 排队中的请求数上限，超出时submit抛出queue.Full
+        """
+        if max_batch < 1:
+            raise ValueError("每轮操作数至少为1")
+        self.tool = tool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        # 凑组时遇到的原子请求，留到下一轮单独执行
+        self._carry: Optional[_Request] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "operations": 0, "succeeded": 0, "largest_batch": 0, "commit_s": 0.0}
+
+    def start(self) -> "GroupCommitWriter":
+        """启动写线程"""
+        if self.tool.pool is None:
+            # 未启用连接池时写连接只能在创建它的线程中使用
+            raise RuntimeError("分组提交写入器需要启用连接池的仓库管理工具（pool_readers > 0）")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """执行完已排队的操作后停止写线程"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def __enter__(self) -> "GroupCommitWriter":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def pending(self) -> int:
+        """排队中的请求数"""
+        return self._queue.qsize()
+
+    def submit(self, kind: str, params, block: bool = False,
+               timeout: Optional[float] = None) -> "Future[OperationResult]":
+        """
+        提交一个入库/出库操作
+
+        Args:
+            kind: "inbound" 或 "outbound"
+            params: 字典或按process_inbound/process_outbound参数顺序排列的元组
+            block: 队列已满时是否等待，为False时立即抛出queue.Full
+
+        Returns:
+            完成后结果为 (编号, 是否成功, 说明) 的Future
+        """
+        return self._put([(kind, params)], False, True, block, timeout)
+
+    def submit_many(self, operations: Sequence[Tuple[str, object]], atomic: bool = False,
+                    block: bool = False, timeout: Optional[float] = None) -> "Future[List[OperationResult]]":
+        """
+        提交一组操作，结果顺序与输入一致
+
+        atomic为True时这一组单独在一个事务中执行，任一操作失败全部回滚；
+        否则与其他调用方的操作合并提交。
+        """
+        return self._put(list(operations), atomic, False, block, timeout)
+
+    def execute(self, kind: str, params, timeout: Optional[float] = None) -> OperationResult:
+        """提交一个操作并等待结果（队列已满时等待）"""
+        return self.submit(kind, params, block=True).result(timeout)
+
+    def _put(self, operations: List[Tuple[str, object]], atomic: bool, single: bool,
+             block: bool, timeout: Optional[float]) -> Future:
+        if self._thread is None:
+            raise RuntimeError("分组提交写入器未启动")
+        for kind, params in operations:
+            if not isinstance(params, (Mapping, list, tuple)):
+                raise TypeError(f"操作参数应为字典或元组: {params!r}")
+        future: Future = Future()
+        self._queue.put(_Request(operations, atomic, future, single), block, timeout)
+        return future
+
+    def _collect(self, first: _Request) -> Tuple[List[_Request], bool]:
+        """
+        从第一个请求开始凑成一组：取出已经在排队的请求，直到操作数达到max_batch或等待超过max_delay
+
+        需要单独执行的原子请求和停止标记留到下一轮，当前组先提交。
+
+        Returns:
+            (本组请求, 是否收到停止标记)
+        """
+        group = [first]
+        count = len(first.operations)
+        deadline = time.monotonic() + self.max_delay
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return group, True
+            if item.atomic:
+                self._carry = item
+                break
+            group.append(item)
+            count += len(item.operations)
+        return group, False
+
+    def _run(self):
+        """写线程：每轮执行一组请求并逐个完成Future"""
+        stopping = False
+        while True:
+            if self._carry is not None:
+                item, self._carry = self._carry, None
+            elif stopping:
+                return
+            else:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+            if item.atomic:
+                self._execute([item], atomic=True)
+                continue
+            group, stopping = self._collect(item)
+            self._execute(group, atomic=False)
+
+    def _execute(self, group: List[_Request], atomic: bool):
+        """在一个事务中执行一组请求，按提交顺序把结果分给各请求"""
+        operations = [operation for request in group for operation in request.operations]
+        started = time.perf_counter()
+        try:
+            results = self.tool.run_operations(operations, atomic=atomic)
+            if len(results) != len(operations):
+                # run_operations在逐项执行之外失败（例如无法开始事务），整组都未写入
+                raise RuntimeError(results[0][2] if results else "分组事务执行失败")
+        except Exception as e:
+            for request in group:
+                request.future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - started
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["operations"] += len(operations)
+            self._stats["succeeded"] += sum(1 for _, ok, _ in results if ok)
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(operations))
+            self._stats["commit_s"] += elapsed
+
+        offset = 0
+        for request in group:
+            own = results[offset:offset + len(request.operations)]
+            offset += len(request.operations)
+            request.future.set_result(own[0] if request.single else own)
+
+    def stats(self) -> Dict:
+        """累计的轮次数、操作数、成功数、最大组和平均每组操作数"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch"] = round(stats["operations"] / stats["batches"], 1) if stats["batches"] else 0.0
+        stats["commit_s"] = round(stats["commit_s"], 3)
+        stats["pending"] = self.pending
+        return stats
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 性能计时
+功能：记录每个操作方法及其内部各阶段（SQL、提交、报表重建等）的调用次数、累计耗时和延迟直方图，
+      按语句统计SQL耗时，通过stats()查询，可选后台定期输出；未启用时只多一次属性判断
+作者：AI Assistant
+日期：2024
+"""
+
+import functools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# 直方图桶上界（毫秒），最后一个桶收纳更慢的调用
+HISTOGRAM_BOUNDS_MS: List[float] = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+# IN (?, ?, ...) 的参数个数随批次变化，统计时合并为同一条语句
+_IN_PLACEHOLDERS = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+SQL_KEY_LENGTH = 100
+
+
+def sql_key(sql: str) -> str:
+    """把SQL语句规整为统计用的键：压缩空白、合并IN占位符、截断过长的语句"""
+    key = _WHITESPACE.sub(" ", sql).strip()
+    key = _IN_PLACEHOLDERS.sub("IN (?...)", key)
+    return key[:SQL_KEY_LENGTH]
+
+
+class TimingStat:
+    """一个计时项的次数、累计耗时、最大耗时和直方图"""
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        ms = seconds * 1000
+        for index, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if ms <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """由直方图估算分位数（毫秒，取所在桶的上界）"""
+        if not self.count:
+            return None
+        target = self.count * p / 100
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                if index < len(HISTOGRAM_BOUNDS_MS):
+                    return HISTOGRAM_BOUNDS_MS[index]
+                return round(self.max * 1000, 3)
+        return round(self.max * 1000, 3)
+
+    def to_dict(self) -> Dict:
+        histogram = {f"<={bound}ms": count
+                     for bound, count in zip(HISTOGRAM_BOUNDS_MS, self.buckets) if count}
+        if self.buckets[-1]:
+            histogram[f">{HISTOGRAM_BOUNDS_MS[-1]}ms"] = self.buckets[-1]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "histogram": histogram,
+        }
+
+
+class Instrumentation:
+    """操作、阶段和SQL语句的计时汇总（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._operations: Dict[str, TimingStat] = {}
+        self._phases: Dict[str, Dict[str, TimingStat]] = {}
+        self._sql: Dict[str, TimingStat] = {}
+        self._dump_thread: Optional[threading.Thread] = None
+        self._dump_stop = threading.Event()
+        self.started = time.time()
+
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_operation(self) -> Optional[str]:
+        """当前线程正在执行的最内层操作"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def record_phase(self, phase: str, seconds: float):
+        """把一段耗时记入当前操作的阶段（不在操作中时只计入全局阶段"(无操作)"）"""
+        operation = self.current_operation() or "(无操作)"
+        with self._lock:
+            phases = self._phases.setdefault(operation, {})
+            phases.setdefault(phase, TimingStat()).add(seconds)
+
+    def record_sql(self, sql: str, seconds: float):
+        """记录一条SQL语句的耗时，同时计入当前操作的sql阶段"""
+        key = sql_key(sql)
+        with self._lock:
+            self._sql.setdefault(key, TimingStat()).add(seconds)
+        self.record_phase("sql", seconds)
+
+    @contextmanager
+    def operation(self, name: str) -> Iterator[None]:
+        """
+        计时一个操作
+
+        嵌套在其他操作中时（例如同步重建报表），除了计入自身的操作统计，还作为直接外层操作的一个阶段，
+        其内部的SQL只计入自身，各操作的阶段互不重叠；与外层同名的递归调用只算一次。
+        """
+        stack = self._stack()
+        if stack and stack[-1] == name:
+            yield
+            return
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                self._operations.setdefault(name, TimingStat()).add(elapsed)
+            if stack:
+                self.record_phase(name, elapsed)
+
+    def wrap_connection(self, conn) -> "InstrumentedConnection":
+        """返回对SQL执行、提交和回滚计时的连接代理"""
+        if isinstance(conn, InstrumentedConnection):
+            return conn
+        return InstrumentedConnection(conn, self)
+
+    def wrap_cursor(self, cursor) -> "InstrumentedCursor":
+        """返回对execute/executemany计时的游标代理"""
+        if isinstance(cursor, InstrumentedCursor):
+            return cursor
+        return InstrumentedCursor(cursor, self)
+
+    def stats(self) -> Dict:
+        """
+        返回全部统计
+
+        Returns:
+            {"operations": {操作: 统计}, "phases": {操作: {阶段: 统计}}, "sql": {语句: 统计}, "uptime_s": 秒数}
+        """
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "operations": {name: stat.to_dict() for name, stat in self._operations.items()},
+                "phases": {
+                    operation: {phase: stat.to_dict() for phase, stat in phases.items()}
+                    for operation, phases in self._phases.items()
+                },
+                "sql": {
+                    key: stat.to_dict()
+                    for key, stat in sorted(self._sql.items(), key=lambda item: -item[1].total)
+                },
+            }
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._operations.clear()
+            self._phases.clear()
+            self._sql.clear()
+            self.started = time.time()
+
+    def format_summary(self, top_sql: int = 5) -> str:
+        """生成便于阅读的文本摘要"""
+        stats = self.stats()
+        lines = [f"📊 性能统计（运行 {stats['uptime_s']} 秒）"]
+        for name, stat in sorted(stats["operations"].items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"  {name:<24} {stat['count']:>7} 次  累计 {stat['total_ms']:>10.1f} ms  "
+                         f"平均 {stat['mean_ms']:.3f} ms  p99≤{stat['p99_ms']} ms")
+            for phase, phase_stat in stats["phases"].get(name, {}).items():
+                lines.append(f"    - {phase:<20} {phase_stat['count']:>7} 次  累计 {phase_stat['total_ms']:>10.1f} ms")
+        for key, stat in list(stats["sql"].items())[:top_sql]:
+            lines.append(f"  SQL {stat['count']:>7} 次  累计 {stat['total_ms']:>10.1f} ms  {key}")
+        return "\n".join(lines)
+
+    def start_periodic_dump(self, interval: float, path: Optional[str] = None):
+        """
+        后台定期输出统计
+
+        Args:
+            interval: 输出间隔（秒）
+            path: 指定时把完整统计写成JSON文件，否则打印文本摘要
+        """
+        if self._dump_thread is not None:
+            return
+        self._dump_stop.clear()
+
+        def run():
+            while not self._dump_stop.wait(interval):
+                self.dump(path)
+
+        self._dump_thread = threading.Thread(target=run, name="InstrumentationDump", daemon=True)
+        self._dump_thread.start()
+
+    def stop_periodic_dump(self):
+        """停止定期输出"""
+        if self._dump_thread is None:
+            return
+        self._dump_stop.set()
+        self._dump_thread.join()
+        self._dump_thread = None
+
+    def dump(self, path: Optional[str] = None):
+        """立即输出一次统计"""
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.stats(), f, ensure_ascii=False, indent=2)
+        else:
+            print(self.format_summary())
+
+
+class InstrumentedCursor:
+    """游标代理：execute/executemany计时，其余属性透传"""
+
+    def __init__(self, cursor, instrumentation: Instrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+
+    def execute(self, sql: str, parameters=()):
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, parameters)
+        finally:
+            self._instrumentation.record_sql(sql, time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql: str, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_parameters)
+        finally:
+            self._instrumentation.record_sql(sql, time.perf_counter() - start)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """连接代理：SQL执行、提交和回滚计时，其余属性透传"""
+
+    def __init__(self, conn, instrumentation: Instrumentation):
+        self._conn = conn
+        self._instrumentation = instrumentation
+
+    @property
+    def raw_connection(self):
+        """被代理的sqlite3连接"""
+        return self._conn
+
+    def cursor(self, *args, **kwargs) -> InstrumentedCursor:
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._instrumentation)
+
+    def execute(self, sql: str, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self._instrumentation.record_phase("commit", time.perf_counter() - start)
+
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            self._conn.rollback()
+        finally:
+            self._instrumentation.record_phase("rollback", time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrumented(method):
+    """操作方法装饰器：实例的instrumentation为None（未启用）时直接调用，否则计时"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return method(self, *args, **kwargs)
+        with instrumentation.operation(name):
+            return method(self, *args, **kwargs)
+    return wrapper
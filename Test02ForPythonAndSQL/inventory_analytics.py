@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 库存估值与周转分析
+功能：一次性把入库/出库流水和库存读成NumPy/pandas列，用分组聚合和累计运算（不逐行循环）计算
+      加权平均成本、先进先出（FIFO）估值、周转率、库存可用天数和ABC分类，按库存编号和仓库汇总
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+import sqlite3
+from typing import Optional
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # numpy/pandas是可选依赖，只有数据分析时需要
+    np = pd = None
+
+from stock_history import normalize_day
+from warehouse_schema import LEDGER_DAY_SQL
+
+# ABC分类的累计消耗金额占比界限：前80%为A类，80%~95%为B类，其余为C类
+ABC_THRESHOLDS = (0.80, 0.95)
+
+# 日期为空或无法解析的流水视为早于任何查询期间
+EARLIEST_DAY = "1900-01-01"
+
+
+def require_pandas():
+    """检查numpy和pandas是否可用"""
+    if pd is None:
+        raise RuntimeError("库存分析需要安装numpy和pandas（pip install pandas）")
+
+
+def load_stock(cursor: sqlite3.Cursor) -> "pd.DataFrame":
+    """读取当前库存，索引为库存编号，列为 warehouse / quantity / price"""
+    require_pandas()
+    rows = cursor.execute("SELECT bianhao, cangkumingcheng, shuliang, danjia FROM kucun").fetchall()
+    stock = pd.DataFrame.from_records(rows, columns=["code", "warehouse", "quantity", "price"])
+    stock["quantity"] = pd.to_numeric(stock["quantity"], errors="coerce").fillna(0).astype("int64")
+    stock["price"] = pd.to_numeric(stock["price"], errors="coerce").fillna(0.0).astype("float64")
+    stock["warehouse"] = stock["warehouse"].fillna("").astype("category")
+    return stock.set_index("code")
+
+
+def load_movements(cursor: sqlite3.Cursor, ruku: str = "ruku", chuku: str = "chuku") -> "pd.DataFrame":
+    """
+    读取入库和出库流水为一张表，按日期排序
+
+    列：code（库存编号）、day（datetime64）、qty（入库为正、出库为负）、price（单价）、inbound（是否入库）
+
+    Args:
+        ruku, chuku: 流水表名，读取含归档的完整历史时为ledger_archive建立的ruku_all / chuku_all
+    """
+    require_pandas()
+    rows = cursor.execute(f'''
+        SELECT bianhao, {LEDGER_DAY_SQL.format(column="rukuriqi")}, shuliang, danjia, 1 FROM {ruku}
+        UNION ALL
+        SELECT bianhao, {LEDGER_DAY_SQL.format(column="chukuriqi")}, -shuliang, danjia, 0 FROM {chuku}
+    ''').fetchall()
+    movements = pd.DataFrame.from_records(rows, columns=["code", "day", "qty", "price", "inbound"])
+    movements["day"] = pd.to_datetime(movements["day"], format="%Y-%m-%d", errors="coerce",
+                                      cache=True).fillna(pd.Timestamp(EARLIEST_DAY))
+    movements["qty"] = pd.to_numeric(movements["qty"], errors="coerce").fillna(0).astype("int64")
+    movements["price"] = pd.to_numeric(movements["price"], errors="coerce").fillna(0.0).astype("float64")
+    movements["inbound"] = movements["inbound"].astype(bool)
+    movements["code"] = movements["code"].fillna("").astype("category")
+    return movements.sort_values("day", kind="stable", ignore_index=True)
+
+
+class InventoryAnalytics:
+    """加载一次流水，按任意期间计算库存估值和周转指标"""
+
+    def __init__(self, stock: "pd.DataFrame", movements: "pd.DataFrame"):
+        """
+        Args:
+            stock: load_stock的结果
+            movements: load_movements的结果
+        """
+        require_pandas()
+        self.stock = stock
+        self.movements = movements
+
+    @classmethod
+    def from_cursor(cls, cursor: sqlite3.Cursor, with_archives: bool = False) -> "InventoryAnalytics":
+        """从数据库读取；with_archives为True时游标所在连接须已通过attach_archives附加归档"""
+        ledgers = ("ruku_all", "chuku_all") if with_archives else ("ruku", "chuku")
+        return cls(load_stock(cursor), load_movements(cursor, *ledgers))
+
+    def period(self, start=None, end=None):
+        """规范查询期间：返回 (第一天, 最后一天, 天数)，默认从最早的流水到今天"""
+        today = pd.Timestamp(datetime.date.today())
+        if start is None:
+            start = self.movements["day"].min() if len(self.movements) else today
+        start = pd.Timestamp(normalize_day(start))
+        end = pd.Timestamp(normalize_day(end)) if end is not None else today
+        return start, end, max((end - start).days + 1, 1)
+
+    def _sum_by_code(self, mask: "np.ndarray", values: "pd.Series") -> "pd.Series":
+        """按库存编号对选中的流水求和，对齐到库存表的索引"""
+        sums = values[mask].groupby(self.movements["code"][mask], observed=True).sum()
+        return sums.reindex(self.stock.index, fill_value=0)
+
+    def _fifo_value(self, closing_qty: "pd.Series", end: "pd.Timestamp") -> "pd.Series":
+        """
+        先进先出估值：期末数量由最近的入库批次构成，从最新的批次向前取满为止；
+        入库批次不足的部分（早于流水记录的期初库存）按当前单价计价
+        """
+        movements = self.movements
+        lots = movements[movements["inbound"].to_numpy() & (movements["day"] <= end).to_numpy()]
+        # 同一库存编号内按日期从新到旧排列，newer为比该批次更新的批次数量之和
+        lots = lots.iloc[::-1]
+        code = lots["code"].astype(str).to_numpy()
+        qty = lots["qty"].to_numpy()
+        newer = lots.groupby("code", observed=True, sort=False)["qty"].cumsum().to_numpy() - qty
+        need = closing_qty.reindex(code).fillna(0).to_numpy()
+        taken = np.clip(need - newer, 0, qty)
+        layered = pd.Series(taken * lots["price"].to_numpy()).groupby(code).sum()
+        layered_qty = pd.Series(taken).groupby(code).sum()
+        remainder = (closing_qty - layered_qty.reindex(self.stock.index, fill_value=0)).clip(lower=0)
+        return layered.reindex(self.stock.index, fill_value=0.0) + remainder * self.stock["price"]
+
+    def sku_metrics(self, start=None, end=None) -> "pd.DataFrame":
+        """
+        期间内每个库存编号的估值和周转指标
+
+        期初/期末数量 = 当前数量 - 之后流水的净变化。加权平均成本 =
+        (期初数量 x 当前单价 + 期间入库金额) / (期初数量 + 期间入库数量)；销货成本 = 期间出库数量 x 加权平均成本。
+
+        Args:
+            start: 期间第一天，默认为最早的流水日期
+            end: 期间最后一天，默认为今天
+
+        Returns:
+            索引为库存编号，列为 warehouse, opening_qty, inbound_qty, inbound_amount, outbound_qty,
+            closing_qty, avg_cost, closing_value, fifo_value, cogs, avg_inventory_value, turnover,
+            days_of_stock, abc
+        """
+        start, end, period_days = self.period(start, end)
+        movements = self.movements
+        day = movements["day"]
+
+        qty = movements["qty"]
+        inbound = movements["inbound"].to_numpy()
+        in_period = ((day >= start) & (day <= end)).to_numpy()
+        current = self.stock["quantity"]
+        opening_qty = current - self._sum_by_code((day >= start).to_numpy(), qty)
+        closing_qty = current - self._sum_by_code((day > end).to_numpy(), qty)
+        inbound_qty = self._sum_by_code(in_period & inbound, qty)
+        inbound_amount = self._sum_by_code(in_period & inbound, qty * movements["price"])
+        outbound_qty = -self._sum_by_code(in_period & ~inbound, qty)
+
+        price = self.stock["price"]
+        base_qty = opening_qty.clip(lower=0) + inbound_qty
+        avg_cost = ((opening_qty.clip(lower=0) * price + inbound_amount) / base_qty.where(base_qty > 0)).fillna(price)
+        cogs = outbound_qty * avg_cost
+        avg_inventory_value = (opening_qty + closing_qty) / 2 * avg_cost
+        daily_outbound = outbound_qty / period_days
+
+        metrics = pd.DataFrame({
+            "warehouse": self.stock["warehouse"],
+            "opening_qty": opening_qty,
+            "inbound_qty": inbound_qty,
+            "inbound_amount": inbound_amount,
+            "outbound_qty": outbound_qty,
+            "closing_qty": closing_qty,
+            "avg_cost": avg_cost,
+            "closing_value": closing_qty * avg_cost,
+            "fifo_value": self._fifo_value(closing_qty, end),
+            "cogs": cogs,
+            "avg_inventory_value": avg_inventory_value,
+            # 没有平均库存或没有出库时无法计算，记为NaN
+            "turnover": cogs / avg_inventory_value.where(avg_inventory_value > 0),
+            "days_of_stock": closing_qty / daily_outbound.where(daily_outbound > 0),
+        })
+        metrics["abc"] = abc_classes(metrics["warehouse"], metrics["cogs"])
+        return metrics
+
+    def warehouse_metrics(self, start=None, end=None,
+                          sku_metrics: Optional["pd.DataFrame"] = None) -> "pd.DataFrame":
+        """
+        期间内每个仓库的汇总指标（参数同sku_metrics，已算好的库存编号指标可直接传入）
+
+        Returns:
+            索引为仓库名称，列为 skus, closing_qty, closing_value, fifo_value, cogs,
+            avg_inventory_value, turnover, days_of_stock, a_skus, b_skus, c_skus
+        """
+        metrics = sku_metrics if sku_metrics is not None else self.sku_metrics(start, end)
+        _, _, period_days = self.period(start, end)
+
+        grouped = metrics.groupby("warehouse", observed=True)
+        summary = grouped[["closing_qty", "closing_value", "fifo_value", "cogs", "avg_inventory_value"]].sum()
+        summary.insert(0, "skus", grouped.size())
+        summary["turnover"] = summary["cogs"] / summary["avg_inventory_value"].where(summary["avg_inventory_value"] > 0)
+        daily_cogs = summary["cogs"] / period_days
+        summary["days_of_stock"] = summary["closing_value"] / daily_cogs.where(daily_cogs > 0)
+        counts = pd.crosstab(metrics["warehouse"], metrics["abc"]).reindex(columns=list("ABC"), fill_value=0)
+        for label in "ABC":
+            summary[f"{label.lower()}_skus"] = counts[label].reindex(summary.index, fill_value=0)
+        return summary
+
+    def yearly_warehouse_metrics(self) -> "pd.DataFrame":
+        """按自然年计算每个仓库的汇总指标，复用已加载的流水；索引为 (年份, 仓库名称)"""
+        if self.movements.empty:
+            return pd.DataFrame()
+        first = max(self.movements["day"].min().year, int(EARLIEST_DAY[:4]) + 1)
+        last = datetime.date.today().year
+        frames = {
+            year: self.warehouse_metrics(f"{year}-01-01", f"{year}-12-31")
+            for year in range(first, last + 1)
+        }
+        return pd.concat(frames, names=["year", "warehouse"])
+
+
+def abc_classes(warehouses: "pd.Series", consumption: "pd.Series") -> "pd.Series":
+    """
+    按仓库做ABC分类：库存编号按消耗金额从大到小累计，累计到之前的占比低于80%为A、低于95%为B，其余为C；
+    没有消耗的库存编号为C
+    """
+    frame = pd.DataFrame({"warehouse": warehouses, "value": consumption.clip(lower=0)})
+    frame = frame.sort_values(["warehouse", "value"], ascending=[True, False], kind="stable")
+    grouped = frame.groupby("warehouse", observed=True)["value"]
+    total = grouped.transform("sum")
+    before = (grouped.cumsum() - frame["value"]) / total.where(total > 0)
+    labels = np.select(
+        [(frame["value"] > 0) & (before < ABC_THRESHOLDS[0]), (frame["value"] > 0) & (before < ABC_THRESHOLDS[1])],
+        ["A", "B"], default="C"
+    )
+    return pd.Series(labels, index=frame.index).reindex(warehouses.index)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 流水按月归档
+功能：入库/出库流水表只保留未结账的月份（当前期），已结束的月份按年移入附加的归档数据库文件
+      （archive/warehouse_archive_YYYY.db），写入和近期报表的代价不随历史年数增长；
+      需要完整历史时附加归档文件，通过临时视图 ruku_all / chuku_all 查询
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+import glob
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from outbound_engine import begin_immediate
+from warehouse_schema import LEDGER_DATE_COLUMNS
+
+ARCHIVE_PREFIX = "warehouse_archive_"
+_ARCHIVE_FILE = re.compile(rf"^{ARCHIVE_PREFIX}(\d{{4}})\.db$")
+
+# 只归档 YYYY-MM 开头的日期，格式不规范或为空的流水留在当前期表中
+ISO_MONTH_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]*"
+
+
+def archive_path(archive_dir: str, year: str) -> str:
+    """某一年的归档文件路径"""
+    return os.path.join(archive_dir, f"{ARCHIVE_PREFIX}{year}.db")
+
+
+def next_period(period: str) -> str:
+    """YYYY-MM 的下一个月"""
+    year, month = int(period[:4]), int(period[5:7])
+    return f"{year + month // 12:04d}-{month % 12 + 1:02d}"
+
+
+def current_period() -> str:
+    """当前月份 YYYY-MM"""
+    return datetime.date.today().strftime("%Y-%m")
+
+
+def table_columns(conn: sqlite3.Connection, table: str, schema: str = "main") -> List[Tuple[str, str, int]]:
+    """表的 (列名, 声明类型, 主键序号) 列表"""
+    return [(name, declared, pk)
+            for _, name, declared, _, _, pk in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def ensure_archive_table(conn: sqlite3.Connection, schema: str, table: str):
+    """
+    在归档库中建立与主库结构相同的流水表（列顺序、类型和主键一致，不带外键）及日期索引
+
+    列顺序一致，SELECT * 才能直接用于 INSERT ... SELECT 和 UNION ALL 视图。
+    """
+    columns = table_columns(conn, table)
+    definitions = [f"{name} {declared}".strip() for name, declared, _ in columns]
+    primary_key = [name for name, _, pk in sorted(columns, key=lambda column: column[2]) if pk]
+    if primary_key:
+        definitions.append(f"PRIMARY KEY ({', '.join(primary_key)})")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {schema}.{table} ({', '.join(definitions)})")
+    date_column = LEDGER_DATE_COLUMNS[table]
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.{date_column}_IDX ON {table} ({date_column})")
+
+
+def closed_periods(conn: sqlite3.Connection, before: str) -> List[str]:
+    """当前期表中早于before（YYYY-MM）的全部月份"""
+    periods = set()
+    for table, date_column in LEDGER_DATE_COLUMNS.items():
+        rows = conn.execute(
+            f"SELECT DISTINCT substr({date_column}, 1, 7) FROM main.{table} "
+            f"WHERE {date_column} < ? AND {date_column} GLOB ?",
+            (before, ISO_MONTH_GLOB)
+        )
+        periods.update(row[0] for row in rows)
+    return sorted(periods)
+
+
+def attach(conn: sqlite3.Connection, path: str, schema: str):
+    """附加数据库文件（已附加时跳过）"""
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if schema not in attached:
+        conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+
+
+def archive_period(conn: sqlite3.Connection, schema: str, table: str, period: str,
+                   archive_file: str) -> int:
+    """
+    把一个月的流水从当前期表移到已附加的归档库
+
+    WAL模式下跨数据库文件的事务对每个文件分别原子，整体并不原子，因此分两个事务：
+    先复制到归档库并提交，再从当前期表删除与归档库中完全相同的行。任何一步中断都不会丢数据，
+    重新执行时已复制的行会被跳过；两步之间补录的同月流水留在当前期表，下次归档时再移走。
+    同一编号在归档库中已有不同内容的行时复制失败，该月保持原样。
+
+    Returns:
+        移出的行数
+    """
+    date_column = LEDGER_DATE_COLUMNS[table]
+    columns = [name for name, _, _ in table_columns(conn, table)]
+    select_list = ", ".join(columns)
+    period_filter = f"{date_column} >= ? AND {date_column} < ? AND {date_column} GLOB ?"
+    hot_period_filter = f"m.{date_column} >= ? AND m.{date_column} < ? AND m.{date_column} GLOB ?"
+    params = (period, next_period(period), ISO_MONTH_GLOB)
+
+    begin_immediate(conn)
+    try:
+        conn.execute(
+            f"INSERT INTO {schema}.{table} ({select_list}) "
+            f"SELECT {select_list} FROM main.{table} WHERE {period_filter} "
+            f"EXCEPT SELECT {select_list} FROM {schema}.{table} WHERE {period_filter}",
+            params + params
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    same_row = " AND ".join(f"a.{name} IS m.{name}" for name in columns)
+    begin_immediate(conn)
+    try:
+        moved = conn.execute(
+            f"DELETE FROM main.{table} WHERE rowid IN ("
+            f"SELECT m.rowid FROM main.{table} m JOIN {schema}.{table} a ON {same_row} "
+            f"WHERE {hot_period_filter})",
+            params
+        ).rowcount
+        conn.execute(
+            '''
+                INSERT INTO main.ledger_periods (ledger, period, archive_file, rows, archived_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (ledger, period) DO UPDATE SET
+                    rows = rows + excluded.rows, archived_at = excluded.archived_at
+            ''',
+            (table, period, archive_file, moved, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return moved
+
+
+def archive_closed_periods(conn: sqlite3.Connection, archive_dir: str,
+                           before: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """
+    归档早于before的全部月份
+
+    Args:
+        conn: 写连接（不能处于事务中）
+        archive_dir: 归档文件目录
+        before: YYYY-MM，早于该月的流水被归档，默认为当前月（当前月及以后留在当前期表）
+
+    Returns:
+        {月份: {流水表: 移出行数}}
+    """
+    before = before or current_period()
+    if not re.match(r"^\d{4}-\d{2}$", before):
+        raise ValueError(f"归档截止月份应为 YYYY-MM 格式: {before}")
+    conn.commit()
+    os.makedirs(archive_dir, exist_ok=True)
+
+    results: Dict[str, Dict[str, int]] = {}
+    periods = closed_periods(conn, before)
+    for year in sorted({period[:4] for period in periods}):
+        schema = f"archive_{year}"
+        path = archive_path(archive_dir, year)
+        attach(conn, path, schema)
+        try:
+            for table in LEDGER_DATE_COLUMNS:
+                ensure_archive_table(conn, schema, table)
+            conn.commit()
+            for period in (p for p in periods if p.startswith(year)):
+                results[period] = {
+                    table: archive_period(conn, schema, table, period, os.path.basename(path))
+                    for table in LEDGER_DATE_COLUMNS
+                }
+        finally:
+            conn.execute(f"DETACH DATABASE {schema}")
+    return results
+
+
+@contextmanager
+def temp_writable(conn: sqlite3.Connection):
+    """只读连接（query_only）建立临时视图时暂时解除只读，结束后恢复"""
+    query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+    if query_only:
+        conn.execute("PRAGMA query_only = OFF")
+    try:
+        yield
+    finally:
+        if query_only:
+            conn.execute("PRAGMA query_only = ON")
+
+
+def archive_files(archive_dir: str) -> List[Tuple[str, str]]:
+    """归档目录中的 (年份, 文件路径)，按年份排序"""
+    files = []
+    for path in glob.glob(os.path.join(archive_dir, f"{ARCHIVE_PREFIX}*.db")):
+        match = _ARCHIVE_FILE.match(os.path.basename(path))
+        if match:
+            files.append((match.group(1), path))
+    return sorted(files)
+
+
+def attach_archives(conn: sqlite3.Connection, archive_dir: str,
+                    years: Optional[List[str]] = None) -> List[str]:
+    """
+    附加归档文件，并建立包含当前期和全部归档的临时视图 ruku_all / chuku_all
+
+    临时视图只对本连接可见；附加数量受SQLite的ATTACH上限限制（默认10个），
+    历史年数更多时用years只附加需要的年份。
+
+    Returns:
+        附加的schema名称
+    """
+    files = [(year, path) for year, path in archive_files(archive_dir) if years is None or year in years]
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(conn, "getlimit") else 10
+    if len(files) > limit:
+        raise ValueError(f"归档文件有 {len(files)} 个，超过可附加的上限 {limit}，请用years指定年份")
+    conn.commit()
+    schemas = []
+    for year, path in files:
+        schema = f"archive_{year}"
+        attach(conn, path, schema)
+        schemas.append(schema)
+
+    with temp_writable(conn):
+        for table in LEDGER_DATE_COLUMNS:
+            parts = [f"SELECT * FROM main.{table}"]
+            parts += [f"SELECT * FROM {schema}.{table}" for schema in schemas
+                      if conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = ?",
+                                      (table,)).fetchone()]
+            conn.execute(f"DROP VIEW IF EXISTS temp.{table}_all")
+            conn.execute(f"CREATE TEMP VIEW {table}_all AS " + " UNION ALL ".join(parts))
+        conn.commit()
+    return schemas
+
+
+def detach_archives(conn: sqlite3.Connection):
+    """删除临时视图并分离全部归档文件"""
+    conn.commit()
+    with temp_writable(conn):
+        for table in LEDGER_DATE_COLUMNS:
+            conn.execute(f"DROP VIEW IF EXISTS temp.{table}_all")
+        conn.commit()
+    for _, schema, _ in conn.execute("PRAGMA database_list").fetchall():
+        if schema.startswith("archive_"):
+            conn.execute(f"DETACH DATABASE {schema}")
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 操作日志与库存快照
+功能：每次提交后把库存变动追加到只增不改的JSONL操作日志（批量fsync），并定期写出全部库存的快照；
+      恢复和“某一时刻的库存”查询只需加载最近的快照，再重放其后的一段日志，不必重新扫描全部流水
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 日志分段和快照文件名，数字为起始/覆盖到的序号
+SEGMENT_PREFIX = "journal-"
+SNAPSHOT_PREFIX = "snapshot-"
+_SEGMENT_FILE = re.compile(rf"^{SEGMENT_PREFIX}(\d+)\.jsonl$")
+_SNAPSHOT_FILE = re.compile(rf"^{SNAPSHOT_PREFIX}(\d+)\.json$")
+
+# 写入方在日志目录中持有排他锁的文件，同一目录同时只能有一个写入方
+LOCK_FILE = "LOCK"
+
+# 库存状态：库存编号 -> [仓库名称, 数量, 单价]
+StockState = Dict[str, list]
+
+
+def now_timestamp() -> str:
+    """日志时间戳（精确到微秒，字符串顺序即时间顺序）"""
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def moment_bound(moment: str) -> str:
+    """
+    把查询时刻规范为可与时间戳直接比较的上界
+
+    只给日期（YYYY-MM-DD）时表示当天结束；给到秒时包含该秒内的全部操作。
+    """
+    moment = moment.strip().replace("T", " ")
+    if len(moment) == 10:
+        return moment + " 23:59:59.999999"
+    if len(moment) == 19:
+        return moment + ".999999"
+    return moment
+
+
+def load_stock(conn: sqlite3.Connection) -> StockState:
+    """从kucun表读取当前库存状态"""
+    return {
+        code: [warehouse, quantity or 0, price or 0.0]
+        for code, warehouse, quantity, price in conn.execute(
+            "SELECT bianhao, cangkumingcheng, shuliang, danjia FROM kucun"
+        )
+    }
+
+
+def apply_event(state: StockState, event: Dict):
+    """把一条日志事件应用到库存状态（与数据库中UPDATE的语义相同，未知编号忽略）"""
+    if event["op"] == "set":
+        state[event["code"]] = [event["warehouse"], event["quantity"], event["price"]]
+        return
+    if event["op"] == "drop":
+        state.pop(event["code"], None)
+        return
+    item = state.get(event["code"])
+    if item is not None:
+        item[1] += event["delta"]
+
+
+def lock_file_exclusive(f) -> bool:
+    """对打开的文件加非阻塞排他锁，已被其他打开者持有时返回False；文件关闭时锁自动释放"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class OperationJournal:
+    """只增不改的库存操作日志，按快照分段"""
+
+    def __init__(self, journal_dir: str, fsync_every: int = 100, fsync_interval: float = 1.0,
+                 snapshot_every: int = 10000):
+        """
+        Args:
+            journal_dir: 日志和快照所在目录
+            fsync_every: 累计这么多条未落盘的事件后fsync一次
+            fsync_interval: 距上次fsync超过这么久（秒）时，下一次追加后fsync
+            snapshot_every: 每追加这么多条事件写一个快照并开始新的日志分段
+        """
+        self.journal_dir = journal_dir
+        self.fsync_every = max(fsync_every, 1)
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = max(snapshot_every, 1)
+        self.state: StockState = {}
+        self.seq = 0
+        self._lock = threading.RLock()
+        self._file = None
+        # 写入方持有的目录锁文件，只读打开时为None
+        self._lock_file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._since_snapshot = 0
+        # 快照路径 -> 快照时间，时刻查询选择快照时不必反复读取快照文件
+        self._snapshot_times: Dict[str, str] = {}
+
+    # ------------------------------------------------------------------ 文件
+
+    def _files(self, pattern: "re.Pattern") -> List[Tuple[int, str]]:
+        """目录中匹配的 (序号, 路径)，按序号排序"""
+        files = []
+        for path in glob.glob(os.path.join(self.journal_dir, "*")):
+            match = pattern.match(os.path.basename(path))
+            if match:
+                files.append((int(match.group(1)), path))
+        return sorted(files)
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """日志分段 (起始序号, 路径)"""
+        return self._files(_SEGMENT_FILE)
+
+    def snapshots(self) -> List[Tuple[int, str]]:
+        """快照 (覆盖到的序号, 路径)"""
+        return self._files(_SNAPSHOT_FILE)
+
+    @staticmethod
+    def read_snapshot(path: str) -> Dict:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def read_events(self, after_seq: int = 0) -> Iterator[Dict]:
+        """按顺序读取序号大于after_seq的全部事件，只打开可能包含这些事件的分段"""
+        segments = self.segments()
+        for i, (start, path) in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1][0] <= after_seq + 1:
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        return  # 写了一半的末行
+                    event = json.loads(line)
+                    if event["seq"] > after_seq:
+                        yield event
+
+    # ------------------------------------------------------------------ 打开与恢复
+
+    def open(self, conn: Optional[sqlite3.Connection] = None) -> bool:
+        """
+        以写入方身份打开：锁定日志目录，加载最近的快照并重放其后的日志，恢复出日志记录的库存状态
+
+        目录锁在close时释放，已被其他进程（或本进程的另一个实例）持有时抛出RuntimeError，
+        两个写入方交替追加会产生重复的序号。
+        给出conn时与kucun表核对：日志目录为空时以数据库当前库存作为起点快照；
+        不一致（例如日志未落盘就断电，或其他程序直接修改了数据库）时，把差异作为校正事件
+        （op为set/drop，ref为"reconcile"）追加到日志，以数据库为准，之前的历史保持不变。
+
+        Returns:
+            日志状态是否与数据库一致（未给出conn时为True）
+        """
+        with self._lock:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._acquire_dir_lock()
+            try:
+                return self._open_writer(conn)
+            except Exception:
+                self.close()
+                raise
+
+    def open_read_only(self):
+        """
+        只读打开：加载最近的快照并重放其后的日志，不加锁、不修复末行、不追加
+
+        可与正在写入的进程同时使用（写入方的末行写了一半时忽略该行），用于查询和核对；
+        只读打开后append和snapshot抛出RuntimeError。按时刻查询（stock_as_of）不需要先打开。
+        """
+        with self._lock:
+            self._load_state()
+
+    def _acquire_dir_lock(self):
+        """锁定日志目录，已被其他写入方持有时抛出RuntimeError"""
+        if self._lock_file is not None:
+            return
+        f = open(os.path.join(self.journal_dir, LOCK_FILE), "a+")
+        if not lock_file_exclusive(f):
+            f.close()
+            raise RuntimeError(f"操作日志目录已被其他进程打开写入: {self.journal_dir}")
+        self._lock_file = f
+
+    def _load_state(self) -> bool:
+        """从最近的快照和其后的日志恢复库存状态，返回是否有快照"""
+        self.state, self.seq = {}, 0
+        snapshots = self.snapshots()
+        if snapshots:
+            snapshot = self.read_snapshot(snapshots[-1][1])
+            self.seq = snapshot["seq"]
+            self.state = {row[0]: list(row[1:]) for row in snapshot["stock"]}
+        for event in self.read_events(self.seq):
+            apply_event(self.state, event)
+            self.seq = event["seq"]
+        self._since_snapshot = 0
+        return bool(snapshots)
+
+    def _open_writer(self, conn: Optional[sqlite3.Connection]) -> bool:
+        """open的主体，调用时已持有目录锁"""
+        self._repair_tail()
+        has_snapshot = self._load_state()
+
+        current = load_stock(conn) if conn is not None else None
+        if current is not None and not has_snapshot:
+            self.state = current
+            self.snapshot(reason="初始")
+        self._open_segment()
+        if current is None or current == self.state:
+            return True
+        corrections = [
+            {"op": "set", "ref": "reconcile", "code": code, "warehouse": item[0],
+             "quantity": item[1], "price": item[2]}
+            for code, item in sorted(current.items()) if self.state.get(code) != item
+        ]
+        corrections += [{"op": "drop", "ref": "reconcile", "code": code}
+                        for code in sorted(set(self.state) - set(current))]
+        self.append(corrections)
+        self.sync()
+        return False
+
+    def _repair_tail(self):
+        """截掉最后一个分段中写了一半的末行（崩溃时可能出现）"""
+        segments = self.segments()
+        if not segments:
+            return
+        path = segments[-1][1]
+        with open(path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+
+    def _open_segment(self):
+        """追加到最新的分段；最新快照之后还没有分段时新建"""
+        if self._file is not None:
+            self._file.close()
+        segments = self.segments()
+        snapshots = self.snapshots()
+        if segments and (not snapshots or segments[-1][0] > snapshots[-1][0]):
+            path = segments[-1][1]
+        else:
+            path = os.path.join(self.journal_dir, f"{SEGMENT_PREFIX}{self.seq + 1:012d}.jsonl")
+        self._file = open(path, "a", encoding="utf-8")
+
+    # ------------------------------------------------------------------ 写入
+
+    def append(self, events: Iterable[Dict]) -> int:
+        """
+        追加一组已经提交到数据库的事件
+
+        events中每项为 {"op": "inbound"/"outbound", "ref": 单据编号, "code": 库存编号, "delta": 数量变化}、
+        {"op": "set", "code", "warehouse", "quantity", "price"}（新增或校正库存）或 {"op": "drop", "code"}。
+        每次追加都写入操作系统缓冲（其他进程立即可读），按fsync_every/fsync_interval批量fsync。
+
+        Returns:
+            最后一条事件的序号
+        """
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("操作日志未以写入方式打开")
+            timestamp = now_timestamp()
+            lines = []
+            for event in events:
+                self.seq += 1
+                event = {"seq": self.seq, "ts": timestamp, **event}
+                apply_event(self.state, event)
+                lines.append(json.dumps(event, ensure_ascii=False))
+            if not lines:
+                return self.seq
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            self._unsynced += len(lines)
+            self._since_snapshot += len(lines)
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self.sync()
+            if self._since_snapshot >= self.snapshot_every:
+                self.snapshot()
+            return self.seq
+
+    def sync(self):
+        """把已追加的事件写入磁盘"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def snapshot(self, reason: str = "定期") -> str:
+        """
+        写出当前库存状态的快照，并开始新的日志分段
+
+        快照先写临时文件再改名，不会出现写了一半的快照。
+
+        Returns:
+            快照文件路径
+        """
+        with self._lock:
+            if self._lock_file is None:
+                raise RuntimeError("操作日志未以写入方式打开")
+            if self._file is not None:
+                self.sync()
+            path = os.path.join(self.journal_dir, f"{SNAPSHOT_PREFIX}{self.seq:012d}.json")
+            temp_path = path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "seq": self.seq,
+                    "ts": now_timestamp(),
+                    "reason": reason,
+                    "stock": [[code, *item] for code, item in sorted(self.state.items())],
+                }, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            self._snapshot_times.pop(path, None)
+            self._since_snapshot = 0
+            if self._file is not None:
+                self._open_segment()
+            return path
+
+    def close(self):
+        """落盘并关闭当前分段，释放目录锁"""
+        with self._lock:
+            if self._file is not None:
+                self.sync()
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    # ------------------------------------------------------------------ 查询
+
+    def stock_as_of(self, moment: str, codes: Optional[Iterable[str]] = None) -> StockState:
+        """
+        某一时刻（日志时间）的库存状态
+
+        从时刻之前最近的快照开始，只重放其后到该时刻为止的日志。只读取文件，不需要先打开，
+        也不会修复或追加日志，可在其他进程写入时使用。
+
+        Args:
+            moment: YYYY-MM-DD（当天结束时）或 YYYY-MM-DD HH:MM:SS
+            codes: 只返回这些库存编号，默认全部
+
+        Returns:
+            库存编号 -> [仓库名称, 数量, 单价]；早于第一个快照的时刻返回空字典
+        """
+        bound = moment_bound(moment)
+        self.sync()
+        base_path = None
+        for _, path in reversed(self.snapshots()):
+            if path not in self._snapshot_times:
+                self._snapshot_times[path] = self.read_snapshot(path)["ts"]
+            if self._snapshot_times[path] <= bound:
+                base_path = path
+                break
+        if base_path is None:
+            return {}
+        base = self.read_snapshot(base_path)
+        wanted = set(codes) if codes is not None else None
+        state = {row[0]: list(row[1:]) for row in base["stock"]
+                 if wanted is None or row[0] in wanted}
+        for event in self.read_events(base["seq"]):
+            if event["ts"] > bound:
+                break
+            if wanted is None or event["code"] in wanted:
+                apply_event(state, event)
+        return state
+
+    def verify(self, conn: sqlite3.Connection) -> Dict[str, Tuple]:
+        """与kucun表核对，返回不一致的 {库存编号: (日志中的数量, 数据库中的数量)}"""
+        with self._lock:
+            current = load_stock(conn)
+            return {
+                code: ((self.state.get(code) or [None, None])[1], (current.get(code) or [None, None])[1])
+                for code in set(current) | set(self.state)
+                if current.get(code) != self.state.get(code)
+            }
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 原子出库引擎
+功能：在 BEGIN IMMEDIATE 事务中用一条带条件的UPDATE同时完成库存校验和扣减，
+      根据影响行数判断是否成功，遇到SQLITE_BUSY时指数退避重试，多进程并发出库不会超卖
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+import random
+import sqlite3
+import time
+from typing import Callable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+BUSY_ERROR_CODES = {
+    getattr(sqlite3, "SQLITE_BUSY", 5),
+    getattr(sqlite3, "SQLITE_LOCKED", 6),
+}
+
+
+def is_busy_error(error: Exception) -> bool:
+    """是否为数据库被其他连接锁定的错误"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        # 扩展错误码的低8位是主错误码（如SQLITE_BUSY_SNAPSHOT）
+        return (code & 0xFF) in BUSY_ERROR_CODES
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def retry_on_busy(func: Callable[[], T], max_retries: int = 8,
+                  base_delay: float = 0.005, max_delay: float = 0.5) -> T:
+    """执行func，遇到SQLITE_BUSY时按带随机抖动的指数退避重试"""
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt >= max_retries:
+                raise
+            delay = min(base_delay * (2 ** attempt), max_delay)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+def begin_immediate(conn: sqlite3.Connection, max_retries: int = 8):
+    """开启立即获取写锁的事务，忙时重试"""
+    retry_on_busy(lambda: conn.execute("BEGIN IMMEDIATE"), max_retries)
+
+
+class OutboundEngine:
+    """原子出库引擎"""
+
+    def __init__(self, conn: sqlite3.Connection, max_retries: int = 8,
+                 base_delay: float = 0.005, max_delay: float = 0.5):
+        """
+        初始化出库引擎
+
+        Args:
+            conn: 数据库连接
+            max_retries: 遇到SQLITE_BUSY时的最大重试次数
+            base_delay: 第一次重试前的等待时间（秒），之后按指数增长
+            max_delay: 单次等待时间上限（秒）
+        """
+        self.conn = conn
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def outbound(self, outbound_code: str, inventory_code: str, goods_code: str,
+                 quantity: int, name: str, price: float,
+                 outbound_date: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        执行一次出库
+
+        连接已处于事务中时（例如由调用方统一提交的批量写入），直接在该事务内执行，
+        由调用方负责提交；否则自行开启 BEGIN IMMEDIATE 事务并提交。
+
+        Returns:
+            (是否成功, 说明)
+        """
+        if quantity <= 0:
+            return False, "出库数量必须大于0"
+        outbound_date = outbound_date or datetime.datetime.now().strftime("%Y-%m-%d")
+        params = (outbound_code, inventory_code, goods_code, quantity, name, outbound_date, price)
+
+        if self.conn.in_transaction:
+            return self._apply(*params)
+        return retry_on_busy(lambda: self._apply_in_transaction(params),
+                             self.max_retries, self.base_delay, self.max_delay)
+
+    def _apply_in_transaction(self, params: Tuple) -> Tuple[bool, str]:
+        """在自己开启的立即事务中执行出库并提交"""
+        begin_immediate(self.conn, self.max_retries)
+        try:
+            result = self._apply(*params)
+        except Exception:
+            self.conn.rollback()
+            raise
+        if result[0]:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        return result
+
+    def _apply(self, outbound_code: str, inventory_code: str, goods_code: str,
+               quantity: int, name: str, outbound_date: str, price: float) -> Tuple[bool, str]:
+        """库存校验与扣减合并为一条条件UPDATE，影响0行即库存不足或库存编号不存在"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "UPDATE kucun SET shuliang = shuliang - ? WHERE bianhao = ? AND shuliang >= ?",
+            (quantity, inventory_code, quantity)
+        )
+        if cursor.rowcount == 0:
+            # 只有失败时才多读一次，用于给出具体原因
+            cursor.execute("SELECT shuliang FROM kucun WHERE bianhao = ?", (inventory_code,))
+            row = cursor.fetchone()
+            if row is None:
+                return False, f"库存编号 {inventory_code} 不存在"
+            return False, f"库存不足，当前库存: {row[0]}, 需要: {quantity}"
+
+        try:
+            cursor.execute(
+                "INSERT INTO chuku VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (outbound_code, inventory_code, goods_code, quantity, name, outbound_date, price)
+            )
+        except sqlite3.IntegrityError:
+            # 撤销本行已做的扣减；自行开启的事务会整体回滚，外部事务则需要在这里补回
+            cursor.execute(
+                "UPDATE kucun SET shuliang = shuliang + ? WHERE bianhao = ?",
+                (quantity, inventory_code)
+            )
+            return False, f"出库编号 {outbound_code} 重复"
+        return True, "出库成功"
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - Parquet列式快照导出
+功能：把全部数据表和库存、仓库汇总、供应关系三个派生视图分批读出，写成压缩、字典编码的Parquet文件，
+      入库/出库流水按日期分区（Hive目录格式），供下游分析直接扫描，不受xlsx单表行数限制
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow是可选依赖，只有导出快照时需要
+    pa = pq = None
+
+from connection_profiles import open_connection
+from ledger_archive import attach_archives
+from row_source import report_query
+from warehouse_schema import BASE_TABLES, LEDGER_DATE_COLUMNS
+
+# 导出的派生视图（与Excel报表的工作表同名、同查询）
+SNAPSHOT_VIEWS = ("库存", "仓库汇总", "供应关系")
+
+# 分区粒度 -> (分区目录的键名, 取日期字符串前几位)
+PARTITION_GRANULARITY = {"month": ("month", 7), "day": ("day", 10)}
+
+# 日期为空时使用的分区目录值（与Hive、pyarrow的默认约定相同）
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+MANIFEST_FILE = "_snapshot.json"
+
+
+def require_pyarrow():
+    """检查pyarrow是否可用"""
+    if pa is None:
+        raise RuntimeError("导出Parquet快照需要安装pyarrow（pip install pyarrow）")
+
+
+def arrow_type(declared: str, python_type: Optional[type] = None):
+    """按SQLite声明类型的亲和性（或视图列的Python类型）选择Arrow类型"""
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is str:
+        return pa.string()
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return pa.int64()
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB", "DEC", "NUM")):
+        return pa.float64()
+    return pa.string()
+
+
+def table_schema(conn: sqlite3.Connection, table: str):
+    """数据表的Arrow结构（列名与数据库相同）"""
+    columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    return pa.schema([(name, arrow_type(declared)) for _, name, declared, _, _, _ in columns])
+
+
+def view_schema(title: str):
+    """派生视图的Arrow结构（列名与Excel报表表头相同）"""
+    columns, _, _ = report_query(title)
+    return pa.schema([(column.name, arrow_type("", column.type)) for column in columns])
+
+
+def to_record_batch(rows: List[Tuple], schema):
+    """
+    把一批元组行转换为RecordBatch
+
+    SQLite允许列中混入其他类型的值（例如数量列中的文本），无法按声明类型转换时该列改存字符串，
+    返回的批次结构因此可能与schema不同，由调用方处理。
+    """
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if value is None else str(value) for value in values],
+                                   type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, names=schema.names)
+
+
+class SnapshotFileWriter:
+    """一个Parquet文件的写入器：字符串列字典编码，遇到类型不一致的批次时整列改为字符串"""
+
+    def __init__(self, path: str, schema, compression: str):
+        self.path = path
+        self.schema = schema
+        self.compression = compression
+        self.writer = None
+        self.rows = 0
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        dictionary_columns = [field.name for field in self.schema if pa.types.is_string(field.type)]
+        self.writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression,
+                                       use_dictionary=dictionary_columns or False)
+
+    def write(self, batch):
+        if not batch.schema.equals(self.schema):
+            self._widen(batch.schema)
+            batch = batch.cast(self.schema)
+        if self.writer is None:
+            self._open()
+        self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def _widen(self, batch_schema):
+        """把出现字符串值的列改为字符串；已经写入的行读出转换后重新写入"""
+        fields = [
+            pa.field(field.name, pa.string()) if not batch_field.type.equals(field.type) else field
+            for field, batch_field in zip(self.schema, batch_schema)
+        ]
+        self.schema = pa.schema(fields)
+        if self.writer is not None:
+            self.writer.close()
+            written = pq.read_table(self.path).cast(self.schema)
+            self._open()
+            self.writer.write_table(written)
+
+    def close(self):
+        # 空表也写出只有结构的文件，下游读取时列信息不缺失
+        if self.writer is None:
+            self._open()
+        self.writer.close()
+
+
+def partition_value(date, prefix_length: int) -> str:
+    """流水日期对应的分区目录值"""
+    if not date:
+        return NULL_PARTITION
+    # 2024/01/15 之类的写法不能直接作为目录名
+    return str(date)[:prefix_length].replace("/", "-").replace("\\", "-")
+
+
+def iter_batches(cursor: sqlite3.Cursor, batch_size: int) -> Iterator[List[Tuple]]:
+    """按批次读取查询结果"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def export_table(conn: sqlite3.Connection, output_dir: str, table: str, batch_size: int,
+                 compression: str) -> Dict:
+    """导出一个不分区的数据表或视图到 <目录>/<名称>.parquet"""
+    if table in BASE_TABLES:
+        schema = table_schema(conn, table)
+        cursor = conn.execute(f"SELECT * FROM {table} ORDER BY rowid")
+    else:
+        schema = view_schema(table)
+        _, query, params = report_query(table)
+        cursor = conn.execute(query, params)
+    writer = SnapshotFileWriter(os.path.join(output_dir, f"{table}.parquet"), schema, compression)
+    try:
+        for rows in iter_batches(cursor, batch_size):
+            writer.write(to_record_batch(rows, schema))
+    finally:
+        writer.close()
+    return {"rows": writer.rows, "files": 1}
+
+
+def export_ledger(conn: sqlite3.Connection, output_dir: str, table: str, partition: str,
+                  batch_size: int, compression: str, with_archives: bool = False) -> Dict:
+    """
+    按日期分区导出流水表：<目录>/<表名>/month=2024-01/part-0.parquet
+
+    按日期列的索引顺序读取，同一分区的行连续出现，任何时刻只打开一个文件；
+    日期格式不规范导致同一分区再次出现时写入新的part文件。
+    with_archives为True时从包含归档的临时视图<表名>_all读取完整历史（见ledger_archive）。
+    """
+    key, prefix_length = PARTITION_GRANULARITY[partition]
+    date_column = LEDGER_DATE_COLUMNS[table]
+    schema = table_schema(conn, table)
+    date_index = schema.names.index(date_column)
+    if with_archives:
+        cursor = conn.execute(f"SELECT * FROM {table}_all ORDER BY {date_column}")
+    else:
+        cursor = conn.execute(f"SELECT * FROM {table} ORDER BY {date_column}, rowid")
+
+    table_dir = os.path.join(output_dir, table)
+    os.makedirs(table_dir, exist_ok=True)
+    parts: Dict[str, int] = {}
+    writer: Optional[SnapshotFileWriter] = None
+    current = None
+    rows_total = 0
+    files = 0
+
+    def flush(pending: List[Tuple]):
+        if pending:
+            writer.write(to_record_batch(pending, schema))
+
+    try:
+        for rows in iter_batches(cursor, batch_size):
+            pending: List[Tuple] = []
+            for row in rows:
+                value = partition_value(row[date_index], prefix_length)
+                if value != current:
+                    flush(pending)
+                    pending = []
+                    if writer is not None:
+                        writer.close()
+                        # 前一个分区中改为字符串的列，后续分区沿用，各分区结构尽量一致
+                        schema = writer.schema
+                    part = parts.get(value, 0)
+                    parts[value] = part + 1
+                    path = os.path.join(table_dir, f"{key}={value}", f"part-{part}.parquet")
+                    writer = SnapshotFileWriter(path, schema, compression)
+                    current = value
+                    files += 1
+                pending.append(row)
+            flush(pending)
+            rows_total += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return {"rows": rows_total, "files": files, "partitioned_by": f"{key}({date_column})"}
+
+
+def export_snapshot(db_path: str, output_dir: str, partition: str = "month",
+                    batch_size: int = 50000, compression: str = "zstd",
+                    archive_dir: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    导出完整的Parquet快照
+
+    全部查询在同一个读事务中执行，各文件对应同一时刻的数据；先写入临时目录，
+    完成后替换output_dir，读者不会看到写了一半的快照。
+
+    Args:
+        db_path: 数据库文件路径
+        output_dir: 快照目录
+        partition: 流水表的分区粒度，month或day
+        batch_size: 每批从游标读取的行数
+        compression: Parquet压缩算法（zstd / snappy / gzip / none）
+        archive_dir: 流水归档目录，给出且存在归档文件时流水包含已归档的月份
+
+    Returns:
+        各数据表和视图的 {"rows": 行数, "files": 文件数}
+    """
+    require_pyarrow()
+    if partition not in PARTITION_GRANULARITY:
+        raise ValueError(f"未知的分区粒度: {partition}（可选: {', '.join(PARTITION_GRANULARITY)}）")
+
+    output_dir = os.path.abspath(output_dir)
+    temp_dir = f"{output_dir}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+
+    conn = open_connection(db_path, "read-replica")
+    try:
+        with_archives = bool(archive_dir and attach_archives(conn, archive_dir))
+        conn.execute("BEGIN")
+        results = {}
+        marks = {}
+        for table in BASE_TABLES:
+            if table in LEDGER_DATE_COLUMNS:
+                results[table] = export_ledger(conn, os.path.join(temp_dir, "tables"), table,
+                                               partition, batch_size, compression, with_archives)
+                marks[table] = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+            else:
+                results[table] = export_table(conn, os.path.join(temp_dir, "tables"), table,
+                                              batch_size, compression)
+        for view in SNAPSHOT_VIEWS:
+            results[view] = export_table(conn, os.path.join(temp_dir, "views"), view,
+                                         batch_size, compression)
+        conn.commit()
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    finally:
+        conn.close()
+
+    manifest = {
+        "generated": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "db_path": db_path,
+        "partition": partition,
+        "compression": compression,
+        "ledger_marks": marks,
+        "includes_archives": with_archives,
+        "objects": results,
+    }
+    with open(os.path.join(temp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    # 替换旧快照：先移开旧目录再改名，失败时旧快照仍然保留
+    old_dir = f"{output_dir}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(output_dir):
+        os.rename(output_dir, old_dir)
+    os.rename(temp_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return results
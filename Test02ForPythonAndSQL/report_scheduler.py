@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - Excel报表后台调度器
+功能：合并短时间内的多次“报表已变更”事件，在后台线程中统一重建Excel报表，
+      使写操作在SQLite提交后立即返回
+作者：AI Assistant
+日期：2024
+"""
+
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class ReportScheduler:
+    """Excel报表后台调度器（防抖合并）"""
+
+    def __init__(self, report_func: Callable[[str], bool], delay: float = 1.0,
+                 max_delay: Optional[float] = None):
+        """
+        初始化报表调度器
+
+        Args:
+            report_func: 重建报表的回调函数，参数为操作说明，在后台线程中调用
+            delay: 合并窗口（秒），最后一次变更后静默这么久才重建报表
+            max_delay: 最长等待时间（秒），持续写入时最迟在首个变更后这么久重建，默认为delay的5倍
+        """
+        self.report_func = report_func
+        self.delay = max(delay, 0.0)
+        self.max_delay = max_delay if max_delay is not None else self.delay * 5
+        self._condition = threading.Condition()
+        self._pending: List[str] = []
+        self._first_dirty = 0.0
+        self._last_dirty = 0.0
+        self._running = False
+        self._busy = False
+        self._thread: Optional[threading.Thread] = None
+        self.report_count = 0
+
+    def start(self):
+        """启动后台线程（重复调用无副作用）"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="ReportScheduler", daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self, operation_name: str = ""):
+        """登记一次报表变更事件，立即返回"""
+        with self._condition:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_dirty = now
+            self._last_dirty = now
+            self._pending.append(operation_name)
+            self._condition.notify_all()
+        self.start()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """立即处理所有待重建事件并等待完成，返回是否在超时前完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            # 把时间窗口提前，让后台线程不再等待
+            self._first_dirty = self._last_dirty = float("-inf")
+            self._condition.notify_all()
+            while self._pending or self._busy:
+                if not self._running:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return not self._pending
+
+    def stop(self, flush: bool = True):
+        """停止后台线程，flush为True时先完成所有待重建事件"""
+        if flush:
+            self.flush()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def has_pending(self) -> bool:
+        """是否存在尚未写入报表的变更"""
+        with self._condition:
+            return bool(self._pending) or self._busy
+
+    def _run(self):
+        """后台线程主循环"""
+        while True:
+            with self._condition:
+                while self._running:
+                    if self._pending:
+                        now = time.monotonic()
+                        due = min(self._last_dirty + self.delay, self._first_dirty + self.max_delay)
+                        if now >= due:
+                            break
+                        self._condition.wait(due - now)
+                    else:
+                        self._condition.wait()
+                if not self._running:
+                    return
+                operations = self._pending
+                self._pending = []
+                self._busy = True
+
+            try:
+                self.report_func(self._describe(operations))
+                self.report_count += 1
+            except Exception as e:
+                print(f"❌ 后台更新Excel报表失败: {e}")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    @staticmethod
+    def _describe(operations: List[str]) -> str:
+        """把合并的多个操作说明压缩成一条"""
+        names = [name for name in operations if name]
+        if not names:
+            return ""
+        if len(names) == 1:
+            return names[0]
+        return f"{names[-1]} 等{len(names)}项操作"
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 报表行数据源
+功能：定义报表各工作表的查询和列信息，直接从游标取得元组行交给Excel写入和控制台打印，
+      不再经过pandas DataFrame中转；pandas只在需要做数据分析时通过to_dataframe()按需导入
+作者：AI Assistant
+日期：2024
+"""
+
+import sqlite3
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from warehouse_schema import WAREHOUSE_SUMMARY_SQL
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 流水查询的rowid上限，未指定导出水位时取全部行
+MAX_ROWID = 2 ** 63 - 1
+
+
+class Column(NamedTuple):
+    """列信息：表头、值的类型、控制台打印宽度"""
+    name: str
+    type: type = str
+    width: int = 12
+
+
+class RowSource:
+    """一个工作表的数据：列信息加上从游标取得的元组行"""
+
+    def __init__(self, title: str, columns: Sequence[Union[Column, str]], rows: Iterable[Tuple]):
+        """
+        Args:
+            title: 工作表名称
+            columns: 列信息，也可以只给表头字符串
+            rows: 元组行，值保持SQLite返回的Python类型
+        """
+        self.title = title
+        self.columns: List[Column] = [
+            column if isinstance(column, Column) else Column(column) for column in columns
+        ]
+        self.rows: List[Tuple] = rows if isinstance(rows, list) else list(rows)
+
+    @classmethod
+    def from_query(cls, cursor: sqlite3.Cursor, title: str, columns: Sequence[Union[Column, str]],
+                   query: str, params: Tuple = ()) -> "RowSource":
+        """执行查询并取得全部行"""
+        cursor.execute(query, params)
+        return cls(title, columns, cursor.fetchall())
+
+    @property
+    def headers(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    @property
+    def empty(self) -> bool:
+        return not self.rows
+
+    def __iter__(self) -> Iterator[Tuple]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """转换为pandas DataFrame（需要安装pandas，仅供数据分析使用）"""
+        import pandas as pd
+        return pd.DataFrame(self.rows, columns=self.headers)
+
+
+# 报表工作表定义：(工作表名, 列信息, SQL, 流水表名)
+# 流水表的查询带有 rowid <= ? 条件，只导出水位之内的行
+REPORT_QUERIES: List[Tuple[str, List[Column], str, Optional[str]]] = [
+    ("操作员", [Column('姓名'), Column('联系方式')], 'SELECT * FROM caozuoyuan', None),
+    ("供应商", [Column('供应商编号'), Column('供应商名称'), Column('联系人'), Column('联系方式')],
+     'SELECT * FROM gongyingshang', None),
+    ("仓库", [Column('仓库名称'), Column('操作员'), Column('负责人'), Column('创建日期')],
+     'SELECT * FROM cangku', None),
+    ("库存", [Column('库存编号'), Column('仓库名称'), Column('数量', int, 8), Column('单价', float, 10),
+              Column('负责人', str, 10), Column('总价值', float)], '''
+        SELECT k.bianhao, k.cangkumingcheng, k.shuliang, k.danjia,
+               c.cangkufuzeren, (k.shuliang * k.danjia) as 总价值
+        FROM kucun k
+        LEFT JOIN cangku c ON k.cangkumingcheng = c.cangkumingcheng
+        ORDER BY k.cangkumingcheng, k.bianhao
+    ''', None),
+    ("入库记录", [Column('入库编号'), Column('货物编号'), Column('货物名称'), Column('数量', int, 8),
+                Column('单价', float, 10), Column('入库日期'), Column('供应商'), Column('入库金额', float)], '''
+        SELECT r.rukubianhao, r.huowubianhao, r.mingcheng, r.shuliang,
+               r.danjia, r.rukuriqi, r.gongyingshangmingcheng,
+               (r.shuliang * r.danjia) as 入库金额
+        FROM ruku r
+        WHERE r.rowid <= ?
+        ORDER BY r.rukuriqi DESC
+    ''', "ruku"),
+    ("出库记录", [Column('出库编号'), Column('货物编号'), Column('货物名称'), Column('数量', int, 8),
+                Column('单价', float, 10), Column('出库日期'), Column('出库金额', float)], '''
+        SELECT c.chukubianhao, c.huowubianhao, c.mingcheng, c.shuliang,
+               c.danjia, c.chukuriqi, (c.shuliang * c.danjia) as 出库金额
+        FROM chuku c
+        WHERE c.rowid <= ?
+        ORDER BY c.chukuriqi DESC
+    ''', "chuku"),
+    ("仓库汇总", [Column('仓库名称'), Column('负责人', str, 10), Column('操作员', str, 10),
+                Column('库存种类', int, 8), Column('总数量', int, 8), Column('总价值', float)],
+     WAREHOUSE_SUMMARY_SQL, None),
+    ("供应关系", [Column('供应商编号'), Column('供应商名称'), Column('仓库名称'), Column('联系人'), Column('联系方式')], '''
+        SELECT g.gongyingshangbianhao, s.gongyingshangmingcheng,
+               g.cangkumingcheng, s.lianxirren, s.lianxifangshi
+        FROM gongying g
+        LEFT JOIN gongyingshang s ON g.gongyingshangbianhao = s.gongyingshangbianhao
+        ORDER BY g.gongyingshangbianhao, g.cangkumingcheng
+    ''', None),
+]
+
+
+def report_query(title: str, marks: Optional[Dict[str, int]] = None) -> Tuple[List[Column], str, Tuple]:
+    """
+    取得一个报表工作表的 (列信息, SQL, 参数)
+
+    Args:
+        title: 工作表名称（REPORT_QUERIES中定义）
+        marks: 流水工作表名 -> 导出水位（rowid，与read_ledger_marks的结果相同），未给出时读取全部流水
+    """
+    for name, columns, query, ledger_table in REPORT_QUERIES:
+        if name == title:
+            params = ((marks or {}).get(name, MAX_ROWID),) if ledger_table else ()
+            return columns, query, params
+    raise KeyError(f"未定义的报表工作表: {title}")
+
+
+def fetch_report_source(cursor: sqlite3.Cursor, title: str,
+                        marks: Optional[Dict[str, int]] = None) -> RowSource:
+    """读取一个报表工作表的数据，参数含义同report_query"""
+    columns, query, params = report_query(title, marks)
+    return RowSource.from_query(cursor, title, columns, query, params)
+
+
+def fetch_report_sources(cursor: sqlite3.Cursor, include_ledgers: bool = True,
+                         marks: Optional[Dict[str, int]] = None) -> Dict[str, RowSource]:
+    """按报表顺序读取全部工作表的数据，include_ledgers为False时不读取入库/出库记录"""
+    return {
+        name: fetch_report_source(cursor, name, marks)
+        for name, _, _, ledger_table in REPORT_QUERIES
+        if include_ledgers or not ledger_table
+    }
+
+
+def print_row_source(source: RowSource):
+    """在控制台按列宽打印表头、分隔线和全部行"""
+    print(" ".join(f"{column.name:<{column.width}}" for column in source.columns))
+    print("-" * sum(column.width + 1 for column in source.columns))
+    for row in source.rows:
+        print(" ".join(f"{str(value):<{column.width}}" for column, value in zip(source.columns, row)))
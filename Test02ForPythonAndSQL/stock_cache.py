@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 内存库存缓存
+功能：连接时一次性加载kucun表，按库存编号保存数量和单价，入库/出库提交后同步更新（写穿），
+      通过 PRAGMA data_version 发现其他连接或进程的写入并重新加载，库存查询无需访问数据库
+作者：AI Assistant
+日期：2024
+"""
+
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class StockCache:
+    """库存编号 -> (数量, 单价) 的内存缓存"""
+
+    def __init__(self):
+        # 紧凑存储：编号到下标的字典 + 数量/单价数组 + 仓库名称列表
+        self._index: Dict[str, int] = {}
+        self._codes: List[str] = []
+        self._warehouses: List[str] = []
+        self._quantities = array("q")
+        self._prices = array("d")
+        # 全部仓库名称，汇总时没有库存的仓库也要列出
+        self._warehouse_names: Set[str] = set()
+        self._lock = threading.RLock()
+        self._data_version: Optional[int] = None
+        self.loaded = False
+        # 每次加载或写穿更新都会递增，调用方可据此判断缓存内容是否变化
+        self.version = 0
+
+    def load(self, conn: sqlite3.Connection):
+        """从数据库加载全部库存，并记录当前的data_version"""
+        with self._lock:
+            rows = conn.execute(
+                "SELECT bianhao, cangkumingcheng, shuliang, danjia FROM kucun"
+            ).fetchall()
+            self._index = {}
+            self._codes = []
+            self._warehouses = []
+            self._quantities = array("q")
+            self._prices = array("d")
+            self._warehouse_names = {
+                row[0] for row in conn.execute("SELECT cangkumingcheng FROM cangku")
+            }
+            for code, warehouse, quantity, price in rows:
+                self._append(code, warehouse, quantity, price)
+            self._data_version = self._read_data_version(conn)
+            self.loaded = True
+            self.version += 1
+
+    def invalidate(self):
+        """标记缓存失效，下次validate时重新加载"""
+        with self._lock:
+            self.loaded = False
+
+    def validate(self, conn: sqlite3.Connection) -> bool:
+        """
+        检查是否有其他连接修改过数据库，有则重新加载
+
+        data_version只在其他连接提交后变化，本连接的写入通过写穿更新缓存，不会触发重新加载。
+        conn必须是执行写入的那个连接。
+
+        Returns:
+            是否重新加载了缓存
+        """
+        with self._lock:
+            if self.loaded and self._read_data_version(conn) == self._data_version:
+                return False
+            self.load(conn)
+            return True
+
+    @staticmethod
+    def _read_data_version(conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _append(self, code: str, warehouse: str, quantity: Optional[int], price: Optional[float]):
+        self._index[code] = len(self._codes)
+        self._codes.append(code)
+        self._warehouses.append(warehouse)
+        self._quantities.append(int(quantity or 0))
+        self._prices.append(float(price or 0.0))
+
+    def get(self, code: str) -> Optional[Tuple[int, float]]:
+        """查询库存编号的 (数量, 单价)，不存在时返回None"""
+        with self._lock:
+            index = self._index.get(code)
+            if index is None:
+                return None
+            return self._quantities[index], self._prices[index]
+
+    def has_stock(self, code: str, quantity: int) -> bool:
+        """库存是否足够出库"""
+        item = self.get(code)
+        return item is not None and item[0] >= quantity
+
+    def put(self, code: str, warehouse: str, quantity: int, price: float):
+        """写穿：新增或替换一条库存"""
+        with self._lock:
+            index = self._index.get(code)
+            if index is None:
+                self._append(code, warehouse, quantity, price)
+            else:
+                self._warehouses[index] = warehouse
+                self._quantities[index] = int(quantity)
+                self._prices[index] = float(price)
+            self.version += 1
+
+    def add_warehouse(self, name: str):
+        """写穿：登记新建的仓库"""
+        with self._lock:
+            self._warehouse_names.add(name)
+            self.version += 1
+
+    def apply_delta(self, code: str, delta: int):
+        """写穿：按入库（正数）或出库（负数）调整数量，未知编号忽略（数据库中的UPDATE同样不影响任何行）"""
+        with self._lock:
+            index = self._index.get(code)
+            if index is not None:
+                self._quantities[index] += delta
+                self.version += 1
+
+    def apply_deltas(self, deltas: Dict[str, int]):
+        """写穿：批量调整数量"""
+        with self._lock:
+            for code, delta in deltas.items():
+                self.apply_delta(code, delta)
+
+    def rows(self) -> List[Tuple[str, str, int, float, float]]:
+        """按仓库、库存编号排序的 (编号, 仓库, 数量, 单价, 总价值) 列表"""
+        with self._lock:
+            rows = [
+                (code, self._warehouses[i], self._quantities[i], self._prices[i],
+                 self._quantities[i] * self._prices[i])
+                for code, i in self._index.items()
+            ]
+        rows.sort(key=lambda row: (row[1] or "", row[0]))
+        return rows
+
+    def summary(self) -> List[Tuple[str, int, int, float]]:
+        """按仓库名称排序的 (仓库, 库存种类, 总数量, 总价值) 列表，与cangkuhuizong表内容一致"""
+        with self._lock:
+            totals = {name: [0, 0, 0.0] for name in self._warehouse_names}
+            for i, warehouse in enumerate(self._warehouses):
+                if warehouse not in totals:
+                    continue
+                total = totals[warehouse]
+                total[0] += 1
+                total[1] += self._quantities[i]
+                # 与cangkuhuizong相同：每种库存的价值舍入到分后求和
+                total[2] += round(self._quantities[i] * self._prices[i], 2)
+        return [(name, count, quantity, round(value, 2)) for name, (count, quantity, value) in sorted(totals.items())]
+
+    def __len__(self) -> int:
+        return len(self._index)
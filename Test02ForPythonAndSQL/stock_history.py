@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 按日期查询历史库存
+功能：基于触发器逐日维护的累计变化表kucun_riji（见warehouse_schema迁移4），
+      查询任意日期结束时各库存编号、各仓库的数量和价值，每个库存编号只需两次索引查找，不扫描流水
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
+from ledger_archive import archive_files, attach_archives, detach_archives
+from outbound_engine import begin_immediate
+from warehouse_schema import LEDGER_DAILY_SQL, LEDGER_DAILY_TRIGGERS
+
+# 某库存编号截至某天（含）的累计变化；没有流水时为0
+_LEIJI_AT = '''
+    COALESCE((SELECT r.leiji FROM kucun_riji r
+              WHERE r.bianhao = k.bianhao AND r.riqi <= ?
+              ORDER BY r.riqi DESC LIMIT 1), 0)
+'''
+
+# 某库存编号全部流水的累计变化
+_LEIJI_LATEST = '''
+    COALESCE((SELECT r.leiji FROM kucun_riji r
+              WHERE r.bianhao = k.bianhao
+              ORDER BY r.riqi DESC LIMIT 1), 0)
+'''
+
+# 当前数量减去该日之后的全部变化，即该日结束时的数量
+STOCK_AS_OF_SQL = f'''
+    SELECT k.bianhao, k.cangkumingcheng,
+           k.shuliang - {_LEIJI_LATEST} + {_LEIJI_AT} AS shuliang,
+           k.danjia
+    FROM kucun k
+'''
+
+
+def normalize_day(day) -> str:
+    """把日期（date对象或 YYYY-MM-DD / YYYY/MM/DD 字符串）规范为 YYYY-MM-DD"""
+    if isinstance(day, (datetime.date, datetime.datetime)):
+        return day.strftime("%Y-%m-%d")
+    text = str(day).strip().replace("/", "-")[:10]
+    if not re.match(r"^\d{4}-\d{2}-\d{2}$", text):
+        raise ValueError(f"日期应为 YYYY-MM-DD 格式: {day}")
+    try:
+        # 形如 2024-13-45 的字符串格式正确但日期不存在，按字符串比较会得到没有意义的结果
+        datetime.date.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"日期不存在: {day}") from None
+    return text
+
+
+def stock_as_of(cursor: sqlite3.Cursor, day, codes: Optional[List[str]] = None,
+                warehouse: Optional[str] = None) -> List[Tuple[str, str, int, float, float]]:
+    """
+    某日结束时的库存
+
+    数量 = 当前数量 - 该日之后流水的累计变化。价值按当前单价计算（kucun只保存当前单价）。
+    流水归档（ledger_archive）删除当期表中的行时kucun_riji保持不变，已归档的月份仍可查询。
+
+    Args:
+        cursor: 数据库游标
+        day: 查询日期
+        codes: 只查询这些库存编号
+        warehouse: 只查询该仓库
+
+    Returns:
+        按仓库、库存编号排序的 (库存编号, 仓库名称, 数量, 单价, 价值) 列表
+    """
+    day = normalize_day(day)
+    conditions, params = [], [day]
+    if codes is not None:
+        conditions.append(f"k.bianhao IN ({', '.join('?' * len(codes))})")
+        params.extend(codes)
+    if warehouse is not None:
+        conditions.append("k.cangkumingcheng = ?")
+        params.append(warehouse)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = cursor.execute(
+        f"{STOCK_AS_OF_SQL} {where} ORDER BY k.cangkumingcheng, k.bianhao", params
+    ).fetchall()
+    return [(code, name, quantity, price, (quantity or 0) * (price or 0.0))
+            for code, name, quantity, price in rows]
+
+
+def warehouse_stock_as_of(cursor: sqlite3.Cursor, day) -> List[Tuple[str, int, int, float]]:
+    """
+    某日结束时的仓库汇总，与cangkuhuizong的列相同
+
+    Returns:
+        按仓库名称排序的 (仓库名称, 库存种类, 总数量, 总价值) 列表
+    """
+    return cursor.execute(f'''
+        SELECT c.cangkumingcheng, COUNT(s.bianhao),
+               COALESCE(SUM(s.shuliang), 0), COALESCE(SUM(s.shuliang * s.danjia), 0)
+        FROM cangku c
+        LEFT JOIN ({STOCK_AS_OF_SQL}) s ON s.cangkumingcheng = c.cangkumingcheng
+        GROUP BY c.cangkumingcheng
+        ORDER BY c.cangkumingcheng
+    ''', (normalize_day(day),)).fetchall()
+
+
+def daily_movements(cursor: sqlite3.Cursor, code: str, start=None,
+                    end=None) -> List[Tuple[str, int, int]]:
+    """一个库存编号逐日的 (日期, 当天变化, 累计变化)，可按日期范围过滤"""
+    conditions, params = ["bianhao = ?"], [code]
+    if start is not None:
+        conditions.append("riqi >= ?")
+        params.append(normalize_day(start))
+    if end is not None:
+        conditions.append("riqi <= ?")
+        params.append(normalize_day(end))
+    return cursor.execute(
+        f"SELECT riqi, bianhua, leiji FROM kucun_riji WHERE {' AND '.join(conditions)} ORDER BY riqi",
+        params
+    ).fetchall()
+
+
+def rebuild_daily(cursor: sqlite3.Cursor, include_archived: bool = False) -> int:
+    """
+    按当期流水（include_archived为True时使用ledger_archive.attach_archives建立的ruku_all/chuku_all）
+    重新计算kucun_riji，用于核对或修复；调用方负责提交
+
+    Returns:
+        写入的行数
+    """
+    ruku, chuku = ("ruku_all", "chuku_all") if include_archived else ("ruku", "chuku")
+    cursor.execute("DELETE FROM kucun_riji")
+    return cursor.execute(
+        "INSERT INTO kucun_riji (bianhao, riqi, bianhua, leiji) "
+        + LEDGER_DAILY_SQL.format(ruku=ruku, chuku=chuku)
+    ).rowcount
+
+
+def missing_daily_triggers(conn: sqlite3.Connection) -> List[str]:
+    """已建kucun_riji但缺少逐日触发器的流水表（批量导入临时删除后未能重建，例如导入进程中途退出）"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'kucun_riji'").fetchone():
+        return []
+    present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    return [table for table in LEDGER_DAILY_TRIGGERS if f"{table}_riji_AI" not in present]
+
+
+def suspend_daily_triggers(conn: sqlite3.Connection, tables: List[str]):
+    """删除这些流水表的逐日触发器，之后插入的流水不再逐行维护kucun_riji，须用restore_daily_triggers恢复"""
+    for table in tables:
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_riji_AI")
+    conn.commit()
+
+
+def restore_daily_triggers(conn: sqlite3.Connection, archive_dir: Optional[str] = None) -> int:
+    """
+    按当期流水和archive_dir下的全部归档重新计算kucun_riji，并在同一事务中重建缺少的逐日触发器
+
+    Returns:
+        kucun_riji写入的行数
+    """
+    with_archives = bool(archive_dir and archive_files(archive_dir))
+    if with_archives:
+        attach_archives(conn, archive_dir)
+    try:
+        conn.commit()
+        begin_immediate(conn)
+        try:
+            rows = rebuild_daily(conn.cursor(), include_archived=with_archives)
+            for sql in LEDGER_DAILY_TRIGGERS.values():
+                conn.execute(sql)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        if with_archives:
+            detach_archives(conn)
+    return rows
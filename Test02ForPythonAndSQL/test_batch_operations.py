@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 批量入库/出库测试
+功能：检查单笔、批量和run_operations三条写入路径的校验、保存点和整批回滚语义
+作者：AI Assistant
+日期：2024
+"""
+
+
+def count_rows(tool, table: str) -> int:
+    return tool.cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def inbound(code, inventory_code, quantity=3):
+    return (code, inventory_code, "G1", quantity, "螺丝", 1.5, "供应商1")
+
+
+def test_unknown_inventory_code_is_rejected_on_every_inbound_path(tool):
+    """不存在的库存编号在三条入库路径上都失败，且不留下入库流水或逐日累计行"""
+    assert tool.process_inbound(*inbound("R1", "NOPE")) is False
+    assert tool.process_inbound_batch([inbound("R2", "NOPE")]) == [("R2", False, "库存编号 NOPE 不存在")]
+    assert tool.run_operations([("inbound", inbound("R3", "NOPE"))]) == [("R3", False, "库存编号 NOPE 不存在")]
+
+    assert count_rows(tool, "ruku") == 0
+    assert tool.cursor.execute("SELECT COUNT(*) FROM kucun_riji WHERE bianhao = 'NOPE'").fetchone()[0] == 0
+    assert not tool.conn.in_transaction
+
+
+def test_run_operations_rolls_back_only_the_failed_operation(tool):
+    """每个操作一个保存点：失败的入库/出库只撤销自身，其余一起提交"""
+    results = tool.run_operations([
+        ("inbound", inbound("R1", "K1", 4)),
+        ("inbound", inbound("R2", "NOPE")),
+        ("outbound", ("C1", "K2", "G2", 99, "螺母", 4.0)),
+        ("outbound", ("C2", "K2", "G2", 2, "螺母", 4.0)),
+        ("inbound", inbound("R1", "K1", 1)),
+    ])
+    assert [ok for _, ok, _ in results] == [True, False, False, True, False]
+    assert tool.get_stock("K1") == 14
+    assert tool.get_stock("K2") == 3
+    assert count_rows(tool, "ruku") == 1
+    assert count_rows(tool, "chuku") == 1
+
+
+def test_run_operations_atomic_rolls_back_everything(tool):
+    """atomic=True时任一操作失败整批回滚，成功的操作标记为整批取消"""
+    results = tool.run_operations([
+        ("inbound", inbound("R1", "K1", 4)),
+        ("inbound", inbound("R2", "NOPE")),
+    ], atomic=True)
+    assert results == [("R1", False, "整批取消"), ("R2", False, "库存编号 NOPE 不存在")]
+    assert tool.get_stock("K1") == 10
+    assert count_rows(tool, "ruku") == 0
+
+
+def test_inbound_batch_partial_and_atomic(tool):
+    """批量入库：非原子时只写入有效行，原子时整批不写入"""
+    lines = [inbound("R1", "K1", 2), inbound("R2", "NOPE"), inbound("R3", "K1", 0), inbound("R1", "K2")]
+    assert tool.process_inbound_batch(lines, atomic=True)[0] == ("R1", False, "整批取消")
+    assert count_rows(tool, "ruku") == 0
+
+    results = tool.process_inbound_batch(lines)
+    assert [ok for _, ok, _ in results] == [True, False, False, False]
+    assert tool.get_stock("K1") == 12
+    assert tool.get_stock("K2") == 5
+
+
+def test_outbound_batch_checks_running_balance(tool):
+    """批量出库：同一库存编号的后续行按扣减后的余量校验"""
+    lines = [("C1", "K1", "G1", 6, "螺丝", 2.5), ("C2", "K1", "G1", 6, "螺丝", 2.5),
+             ("C3", "K1", "G1", 4, "螺丝", 2.5)]
+    assert [ok for _, ok, _ in tool.process_outbound_batch(lines, atomic=True)] == [False, False, False]
+    assert tool.get_stock("K1") == 10
+
+    assert [ok for _, ok, _ in tool.process_outbound_batch(lines)] == [True, False, True]
+    assert tool.get_stock("K1") == 0
+    assert count_rows(tool, "chuku") == 2
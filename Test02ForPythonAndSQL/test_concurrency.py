@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 并发写入测试
+功能：检查多个连接并发出库不会超卖，以及分组提交写入器把每个操作的结果交回给提交它的调用方
+作者：AI Assistant
+日期：2024
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from connection_profiles import open_connection
+from group_commit import GroupCommitWriter
+from outbound_engine import OutboundEngine
+
+
+def test_concurrent_outbound_never_oversells(tool):
+    """8个线程各用自己的连接争抢10件库存，每次出库1件：恰好10次成功，库存为0"""
+    tool.close_database()
+    results = []
+    results_lock = threading.Lock()
+
+    def worker(number):
+        conn = open_connection(tool.db_path)
+        try:
+            engine = OutboundEngine(conn, max_retries=50)
+            for attempt in range(5):
+                ok, _ = engine.outbound(f"C{number}-{attempt}", "K1", "G1", 1, "螺丝", 2.5)
+                with results_lock:
+                    results.append(ok)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conn = open_connection(tool.db_path)
+    try:
+        assert sum(results) == 10
+        assert conn.execute("SELECT shuliang FROM kucun WHERE bianhao = 'K1'").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*), SUM(shuliang) FROM chuku").fetchone() == (10, 10)
+    finally:
+        conn.close()
+
+
+def test_pooled_tool_outbound_from_many_threads(pooled_tool):
+    """共享一个启用连接池的工具实例并发出库，缓存与数据库都不超卖"""
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(
+            lambda number: pooled_tool.process_outbound(f"C{number}", "K2", "G2", 1, "螺母", 4.0), range(20)
+        ))
+    assert sum(results) == 5
+    assert pooled_tool.get_stock("K2") == 0
+    with pooled_tool.read_cursor() as cursor:
+        assert cursor.execute("SELECT shuliang FROM kucun WHERE bianhao = 'K2'").fetchone()[0] == 0
+
+
+def test_group_commit_routes_results_to_their_callers(pooled_tool):
+    """并发提交的操作被合并提交，每个Future得到的是自己那个操作的结果"""
+    def operation(number):
+        if number % 3 == 0:
+            return "outbound", (f"C{number}", "K2", "G2", 1, "螺母", 4.0)
+        inventory_code = "NOPE" if number % 7 == 0 else "K1"
+        return "inbound", (f"R{number}", inventory_code, "G1", 1, "螺丝", 1.5, "供应商1")
+
+    with GroupCommitWriter(pooled_tool, max_batch=16, max_delay=0.02) as writer:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = {number: pool.submit(lambda n: writer.submit(*operation(n)).result(10), number)
+                       for number in range(60)}
+            results = {number: future.result() for number, future in futures.items()}
+        stats = writer.stats()
+
+    for number, (code, ok, message) in results.items():
+        assert code == operation(number)[1][0]
+        if code.startswith("R"):
+            assert ok == (number % 7 != 0), message
+    outbound_ok = sum(1 for code, ok, _ in results.values() if code.startswith("C") and ok)
+    inbound_ok = sum(1 for code, ok, _ in results.values() if code.startswith("R") and ok)
+    assert outbound_ok == 5
+    assert pooled_tool.get_stock("K1") == 10 + inbound_ok
+    assert pooled_tool.get_stock("K2") == 0
+    assert stats["operations"] == 60
+    assert stats["largest_batch"] > 1
+    assert stats["succeeded"] == outbound_ok + inbound_ok
+
+
+def test_group_commit_atomic_request_is_all_or_nothing(pooled_tool):
+    """原子请求单独成组：任一操作失败时整组回滚，不影响同时提交的其他请求"""
+    with GroupCommitWriter(pooled_tool, max_delay=0.02) as writer:
+        plain = writer.submit("inbound", ("R1", "K1", "G1", 2, "螺丝", 1.5, "供应商1"))
+        atomic = writer.submit_many([
+            ("inbound", ("R2", "K1", "G1", 3, "螺丝", 1.5, "供应商1")),
+            ("outbound", ("C1", "K2", "G2", 99, "螺母", 4.0)),
+        ], atomic=True)
+        after = writer.submit("outbound", ("C2", "K2", "G2", 1, "螺母", 4.0))
+        assert plain.result(10)[1] is True
+        assert [ok for _, ok, _ in atomic.result(10)] == [False, False]
+        assert after.result(10)[1] is True
+
+    assert pooled_tool.get_stock("K1") == 12
+    assert pooled_tool.get_stock("K2") == 4
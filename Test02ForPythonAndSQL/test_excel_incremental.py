@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 增量Excel报表测试
+功能：检查续写缓存片段得到的报表与从头生成的一致、快照工作表与全量报表一致，
+      以及流水归档、重建数据库和中途失败后缓存片段从头渲染或截掉多写的尾部
+作者：AI Assistant
+日期：2024
+"""
+
+import os
+
+import pytest
+from openpyxl import load_workbook
+
+from excel_incremental import PARTS_INDEX, incremental_excel_report, load_parts_index
+
+LEDGER = ("入库记录", "出库记录")
+
+
+def sheet_values(path):
+    workbook = load_workbook(path, read_only=True)
+    try:
+        # 说明工作表含生成时间，不参与比较
+        return {sheet.title: [row for row in sheet.iter_rows(values_only=True)]
+                for sheet in workbook.worksheets[1:]}
+    finally:
+        workbook.close()
+
+
+def inbound(tool, number, quantity=1):
+    assert tool.process_inbound(f"R{number}", "K1", "G1", quantity, "螺丝", 1.5, "供应商1")
+
+
+@pytest.fixture
+def report(tool):
+    """写入若干流水并生成一次增量报表，返回 (工具, 报表路径)"""
+    inbound(tool, 1, 3)
+    tool.process_outbound("C1", "K2", "G2", 2, "螺母", 4.0)
+    assert tool.update_excel_report("初始", incremental=True)
+    return tool, tool.excel_path
+
+
+def rebuild_from_scratch(tool, tmp_path, name):
+    path = str(tmp_path / name)
+    incremental_excel_report(tool.cursor, path, tool.db_path, cache_dir=str(tmp_path / f"{name}.cache"))
+    return sheet_values(path)
+
+
+def test_appended_report_matches_fresh_render(report, tmp_path):
+    tool, path = report
+    for number in range(2, 6):
+        inbound(tool, number, number)
+    tool.process_outbound("C2", "K1", "G1", 1, "螺丝", 2.5)
+
+    counts, appended = incremental_excel_report(tool.cursor, path, tool.db_path)
+    assert appended == 5
+    assert (counts["入库记录"], counts["出库记录"]) == (5, 2)
+    assert sheet_values(path) == rebuild_from_scratch(tool, tmp_path, "fresh.xlsx")
+
+    # 快照工作表与全量报表相同；流水工作表行相同，只是按写入顺序而不是日期倒序排列
+    full_path = str(tmp_path / "full.xlsx")
+    tool.excel_path = full_path
+    assert tool.update_excel_report("全量", incremental=False)
+    incremental, full = sheet_values(path), sheet_values(full_path)
+    assert incremental.keys() == full.keys()
+    for name in full:
+        if name in LEDGER:
+            assert incremental[name][0] == full[name][0]
+            assert sorted(incremental[name][1:]) == sorted(full[name][1:])
+        else:
+            assert incremental[name] == full[name]
+
+
+def test_only_new_rows_are_rendered(report):
+    tool, path = report
+    inbound(tool, 2)
+    size = os.path.getsize(f"{path}.parts/ruku.xml")
+
+    assert incremental_excel_report(tool.cursor, path, tool.db_path)[1] == 1
+    assert incremental_excel_report(tool.cursor, path, tool.db_path)[1] == 0
+    assert os.path.getsize(f"{path}.parts/ruku.xml") > size
+    assert load_parts_index(f"{path}.parts")["入库记录"]["rows"] == 2
+
+
+def test_archived_rows_leave_the_report(report, tmp_path):
+    tool, path = report
+    tool.conn.execute("UPDATE ruku SET rukuriqi = '2023-01-05' WHERE rukubianhao = 'R1'")
+    tool.conn.commit()
+    inbound(tool, 2)
+    assert tool.archive_ledgers("2024-01")
+
+    incremental_excel_report(tool.cursor, path, tool.db_path)
+    assert [row[0] for row in sheet_values(path)["入库记录"][1:]] == ["R2"]
+    assert sheet_values(path) == rebuild_from_scratch(tool, tmp_path, "fresh.xlsx")
+
+
+def test_recreated_database_is_rendered_from_scratch(report):
+    tool, path = report
+    tool.conn.execute("DELETE FROM ruku")
+    tool.conn.commit()
+    inbound(tool, 9, 3)     # 行数和水位与缓存相同，单据不同
+
+    incremental_excel_report(tool.cursor, path, tool.db_path)
+    assert [row[0] for row in sheet_values(path)["入库记录"][1:]] == ["R9"]
+
+
+def test_interrupted_append_is_truncated(report, tmp_path):
+    """片段写完、登记未更新时中断：下次先截掉多写的尾部，不会出现重复行"""
+    tool, path = report
+    with open(f"{path}.parts/ruku.xml", "a", encoding="utf-8") as f:
+        f.write('<row r="3"><c r="A3" t="inlineStr"><is><t>半')
+    inbound(tool, 2)
+
+    incremental_excel_report(tool.cursor, path, tool.db_path)
+    assert sheet_values(path) == rebuild_from_scratch(tool, tmp_path, "fresh.xlsx")
+
+
+def test_corrupt_index_renders_from_scratch(report, tmp_path):
+    tool, path = report
+    with open(os.path.join(f"{path}.parts", PARTS_INDEX), "w", encoding="utf-8") as f:
+        f.write("{")
+    inbound(tool, 2)
+
+    assert incremental_excel_report(tool.cursor, path, tool.db_path)[1] == 3
+    assert sheet_values(path) == rebuild_from_scratch(tool, tmp_path, "fresh.xlsx")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 并行Excel报表测试
+功能：检查进程池生成的报表与单进程生成的内容一致，并可从后台线程调用（报表调度线程的用法）
+作者：AI Assistant
+日期：2024
+"""
+
+import threading
+
+from openpyxl import load_workbook
+
+from excel_parallel import parallel_excel_report
+
+
+def sheet_values(path):
+    workbook = load_workbook(path, read_only=True)
+    try:
+        # 说明工作表含生成时间，不参与比较
+        return {sheet.title: [row for row in sheet.iter_rows(values_only=True)]
+                for sheet in workbook.worksheets[1:]}
+    finally:
+        workbook.close()
+
+
+def test_parallel_report_from_background_thread(tool, tmp_path):
+    tool.process_inbound("R1", "K1", "G1", 3, "螺丝", 1.5, "供应商1")
+    tool.process_outbound("C1", "K2", "G2", 2, "螺母", 4.0)
+    serial_path = str(tmp_path / "serial.xlsx")
+    parallel_path = str(tmp_path / "parallel.xlsx")
+    serial_counts = parallel_excel_report(tool.db_path, serial_path, workers=1)
+
+    results = {}
+    worker = threading.Thread(
+        target=lambda: results.update(counts=parallel_excel_report(tool.db_path, parallel_path, workers=2))
+    )
+    worker.start()
+    worker.join(120)
+
+    assert not worker.is_alive()
+    assert results["counts"] == serial_counts
+    assert sheet_values(parallel_path) == sheet_values(serial_path)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 库存估值与周转分析测试
+功能：用手工计算的小型流水核对期初/期末数量、加权平均成本、FIFO分层估值、周转率、可用天数和ABC分类
+作者：AI Assistant
+日期：2024
+"""
+
+import datetime
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from inventory_analytics import InventoryAnalytics, abc_classes
+
+# 当前库存：(编号, 仓库, 数量, 单价)
+STOCK = [
+    ("A", "一号库", 10, 2.0),
+    ("B", "一号库", 8, 5.0),    # 没有任何流水
+    ("C", "一号库", 12, 1.0),   # 流水之前已有8件，FIFO按当前单价计价
+    ("D", "一号库", 0, 10.0),   # 期间内全部出库
+    ("E", "二号库", 3, 1.0),
+]
+
+# 流水：(类型, 编号, 数量, 单价, 日期)
+LEDGER = [
+    ("inbound", "E", 3, 1.0, "2022-03-01"),
+    ("inbound", "A", 20, 1.0, "2023-06-01"),
+    ("inbound", "A", 10, 3.0, "2024-02-01"),
+    ("outbound", "A", 25, 2.5, "2024-03-01"),
+    ("inbound", "C", 4, 2.0, "2024-05-01"),
+    ("outbound", "C", 2, 1.5, "2024-06-01"),
+    ("outbound", "D", 7, 12.0, "2024-07-01"),
+    ("inbound", "A", 5, 4.0, "2025-01-10"),
+]
+
+START, END, DAYS = "2024-01-01", "2024-12-31", 366
+
+
+@pytest.fixture
+def analytics(tool):
+    conn = tool.conn
+    conn.execute("DELETE FROM kucun")
+    conn.executemany("INSERT INTO kucun VALUES (?, ?, ?, ?)", STOCK)
+    for number, (kind, code, quantity, price, day) in enumerate(LEDGER):
+        if kind == "inbound":
+            conn.execute("INSERT INTO ruku VALUES (?, ?, 'G', ?, 'n', ?, ?, '供应商1')",
+                         (f"R{number}", code, quantity, day, price))
+        else:
+            conn.execute("INSERT INTO chuku VALUES (?, ?, 'G', ?, 'n', ?, ?)",
+                         (f"C{number}", code, quantity, day, price))
+    conn.commit()
+    return InventoryAnalytics.from_cursor(tool.cursor)
+
+
+@pytest.fixture
+def metrics(analytics):
+    return analytics.sku_metrics(START, END)
+
+
+def test_opening_and_closing_quantities(metrics):
+    # 期初 = 当前 - 期初之后的净变化，期末 = 当前 - 期末之后的净变化
+    assert metrics["opening_qty"].to_dict() == {"A": 20, "B": 8, "C": 10, "D": 7, "E": 3}
+    assert metrics["closing_qty"].to_dict() == {"A": 5, "B": 8, "C": 12, "D": 0, "E": 3}
+    assert metrics["inbound_qty"].to_dict() == {"A": 10, "B": 0, "C": 4, "D": 0, "E": 0}
+    assert metrics["outbound_qty"].to_dict() == {"A": 25, "B": 0, "C": 2, "D": 7, "E": 0}
+
+
+def test_weighted_average_cost_and_cogs(metrics):
+    # A: (20 x 2.0 + 10 x 3.0) / 30；C: (10 x 1.0 + 4 x 2.0) / 14；没有入库的按当前单价
+    assert metrics.loc["A", "avg_cost"] == pytest.approx(70 / 30)
+    assert metrics.loc["C", "avg_cost"] == pytest.approx(18 / 14)
+    assert metrics.loc["B", "avg_cost"] == pytest.approx(5.0)
+    assert metrics.loc["D", "avg_cost"] == pytest.approx(10.0)
+    assert metrics.loc["A", "cogs"] == pytest.approx(25 * 70 / 30)
+    assert metrics.loc["D", "cogs"] == pytest.approx(70.0)
+    assert metrics.loc["A", "closing_value"] == pytest.approx(5 * 70 / 30)
+
+
+def test_fifo_layers(metrics):
+    # A: 期末5件取自最新的 2024-02-01 批次（3.0），2025年的批次在期末之后不计
+    # B: 没有入库批次，全部按当前单价；C: 4件来自批次（2.0），其余8件早于流水，按当前单价1.0
+    assert metrics["fifo_value"].to_dict() == pytest.approx(
+        {"A": 15.0, "B": 40.0, "C": 16.0, "D": 0.0, "E": 3.0})
+
+
+def test_turnover_and_days_of_stock(metrics):
+    # A: 平均库存价值 (20 + 5) / 2 x 70/30，周转率 = 销货成本 / 平均库存价值
+    assert metrics.loc["A", "avg_inventory_value"] == pytest.approx(12.5 * 70 / 30)
+    assert metrics.loc["A", "turnover"] == pytest.approx(2.0)
+    assert metrics.loc["A", "days_of_stock"] == pytest.approx(5 / (25 / DAYS))
+    assert metrics.loc["B", "turnover"] == 0.0
+    assert pd.isna(metrics.loc["B", "days_of_stock"])
+
+
+def test_abc_within_warehouse(metrics):
+    # 一号库按销货成本排序：D(70)、A(58.3) 之前的累计占比低于80%，C之前已超过95%
+    assert metrics["abc"].to_dict() == {"A": "A", "B": "C", "C": "C", "D": "A", "E": "C"}
+
+
+def test_abc_boundaries():
+    warehouses = pd.Series(["一号库"] * 5 + ["二号库"], index=list("PQRSTU"))
+    consumption = pd.Series([50.0, 30.0, 15.0, 5.0, 0.0, 10.0], index=list("PQRSTU"))
+    # 之前的累计占比：0, 0.5, 0.8, 0.95, 1.0；恰好等于界限时归入下一类，没有消耗的为C
+    assert abc_classes(warehouses, consumption).to_dict() == {
+        "P": "A", "Q": "A", "R": "B", "S": "C", "T": "C", "U": "A"}
+
+
+def test_warehouse_metrics(analytics, metrics):
+    summary = analytics.warehouse_metrics(START, END, sku_metrics=metrics)
+    first = summary.loc["一号库"]
+    assert (first["skus"], first["closing_qty"]) == (4, 25)
+    assert first["fifo_value"] == pytest.approx(71.0)
+    assert first["cogs"] == pytest.approx(25 * 70 / 30 + 2 * 18 / 14 + 70)
+    assert (first["a_skus"], first["b_skus"], first["c_skus"]) == (2, 0, 2)
+    assert summary.loc["二号库", "turnover"] == 0.0
+
+
+def test_yearly_warehouse_metrics(analytics):
+    yearly = analytics.yearly_warehouse_metrics()
+    years = sorted(set(yearly.index.get_level_values("year")))
+    assert years == list(range(2022, datetime.date.today().year + 1))
+    pd.testing.assert_series_equal(
+        yearly.loc[(2024, "一号库")], analytics.warehouse_metrics(START, END).loc["一号库"], check_names=False)
+    assert yearly.loc[(2023, "一号库"), "closing_qty"] == 20 + 8 + 10 + 7
+    assert yearly.loc[(2025, "一号库"), "closing_qty"] == 30
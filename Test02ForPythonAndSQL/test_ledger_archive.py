@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 流水归档测试
+功能：检查已结束月份的流水移入按年划分的归档库、重复执行不重复移动、补录流水在下次归档时移走，
+      非标准日期的流水留在当前期表，以及 ruku_all / chuku_all 视图返回完整历史
+作者：AI Assistant
+日期：2024
+"""
+
+import sqlite3
+
+import pytest
+
+from ledger_archive import archive_closed_periods, archive_path, attach_archives, detach_archives
+
+RUKU = [
+    ("R1", "2023-01-15"),
+    ("R2", "2023-02-03"),
+    ("R3", "2023/01/05"),   # 斜杠日期不归档
+    ("R4", "2024-01-10"),   # 截止月份当月，留在当前期表
+]
+CHUKU = [
+    ("C1", "2023-01-20"),
+    ("C2", "2024-01-11"),
+]
+
+
+@pytest.fixture
+def ledger(tool, tmp_path):
+    """带若干历史流水的数据库，返回 (写连接, 归档目录)"""
+    conn = tool.conn
+    conn.executemany("INSERT INTO ruku VALUES (?, 'K1', 'G1', 1, '螺丝', ?, 1.5, '供应商1')", RUKU)
+    conn.executemany("INSERT INTO chuku VALUES (?, 'K1', 'G1', 1, '螺丝', ?, 2.5)", CHUKU)
+    conn.commit()
+    return conn, str(tmp_path / "archive")
+
+
+def codes(conn, table):
+    column = "rukubianhao" if table.startswith("ruku") else "chukubianhao"
+    return sorted(row[0] for row in conn.execute(f"SELECT {column} FROM {table}"))
+
+
+def archived_codes(archive_dir, year, table):
+    conn = sqlite3.connect(archive_path(archive_dir, year))
+    try:
+        return codes(conn, table)
+    finally:
+        conn.close()
+
+
+def periods(conn):
+    return conn.execute("SELECT ledger, period, archive_file, rows FROM ledger_periods ORDER BY 1, 2").fetchall()
+
+
+def test_closed_months_move_to_yearly_archive(ledger):
+    conn, archive_dir = ledger
+    results = archive_closed_periods(conn, archive_dir, "2024-01")
+
+    assert results == {"2023-01": {"ruku": 1, "chuku": 1}, "2023-02": {"ruku": 1, "chuku": 0}}
+    assert codes(conn, "ruku") == ["R3", "R4"]
+    assert codes(conn, "chuku") == ["C2"]
+    assert archived_codes(archive_dir, "2023", "ruku") == ["R1", "R2"]
+    assert archived_codes(archive_dir, "2023", "chuku") == ["C1"]
+    assert periods(conn) == [
+        ("chuku", "2023-01", "warehouse_archive_2023.db", 1),
+        ("chuku", "2023-02", "warehouse_archive_2023.db", 0),
+        ("ruku", "2023-01", "warehouse_archive_2023.db", 1),
+        ("ruku", "2023-02", "warehouse_archive_2023.db", 1),
+    ]
+
+
+def test_rerun_is_idempotent(ledger):
+    conn, archive_dir = ledger
+    archive_closed_periods(conn, archive_dir, "2024-01")
+    before = periods(conn)
+
+    assert archive_closed_periods(conn, archive_dir, "2024-01") == {}
+    assert periods(conn) == before
+    assert archived_codes(archive_dir, "2023", "ruku") == ["R1", "R2"]
+    assert codes(conn, "ruku") == ["R3", "R4"]
+
+
+def test_backdated_row_moves_on_next_run(ledger):
+    conn, archive_dir = ledger
+    archive_closed_periods(conn, archive_dir, "2024-01")
+    conn.execute("INSERT INTO ruku VALUES ('R5', 'K1', 'G1', 1, '螺丝', '2023-01-25', 1.5, '供应商1')")
+    conn.commit()
+
+    assert archive_closed_periods(conn, archive_dir, "2024-01") == {"2023-01": {"ruku": 1, "chuku": 0}}
+    assert archived_codes(archive_dir, "2023", "ruku") == ["R1", "R2", "R5"]
+    assert codes(conn, "ruku") == ["R3", "R4"]
+    assert ("ruku", "2023-01", "warehouse_archive_2023.db", 2) in periods(conn)
+
+
+def test_history_views_return_union(ledger):
+    conn, archive_dir = ledger
+    archive_closed_periods(conn, archive_dir, "2024-01")
+
+    assert attach_archives(conn, archive_dir) == ["archive_2023"]
+    try:
+        assert codes(conn, "ruku_all") == ["R1", "R2", "R3", "R4"]
+        assert codes(conn, "chuku_all") == ["C1", "C2"]
+    finally:
+        detach_archives(conn)
+    assert all(not schema.startswith("archive_") for _, schema, _ in conn.execute("PRAGMA database_list"))
+
+
+def test_invalid_cutoff_is_rejected(ledger):
+    conn, archive_dir = ledger
+    with pytest.raises(ValueError):
+        archive_closed_periods(conn, archive_dir, "2024/01")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 操作日志测试
+功能：检查日志重放、分段快照、按时刻查询、与数据库的核对校正、写了一半的末行的修复，
+      以及目录锁（同时只有一个写入方）和只读打开
+作者：AI Assistant
+日期：2024
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import make_tool
+from operation_journal import OperationJournal, load_stock
+from warehouse_cli import main
+from warehouse_manager_tool import WarehouseManagerTool
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    """带操作日志的数据库：若干单笔、批量和分组写入后关闭，返回日志目录"""
+    path = str(tmp_path / "journal")
+    tool = make_tool(tmp_path, journal_dir=path)
+    tool.process_inbound("R1", "K1", "G1", 3, "螺丝", 1.5, "供应商1")
+    tool.process_outbound("C1", "K2", "G2", 2, "螺母", 4.0)
+    tool.process_inbound_batch([("R2", "K1", "G1", 4, "螺丝", 1.5, "供应商1")])
+    tool.run_operations([("outbound", ("C2", "K1", "G1", 1, "螺丝", 2.5)),
+                         ("inbound", ("R3", "NOPE", "G1", 1, "螺丝", 1.5, "供应商1"))])
+    tool.close_database()
+    return path
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "warehouse.db")
+    yield conn
+    conn.close()
+
+
+def test_replay_matches_database(journal_dir, conn):
+    """重新打开日志时从快照重放出的库存与数据库一致，失败的操作没有记录"""
+    journal = OperationJournal(journal_dir)
+    try:
+        assert journal.open(conn) is True
+        assert journal.state == load_stock(conn)
+        assert journal.state["K1"][1] == 16 and journal.state["K2"][1] == 3
+        assert journal.verify(conn) == {}
+        refs = [event["ref"] for event in journal.read_events() if event["op"] not in ("set", "drop")]
+        assert refs == ["R1", "C1", "R2", "C2"]
+    finally:
+        journal.close()
+
+
+def test_snapshots_split_segments_without_changing_replay(journal_dir, conn):
+    """频繁快照时日志分成多段，重放结果和按时刻查询不变"""
+    journal = OperationJournal(journal_dir, snapshot_every=2)
+    try:
+        journal.open(conn)
+        for number in range(5):
+            journal.append([{"op": "inbound", "ref": f"X{number}", "code": "K2", "delta": 1}])
+        assert len(journal.segments()) >= 3
+        latest = journal.stock_as_of("9999-12-31")
+    finally:
+        journal.close()
+
+    reopened = OperationJournal(journal_dir)
+    try:
+        reopened.open()
+        assert reopened.state["K2"][1] == 8
+        assert latest["K2"][1] == 8
+        assert reopened.stock_as_of("2000-01-01") == {}
+    finally:
+        reopened.close()
+
+
+def test_external_change_is_reconciled(journal_dir, conn):
+    """其他程序直接修改数据库后，打开日志追加校正事件，核对结果为一致"""
+    conn.execute("UPDATE kucun SET shuliang = 100 WHERE bianhao = 'K1'")
+    conn.execute("DELETE FROM kucun WHERE bianhao = 'K2'")
+    conn.commit()
+
+    journal = OperationJournal(journal_dir)
+    try:
+        assert journal.open(conn) is False
+        assert journal.verify(conn) == {}
+        corrections = [event for event in journal.read_events() if event.get("ref") == "reconcile"]
+        assert [(event["op"], event["code"]) for event in corrections] == [("set", "K1"), ("drop", "K2")]
+    finally:
+        journal.close()
+
+    reopened = OperationJournal(journal_dir)
+    try:
+        assert reopened.open(conn) is True
+    finally:
+        reopened.close()
+
+
+def test_torn_last_line_is_discarded(journal_dir, conn):
+    """崩溃时写了一半的末行在打开时被截掉，其余事件照常重放"""
+    journal = OperationJournal(journal_dir)
+    last_segment = journal.segments()[-1][1]
+    with open(last_segment, "a", encoding="utf-8") as f:
+        f.write('{"seq": 999, "op": "inbound", "co')
+    try:
+        assert journal.open(conn) is True
+        assert journal.verify(conn) == {}
+    finally:
+        journal.close()
+    with open(last_segment, encoding="utf-8") as f:
+        assert f.read().endswith("\n")
+
+
+def test_second_writer_is_refused(journal_dir, conn):
+    """同一目录同时只能有一个写入方，关闭后才能再次打开"""
+    first = OperationJournal(journal_dir)
+    second = OperationJournal(journal_dir)
+    try:
+        first.open(conn)
+        with pytest.raises(RuntimeError, match="已被其他进程打开"):
+            second.open(conn)
+        with pytest.raises(RuntimeError):
+            second.append([{"op": "inbound", "ref": "X", "code": "K1", "delta": 1}])
+    finally:
+        first.close()
+    try:
+        assert second.open(conn) is True
+    finally:
+        second.close()
+
+
+def test_tool_with_locked_journal_fails_to_connect(journal_dir, tmp_path):
+    writer = OperationJournal(journal_dir)
+    writer.open()
+    try:
+        tool = WarehouseManagerTool(str(tmp_path / "warehouse.db"), str(tmp_path / "report.xlsx"),
+                                    report_delay=None, auto_report=False, journal_dir=journal_dir)
+        assert tool.connect_database() is False
+        tool.close_database()
+    finally:
+        writer.close()
+
+
+def test_read_only_never_modifies_files(journal_dir, conn):
+    """只读打开和按时刻查询可与写入方同时进行，不截断写入方写了一半的末行，也不能追加"""
+    writer = OperationJournal(journal_dir)
+    writer.open(conn)
+    try:
+        writer.append([{"op": "inbound", "ref": "X1", "code": "K1", "delta": 5}])
+        last_segment = writer.segments()[-1][1]
+        with open(last_segment, "a", encoding="utf-8") as f:
+            f.write('{"seq": 999, "op": "inbound", "co')
+        with open(last_segment, encoding="utf-8") as f:
+            before = f.read()
+
+        reader = OperationJournal(journal_dir)
+        reader.open_read_only()
+        assert reader.state["K1"][1] == 21
+        assert reader.stock_as_of("9999-12-31", ["K1"]) == {"K1": ["一号库", 21, 2.5]}
+        with pytest.raises(RuntimeError):
+            reader.append([{"op": "inbound", "ref": "X2", "code": "K1", "delta": 1}])
+        with pytest.raises(RuntimeError):
+            reader.snapshot()
+        reader.close()
+        with open(last_segment, encoding="utf-8") as f:
+            assert f.read() == before
+    finally:
+        writer.close()
+
+
+def test_cli_as_of_reads_while_writer_holds_lock(journal_dir, tmp_path, capsys):
+    writer = OperationJournal(journal_dir)
+    writer.open()
+    try:
+        argv = ["--db", str(tmp_path / "warehouse.db"), "--no-report", "--journal", journal_dir, "journal"]
+        assert main([*argv, "--as-of", "9999-12-31", "--code", "K1", "--verify"]) == 0
+        assert "K1" in capsys.readouterr().out
+        assert main([*argv, "--snapshot"]) == 1
+    finally:
+        writer.close()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 结构迁移与触发器测试
+功能：检查触发器维护的仓库汇总表cangkuhuizong与kucun的实际汇总保持一致
+作者：AI Assistant
+日期：2024
+"""
+
+import random
+
+from warehouse_schema import SCHEMA_VERSION, get_schema_version, migrate_database
+
+WAREHOUSE_TOTALS_SQL = '''
+    SELECT c.cangkumingcheng, COUNT(k.bianhao), COALESCE(SUM(k.shuliang), 0),
+           ROUND(COALESCE(SUM(ROUND(k.shuliang * k.danjia, 2)), 0), 2)
+    FROM cangku c LEFT JOIN kucun k ON k.cangkumingcheng = c.cangkumingcheng
+    GROUP BY c.cangkumingcheng ORDER BY c.cangkumingcheng
+'''
+
+
+def warehouse_summary(conn):
+    return conn.execute(
+        "SELECT cangkumingcheng, kucunzhonglei, zongshuliang, zongjiazhi FROM cangkuhuizong ORDER BY 1"
+    ).fetchall()
+
+
+def test_warehouse_value_does_not_drift(tool):
+    """大量随机增删改之后总价值与重新计算的结果完全相同，清零后恰好为0"""
+    conn = tool.conn
+    rng = random.Random(8)
+    codes = [f"P{i}" for i in range(50)]
+    conn.executemany("INSERT INTO kucun VALUES (?, ?, ?, ?)",
+                     [(code, rng.choice(["一号库", "二号库"]), rng.randint(0, 100),
+                       round(rng.uniform(0.01, 99.99), 2)) for code in codes])
+    for _ in range(20000):
+        code = rng.choice(codes)
+        if rng.random() < 0.8:
+            conn.execute("UPDATE kucun SET shuliang = shuliang + ? WHERE bianhao = ?", (rng.randint(-5, 9), code))
+        elif rng.random() < 0.5:
+            conn.execute("UPDATE kucun SET danjia = ? WHERE bianhao = ?", (round(rng.uniform(0.01, 99.99), 2), code))
+        else:
+            conn.execute("UPDATE kucun SET cangkumingcheng = ? WHERE bianhao = ?",
+                         (rng.choice(["一号库", "二号库"]), code))
+    conn.commit()
+    assert warehouse_summary(conn) == conn.execute(WAREHOUSE_TOTALS_SQL).fetchall()
+    tool.stock_cache.load(conn)
+    assert [row[1:] for row in tool.stock_cache.summary()] == [row[1:] for row in warehouse_summary(conn)]
+
+    conn.execute("UPDATE kucun SET shuliang = 0")
+    conn.commit()
+    assert [row[3] for row in warehouse_summary(conn)] == [0.0, 0.0]
+
+    conn.execute("DELETE FROM kucun")
+    conn.commit()
+    assert [row[1:] for row in warehouse_summary(conn)] == [(0, 0, 0.0), (0, 0, 0.0)]
+
+
+def test_upgrade_rebases_drifted_totals(tool):
+    """从版本4升级时按kucun重新计算已经带有累积误差的总价值"""
+    conn = tool.conn
+    conn.execute("UPDATE cangkuhuizong SET zongjiazhi = zongjiazhi + 5.5e-11")
+    conn.execute("PRAGMA user_version = 4")
+    conn.commit()
+    assert migrate_database(conn) == 1
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    assert warehouse_summary(conn) == conn.execute(WAREHOUSE_TOTALS_SQL).fetchall()
+
+
+def schema_objects(conn):
+    return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+
+def test_migrations_are_idempotent(tool):
+    """已是最新版本时再次迁移不做任何事，结构不变"""
+    conn = tool.conn
+    before = schema_objects(conn)
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    assert migrate_database(conn) == 0
+    assert migrate_database(conn) == 0
+    assert schema_objects(conn) == before
+
+
+def test_upgrade_from_version_3_backfills_daily_stock(tool):
+    """从版本3升级时按已有流水回填kucun_riji，结果与触发器逐行维护的相同"""
+    conn = tool.conn
+    tool.process_inbound("R1", "K1", "G1", 3, "螺丝", 1.5, "供应商1")
+    tool.process_outbound("C1", "K1", "G1", 2, "螺丝", 2.5)
+    tool.process_inbound("R2", "K2", "G2", 4, "螺母", 4.0, "供应商1")
+    maintained = conn.execute("SELECT * FROM kucun_riji ORDER BY bianhao, riqi").fetchall()
+    before = schema_objects(conn)
+
+    conn.execute("DROP TABLE kucun_riji")
+    conn.execute("PRAGMA user_version = 3")
+    conn.commit()
+    assert migrate_database(conn) == 2
+    assert conn.execute("SELECT * FROM kucun_riji ORDER BY bianhao, riqi").fetchall() == maintained
+    assert schema_objects(conn) == before
+    assert migrate_database(conn) == 0
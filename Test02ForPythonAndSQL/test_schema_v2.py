@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - v2结构迁移测试
+功能：检查migrate_to_v2迁移出的数据与原数据库一致，且原数据库文件不被修改
+作者：AI Assistant
+日期：2024
+"""
+
+import hashlib
+import sqlite3
+
+import pytest
+
+from conftest import make_tool
+from warehouse_schema_v2 import migrate_to_v2
+
+
+def file_digest(path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@pytest.fixture
+def v1_path(tmp_path):
+    """rollback日志模式（delete）的v1数据库，带一条入库和一条出库"""
+    tool = make_tool(tmp_path)
+    tool.process_inbound("R1", "K1", "G1", 3, "螺丝", 1.5, "供应商1")
+    tool.process_outbound("C1", "K2", "G2", 2, "螺母", 4.0)
+    tool.close_database()
+    path = tmp_path / "warehouse.db"
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    return path
+
+
+def test_migration_leaves_source_untouched(v1_path, tmp_path):
+    """迁移只读原数据库：文件内容和日志模式都不变"""
+    before = file_digest(v1_path)
+    report = migrate_to_v2(str(v1_path), str(tmp_path / "v2.db"))
+
+    assert report["mismatches"] == []
+    assert file_digest(v1_path) == before
+    conn = sqlite3.connect(v1_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
+
+
+def test_migrated_values_match_source(v1_path, tmp_path):
+    """库存数量、流水行数和按分保存的总价值与v1一致"""
+    target = tmp_path / "v2.db"
+    report = migrate_to_v2(str(v1_path), str(target))
+    assert report["rows"]["ruku"] == 1 and report["rows"]["chuku"] == 1
+    assert report["value"][0] == pytest.approx(report["value"][1])
+
+    conn = sqlite3.connect(target)
+    assert dict(conn.execute("SELECT bianhao, shuliang FROM kucun")) == {"K1": 13, "K2": 3}
+    conn.close()
+
+    with pytest.raises(FileExistsError):
+        migrate_to_v2(str(v1_path), str(target))
+    with pytest.raises(ValueError):
+        migrate_to_v2(str(target), str(tmp_path / "again.db"))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 按日期查询历史库存测试
+功能：把触发器维护的kucun_riji查询结果与手工计算的流水结果对照，包括补录的早期流水和重建
+作者：AI Assistant
+日期：2024
+"""
+
+import pytest
+
+from outbound_engine import OutboundEngine
+
+# K1期初10件（建库存时写入，没有流水），K2期初5件；按录入顺序排列，2024-01-03的一行是补录的
+LEDGER = [
+    ("inbound", "R1", "K1", 5, "2024-01-05"),
+    ("outbound", "C1", "K1", 3, "2024-01-10"),
+    ("inbound", "R2", "K1", 7, "2024/02/01"),
+    ("outbound", "C2", "K1", 2, "2024-02-01"),
+    ("inbound", "R3", "K2", 4, "2024-01-20"),
+    ("outbound", "C3", "K1", 4, "2024-01-03"),
+]
+
+# 手工计算：当前 K1 = 10+5-3+7-2-4 = 13，K2 = 9；某日数量 = 当前 - 该日之后的变化
+EXPECTED = {
+    "2024-01-02": {"K1": 10, "K2": 5},
+    "2024-01-03": {"K1": 6, "K2": 5},
+    "2024-01-05": {"K1": 11, "K2": 5},
+    "2024-01-31": {"K1": 8, "K2": 9},
+    "2024-02-01": {"K1": 13, "K2": 9},
+    "2030-01-01": {"K1": 13, "K2": 9},
+}
+
+
+@pytest.fixture
+def ledger_tool(tool):
+    engine = OutboundEngine(tool.conn)
+    for kind, code, inventory_code, quantity, day in LEDGER:
+        if kind == "inbound":
+            tool.apply_inbound(code, inventory_code, "G1", quantity, "螺丝", 1.5, "供应商1", inbound_date=day)
+            tool.conn.commit()
+        else:
+            ok, message = engine.outbound(code, inventory_code, "G1", quantity, "螺丝", 2.5, outbound_date=day)
+            assert ok, message
+    return tool
+
+
+def quantities(tool, day):
+    return {code: quantity for code, _, quantity, _, _ in tool.stock_as_of(day)}
+
+
+@pytest.mark.parametrize("day", sorted(EXPECTED))
+def test_stock_as_of_matches_hand_computed_ledger(ledger_tool, day):
+    assert quantities(ledger_tool, day) == EXPECTED[day]
+
+
+def test_warehouse_totals_and_filters(ledger_tool):
+    """仓库汇总与库存编号、仓库过滤条件基于同一结果"""
+    assert ledger_tool.warehouse_stock_as_of("2024-01-31") == [("一号库", 1, 8, 20.0), ("二号库", 1, 9, 36.0)]
+    assert ledger_tool.stock_as_of("2024-01-31", codes=["K2"]) == [("K2", "二号库", 9, 4.0, 36.0)]
+    assert [row[0] for row in ledger_tool.stock_as_of("2024-01-31", warehouse="一号库")] == ["K1"]
+    with pytest.raises(ValueError):
+        ledger_tool.stock_as_of("31/01/2024")
+
+
+def test_rebuild_reproduces_trigger_maintained_rows(ledger_tool):
+    """按流水重建kucun_riji得到与触发器逐行维护完全相同的内容"""
+    select = "SELECT bianhao, riqi, bianhua, leiji FROM kucun_riji ORDER BY bianhao, riqi"
+    maintained = ledger_tool.cursor.execute(select).fetchall()
+    assert ledger_tool.rebuild_stock_history() is True
+    assert ledger_tool.cursor.execute(select).fetchall() == maintained
+    for day, expected in EXPECTED.items():
+        assert quantities(ledger_tool, day) == expected
+
+
+@pytest.mark.parametrize("day", ["2024-13-45", "2023-02-29", "2024/00/10", "31/01/2024", "yesterday"])
+def test_invalid_days_are_rejected(ledger_tool, day):
+    with pytest.raises(ValueError):
+        ledger_tool.stock_as_of(day)
+
+
+def test_cli_reports_invalid_day(ledger_tool, capsys):
+    """as-of子命令对不存在的日期打印❌并返回非0"""
+    from warehouse_cli import main
+
+    ledger_tool.close_database()
+    assert main(["--db", ledger_tool.db_path, "--excel", ledger_tool.excel_path, "as-of", "2024-13-45"]) != 0
+    assert "❌" in capsys.readouterr().out
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 命令行工具测试
+功能：检查子命令分派、参数错误的提示、批量文件解析以及 --batch --atomic 的整批回滚
+作者：AI Assistant
+日期：2024
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import make_tool
+from warehouse_cli import main, parse_batch_line
+
+
+@pytest.fixture
+def cli(tmp_path):
+    """在已建库的临时数据库上运行命令行的函数，返回退出码；不生成报表"""
+    make_tool(tmp_path).close_database()
+    db_path = str(tmp_path / "warehouse.db")
+
+    def run(*argv):
+        return main(["--db", db_path, "--excel", str(tmp_path / "report.xlsx"), "--no-report", *argv])
+
+    run.db_path = db_path
+    return run
+
+
+def stock(db_path, code):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT shuliang FROM kucun WHERE bianhao = ?", (code,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_single_operations(cli):
+    assert cli("inbound", "R1", "K1", "G1", "4", "螺丝", "1.5", "供应商1") == 0
+    assert cli("outbound", "C1", "K1", "G1", "3", "螺丝", "2.5") == 0
+    assert cli("outbound", "C2", "K1", "G1", "99", "螺丝", "2.5") == 1
+    assert cli("inbound", "R2", "NOPE", "G1", "4", "螺丝", "1.5", "供应商1") == 1
+    assert stock(cli.db_path, "K1") == 11
+    assert cli("status") == 0
+
+
+def test_invalid_number_prints_message_without_traceback(cli, capsys):
+    assert cli("inbound", "R1", "K1", "G1", "abc", "螺丝", "1.5", "供应商1") == 2
+    out = capsys.readouterr().out
+    assert "❌ 数量应为整数: 'abc'" in out
+    assert stock(cli.db_path, "K1") == 10
+
+
+def test_subcommand_and_batch_are_exclusive(cli):
+    with pytest.raises(SystemExit):
+        cli("--batch", "-", "status")
+    with pytest.raises(SystemExit):
+        cli()
+
+
+def test_parse_batch_line_formats():
+    assert parse_batch_line("  # 注释") is None
+    assert parse_batch_line("inbound R1 K1 G1 4 '十字 螺丝' 1.5 供应商1") == (
+        "inbound", ["R1", "K1", "G1", "4", "十字 螺丝", "1.5", "供应商1"])
+    kind, params = parse_batch_line('{"op": "outbound", "outbound_code": "C1", "inventory_code": "K1", '
+                                    '"goods_code": "G1", "quantity": 2, "name": "螺丝", "price": 2.5}')
+    assert kind == "outbound" and params["quantity"] == 2
+    with pytest.raises(ValueError):
+        parse_batch_line("inbound R1 K1")
+    with pytest.raises(ValueError):
+        parse_batch_line('{"op": "transfer"}')
+
+
+BATCH = """\
+# 第二行的出库数量超过库存
+inbound R1 K1 G1 4 螺丝 1.5 供应商1
+outbound C1 K2 G2 99 螺母 4.0
+outbound C2 K2 G2 2 螺母 4.0
+"""
+
+
+def test_batch_atomic_rolls_back_everything(cli, tmp_path, capsys):
+    batch = tmp_path / "ops.txt"
+    batch.write_text(BATCH, encoding="utf-8")
+
+    assert cli("--batch", str(batch), "--atomic") == 1
+    assert "C1" in capsys.readouterr().out
+    assert (stock(cli.db_path, "K1"), stock(cli.db_path, "K2")) == (10, 5)
+
+    assert cli("--batch", str(batch)) == 1
+    assert (stock(cli.db_path, "K1"), stock(cli.db_path, "K2")) == (14, 3)
+
+
+def test_batch_atomic_refuses_malformed_file(cli, tmp_path, capsys):
+    batch = tmp_path / "ops.txt"
+    batch.write_text("inbound R1 K1 G1 4 螺丝 1.5 供应商1\ninbound R2 K1\n", encoding="utf-8")
+    assert cli("--batch", str(batch), "--atomic") == 1
+    assert "第 2 行" in capsys.readouterr().out
+    assert stock(cli.db_path, "K1") == 10
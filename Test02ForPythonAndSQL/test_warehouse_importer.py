@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 批量导入测试
+功能：检查外键校验拒绝的行、重复单据计数、apply_stock的库存增减（跳过已存在的单据）、
+      导入后恢复原同步设置，以及暂停逐日触发器时kucun_riji与逐行维护的结果一致
+作者：AI Assistant
+日期：2024
+"""
+
+import csv
+import sqlite3
+
+import pytest
+
+from conftest import make_tool
+from stock_history import missing_daily_triggers, suspend_daily_triggers
+from warehouse_importer import IMPORT_COLUMNS, BulkImporter
+from warehouse_manager_tool import WarehouseManagerTool
+from warehouse_schema import LEDGER_DAILY_SQL
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    make_tool(tmp_path).close_database()
+    return str(tmp_path / "warehouse.db")
+
+
+def write_csv(path, table, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(IMPORT_COLUMNS[table])
+        writer.writerows(rows)
+    return str(path)
+
+
+def ruku_row(code, inventory_code, quantity, day="2024-01-05"):
+    return [code, inventory_code, "G1", quantity, "螺丝", day, 1.5, "供应商1"]
+
+
+def query(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def stock(db_path):
+    return dict(query(db_path, "SELECT bianhao, shuliang FROM kucun"))
+
+
+def test_unknown_foreign_key_is_rejected(db_path, tmp_path):
+    path = write_csv(tmp_path / "ruku.csv", "ruku", [
+        ruku_row("R1", "K1", 4),
+        ruku_row("R2", "NOPE", 4),
+        ["", "K1", "G1", 1, "螺丝", "2024-01-05", 1.5, "供应商1"],
+    ])
+    with BulkImporter(db_path) as importer:
+        stats = importer.import_file("ruku", path)
+
+    assert (stats["read"], stats["inserted"], stats["rejected"]) == (3, 1, 2)
+    assert query(db_path, "SELECT rukubianhao FROM ruku") == [("R1",)]
+
+
+def test_keys_imported_earlier_satisfy_foreign_keys(db_path, tmp_path):
+    kucun = write_csv(tmp_path / "kucun.csv", "kucun", [["K3", "一号库", 0, 1.0]])
+    ruku = write_csv(tmp_path / "ruku.csv", "ruku", [ruku_row("R1", "K3", 2)])
+    with BulkImporter(db_path) as importer:
+        results = importer.import_files({"ruku": ruku, "kucun": kucun})
+
+    assert [(r["table"], r["inserted"]) for r in results] == [("kucun", 1), ("ruku", 1)]
+
+
+def test_duplicates_are_counted(db_path, tmp_path):
+    path = write_csv(tmp_path / "ruku.csv", "ruku", [
+        ruku_row("R1", "K1", 4), ruku_row("R1", "K1", 4), ruku_row("R2", "K2", 1),
+    ])
+    with BulkImporter(db_path, chunk_size=2) as importer:
+        first = importer.import_file("ruku", path)
+        second = importer.import_file("ruku", path)
+
+    assert (first["inserted"], first["duplicates"]) == (2, 1)
+    assert (second["inserted"], second["duplicates"]) == (0, 3)
+
+
+def test_apply_stock_skips_existing_rows(db_path, tmp_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO ruku VALUES ('R1', 'K1', 'G1', 4, '螺丝', '2024-01-05', 1.5, '供应商1')")
+    conn.commit()
+    conn.close()
+    ruku = write_csv(tmp_path / "ruku.csv", "ruku", [
+        ruku_row("R1", "K1", 4),    # 库中已有，不能再次加库存
+        ruku_row("R2", "K1", 3),
+        ruku_row("R2", "K1", 3),    # 块内重复
+        ruku_row("R3", "K2", 2),
+    ])
+    chuku = write_csv(tmp_path / "chuku.csv", "chuku", [["C1", "K2", "G2", 1, "螺母", "2024-01-06", 4.0]])
+    with BulkImporter(db_path, apply_stock=True) as importer:
+        importer.import_files({"ruku": ruku, "chuku": chuku})
+
+    assert stock(db_path) == {"K1": 13, "K2": 6}
+
+
+def test_without_apply_stock_quantities_are_unchanged(db_path, tmp_path):
+    path = write_csv(tmp_path / "ruku.csv", "ruku", [ruku_row("R1", "K1", 4)])
+    with BulkImporter(db_path) as importer:
+        importer.import_file("ruku", path)
+    assert stock(db_path) == {"K1": 10, "K2": 5}
+
+
+@pytest.mark.parametrize("journal_mode", ["wal", "delete"])
+def test_pragmas_are_restored(db_path, journal_mode):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.close()
+
+    importer = BulkImporter(db_path)
+    importer.connect()
+    pragma = lambda name: importer.conn.execute(f"PRAGMA {name}").fetchone()[0]
+    try:
+        assert (pragma("synchronous"), pragma("cache_size")) == (0, -262144)
+        assert pragma("journal_mode") == ("wal" if journal_mode == "wal" else "memory")
+        importer._restore_pragmas()
+        assert (pragma("synchronous"), pragma("cache_size"), pragma("temp_store")) == (2, -2000, 0)
+        assert pragma("journal_mode") == journal_mode
+    finally:
+        importer.close()
+
+
+def daily_matches_ledger(db_path):
+    return query(db_path, "SELECT * FROM kucun_riji ORDER BY 1, 2") == query(
+        db_path, LEDGER_DAILY_SQL.format(ruku="ruku", chuku="chuku") + " ORDER BY 1, 2")
+
+
+@pytest.mark.parametrize("defer_daily, suspended", [
+    (None, ["ruku"]),           # chunk_size=4 时只有ruku文件有整块
+    (True, ["ruku", "chuku"]),
+    (False, []),
+])
+def test_deferred_daily_matches_per_row_triggers(db_path, tmp_path, defer_daily, suspended):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO ruku VALUES ('R0', 'K1', 'G1', 5, '螺丝', '2024-01-03', 1.5, '供应商1')")
+    conn.commit()
+    conn.close()
+    days = ["2024-01-01", "2024-01-05", "2024/01/05", "2024-02-01"]
+    ruku = write_csv(tmp_path / "ruku.csv", "ruku", [
+        ruku_row(f"R{i}", "K1" if i % 2 else "K2", i, days[i % len(days)]) for i in range(1, 10)
+    ])
+    chuku = write_csv(tmp_path / "chuku.csv", "chuku", [["C1", "K1", "G1", 2, "螺丝", "2024-01-02", 2.5]])
+
+    with BulkImporter(db_path, chunk_size=4, defer_daily=defer_daily) as importer:
+        importer.import_file("ruku", ruku)
+        importer.import_file("chuku", chuku)
+        assert missing_daily_triggers(importer.conn) == suspended
+
+    assert query(db_path, "SELECT name FROM sqlite_master WHERE name LIKE '%_riji_AI' ORDER BY name") == [
+        ("chuku_riji_AI",), ("ruku_riji_AI",)]
+    assert daily_matches_ledger(db_path)
+
+
+def test_rebuild_keeps_archived_months(tmp_path):
+    """重算kucun_riji时包含已移入归档库的月份"""
+    tool = make_tool(tmp_path)
+    tool.conn.execute("INSERT INTO ruku VALUES ('R1', 'K1', 'G1', 3, '螺丝', '2023-05-01', 1.5, '供应商1')")
+    tool.conn.commit()
+    assert tool.archive_ledgers("2024-01")
+    tool.close_database()
+
+    db_path = str(tmp_path / "warehouse.db")
+    path = write_csv(tmp_path / "ruku.csv", "ruku", [ruku_row("R2", "K1", 4)])
+    with BulkImporter(db_path, defer_daily=True) as importer:
+        importer.import_file("ruku", path)
+
+    assert query(db_path, "SELECT rukubianhao FROM ruku") == [("R2",)]
+    assert query(db_path, "SELECT * FROM kucun_riji ORDER BY riqi") == [
+        ("K1", "2023-05-01", 3, 3), ("K1", "2024-01-05", 4, 7)]
+
+
+def test_interrupted_import_is_repaired_on_connect(db_path, tmp_path):
+    """导入进程在重建触发器之前退出：下次连接时重算kucun_riji并重建触发器"""
+    conn = sqlite3.connect(db_path)
+    suspend_daily_triggers(conn, ["ruku", "chuku"])
+    conn.execute("INSERT INTO ruku VALUES ('R1', 'K1', 'G1', 4, '螺丝', '2024-01-05', 1.5, '供应商1')")
+    conn.commit()
+    conn.close()
+    assert not daily_matches_ledger(db_path)
+
+    tool = WarehouseManagerTool(db_path, str(tmp_path / "report.xlsx"), report_delay=None, auto_report=False)
+    assert tool.connect_database()
+    assert missing_daily_triggers(tool.conn) == []
+    tool.close_database()
+    assert daily_matches_ledger(db_path)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - HTTP服务测试
+功能：在随机端口上启动WarehouseService，通过HTTP检查入库/出库接口的结果和状态码
+作者：AI Assistant
+日期：2024
+"""
+
+import asyncio
+import json
+
+from conftest import make_tool
+from warehouse_service import WarehouseService
+
+
+async def request(port: int, method: str, path: str, payload=None):
+    """发送一个HTTP请求，返回 (状态码, JSON对象)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content)
+
+
+def run_against_service(tmp_path, scenario):
+    """在临时数据库上启动服务，执行scenario(port)后停止服务并返回其结果"""
+    make_tool(tmp_path).close_database()
+
+    async def main():
+        service = WarehouseService(str(tmp_path / "warehouse.db"), str(tmp_path / "report.xlsx"),
+                                   readers=2, report_delay=None, auto_report=False)
+        await service.start("127.0.0.1", 0)
+        try:
+            return await scenario(service.server.sockets[0].getsockname()[1])
+        finally:
+            await service.stop()
+
+    return asyncio.run(main())
+
+
+def inbound_payload(code: str, inventory_code: str) -> dict:
+    return {"inbound_code": code, "inventory_code": inventory_code, "goods_code": "G1",
+            "quantity": 3, "name": "螺丝", "price": 1.5, "supplier": "供应商1"}
+
+
+def test_inbound_for_unknown_inventory_code_is_rejected(tmp_path):
+    """未知库存编号的入库返回422和ok: false，不写入流水"""
+    async def scenario(port):
+        single = await request(port, "POST", "/inbound", inbound_payload("R1", "NOPE"))
+        grouped = await request(port, "POST", "/operations", {"operations": [
+            {"type": "inbound", "params": inbound_payload("R2", "K1")},
+            {"type": "inbound", "params": inbound_payload("R3", "NOPE")},
+        ]})
+        missing = await request(port, "GET", "/inbound/R1")
+        stock = await request(port, "GET", "/stock/K1")
+        return single, grouped, missing, stock
+
+    single, grouped, missing, stock = run_against_service(tmp_path, scenario)
+    assert single[0] == 422
+    assert single[1]["ok"] is False and "NOPE" in single[1]["message"]
+    assert [result["ok"] for result in grouped[1]["results"]] == [True, False]
+    assert missing[0] == 404
+    assert stock[1]["quantity"] == 13
+
+
+def test_outbound_and_stock_lookup(tmp_path):
+    """出库成功后库存立即反映在 /stock 中，库存不足返回422"""
+    async def scenario(port):
+        payload = {"outbound_code": "C1", "inventory_code": "K1", "goods_code": "G1",
+                   "quantity": 4, "name": "螺丝", "price": 2.5}
+        first = await request(port, "POST", "/outbound", payload)
+        second = await request(port, "POST", "/outbound", dict(payload, outbound_code="C2", quantity=7))
+        stock = await request(port, "GET", "/stock/K1")
+        return first, second, stock
+
+    first, second, stock = run_against_service(tmp_path, scenario)
+    assert first[0] == 200 and first[1]["ok"] is True
+    assert second[0] == 422
+    assert stock[1]["quantity"] == 6
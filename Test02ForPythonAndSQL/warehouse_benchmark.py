@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 性能基准测试
+功能：按示例数据的结构生成N个仓库、M个库存和K条出入库流水的合成数据，
+      测量入库/出库的吞吐量与p50/p99延迟、报表数据读取和Excel导出耗时以及峰值内存，
+      以及命令行启动耗时，结果追加到JSON文件并与上一次同规模的结果对比
+作者：AI Assistant
+日期：2024
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不报告峰值内存
+    resource = None
+
+# 预设规模：名称 -> (仓库数, 库存数, 流水行数)
+BENCHMARK_SIZES: Dict[str, Tuple[int, int, int]] = {
+    "small": (5, 1000, 10000),
+    "medium": (20, 10000, 100000),
+    "large": (50, 50000, 500000),
+}
+
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+# 与insert_sample_data相同的取值风格
+SUPPLIER_NAMES = ["北京电子有限公司", "上海机械制造厂", "广州贸易公司"]
+GOODS_NAMES = ["电子元件", "机械零件", "包装材料", "办公用品", "五金工具"]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存（MB），平台不支持时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    if sys.platform == "darwin":
+        return round(peak / 1024 / 1024, 1)
+    return round(peak / 1024, 1)
+
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+    """由单次耗时（秒）计算吞吐量和延迟分位数（毫秒）"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "seconds": round(total, 4),
+        "ops_per_sec": round(len(ordered) / total, 1) if total else None,
+        "p50_ms": round(percentile(50), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(func: Callable, *args, **kwargs) -> Tuple[float, object]:
+    """执行func并返回 (耗时秒数, 返回值)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def generate_dataset(db_path: str, warehouses: int, skus: int, ledger_rows: int,
+                     seed: int = 42) -> Dict[str, int]:
+    """
+    生成合成数据库
+
+    结构与insert_sample_data一致：操作员、供应商、仓库、库存、供应关系，
+    另外按一年内的随机日期生成入库和出库流水各占一半。
+
+    Returns:
+        各表写入的行数
+    """
+    from warehouse_manager_tool import WarehouseManagerTool
+    from connection_profiles import open_connection
+
+    rng = random.Random(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tool = WarehouseManagerTool(db_path, os.devnull, report_delay=None, stock_cache=False)
+        tool.create_blank_database()
+        tool.conn.close()
+
+    operators = [(f"操作员{i:03d}", f"138{i:08d}") for i in range(max(1, warehouses))]
+    suppliers = [
+        (f"SP{i:03d}", f"{SUPPLIER_NAMES[i % len(SUPPLIER_NAMES)]}{i:03d}", f"联系人{i:03d}", f"010-{i:08d}")
+        for i in range(max(3, warehouses // 2))
+    ]
+    warehouse_rows = [
+        (f"仓库{i:03d}", operators[i % len(operators)][0], f"负责人{i:03d}", f"2023-{i % 12 + 1:02d}-01")
+        for i in range(warehouses)
+    ]
+    inventory = [
+        (f"INV{i:06d}", warehouse_rows[i % warehouses][0],
+         rng.randint(1000, 5000), round(rng.uniform(1, 500), 2))
+        for i in range(skus)
+    ]
+    supply = sorted({
+        (suppliers[rng.randrange(len(suppliers))][0], warehouse[0])
+        for warehouse in warehouse_rows for _ in range(2)
+    })
+
+    today = datetime.date.today()
+
+    def random_date() -> str:
+        return (today - datetime.timedelta(days=rng.randrange(365))).strftime("%Y-%m-%d")
+
+    inbound = []
+    outbound = []
+    for i in range(ledger_rows):
+        code, _, _, price = inventory[rng.randrange(skus)]
+        goods = GOODS_NAMES[i % len(GOODS_NAMES)]
+        if i % 2 == 0:
+            supplier = suppliers[rng.randrange(len(suppliers))][1]
+            inbound.append((f"RK{i:08d}", code, f"G{i % 997:04d}", rng.randint(1, 50),
+                            goods, random_date(), price, supplier))
+        else:
+            outbound.append((f"CK{i:08d}", code, f"G{i % 997:04d}", rng.randint(1, 20),
+                             goods, random_date(), price))
+
+    conn = open_connection(db_path, "fast-ingest")
+    try:
+        conn.executemany("INSERT INTO caozuoyuan VALUES (?, ?)", operators)
+        conn.executemany("INSERT INTO gongyingshang VALUES (?, ?, ?, ?)", suppliers)
+        conn.executemany("INSERT INTO cangku VALUES (?, ?, ?, ?)", warehouse_rows)
+        conn.executemany("INSERT INTO kucun VALUES (?, ?, ?, ?)", inventory)
+        conn.executemany("INSERT INTO gongying VALUES (?, ?)", supply)
+        conn.executemany("INSERT INTO ruku VALUES (?, ?, ?, ?, ?, ?, ?, ?)", inbound)
+        conn.executemany("INSERT INTO chuku VALUES (?, ?, ?, ?, ?, ?, ?)", outbound)
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    return {
+        "caozuoyuan": len(operators), "gongyingshang": len(suppliers), "cangku": len(warehouse_rows),
+        "kucun": len(inventory), "gongying": len(supply), "ruku": len(inbound), "chuku": len(outbound),
+    }
+
+
+def benchmark_operations(db_path: str, skus: int, ops: int, seed: int = 42) -> Dict[str, Dict]:
+    """测量单条入库/出库和批量接口；报表调度窗口设得足够长，只测写操作本身"""
+    from warehouse_manager_tool import WarehouseManagerTool
+
+    rng = random.Random(seed)
+    codes = [f"INV{rng.randrange(skus):06d}" for _ in range(ops)]
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        tool = WarehouseManagerTool(db_path, os.devnull, report_delay=3600)
+        tool.connect_database()
+        try:
+            samples = []
+            for i, code in enumerate(codes):
+                elapsed, _ = timed(tool.process_inbound, f"BR{i:08d}", code, "G0001", 5,
+                                   "电子元件", 10.0, "北京电子有限公司")
+                samples.append(elapsed)
+            results["process_inbound"] = latency_stats(samples)
+
+            samples = []
+            for i, code in enumerate(codes):
+                elapsed, _ = timed(tool.process_outbound, f"BC{i:08d}", code, "G0001", 1,
+                                   "电子元件", 10.0)
+                samples.append(elapsed)
+            results["process_outbound"] = latency_stats(samples)
+
+            lines = [(f"BBR{i:08d}", code, "G0001", 5, "电子元件", 10.0, "北京电子有限公司")
+                     for i, code in enumerate(codes)]
+            elapsed, _ = timed(tool.process_inbound_batch, lines)
+            results["process_inbound_batch"] = {
+                "count": ops, "seconds": round(elapsed, 4),
+                "ops_per_sec": round(ops / elapsed, 1) if elapsed else None,
+            }
+
+            lines = [(f"BBC{i:08d}", code, "G0001", 1, "电子元件", 10.0) for i, code in enumerate(codes)]
+            elapsed, _ = timed(tool.process_outbound_batch, lines)
+            results["process_outbound_batch"] = {
+                "count": ops, "seconds": round(elapsed, 4),
+                "ops_per_sec": round(ops / elapsed, 1) if elapsed else None,
+            }
+        finally:
+            tool.report_scheduler.stop(flush=False)
+            tool.report_scheduler = None
+            tool.close_database()
+    return results
+
+
+def directory_size(path: str) -> int:
+    """目录下全部文件的总字节数"""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def benchmark_export(db_path: str, work_dir: str, modes: List[str]) -> Dict[str, Dict]:
+    """测量报表数据读取、Excel报表生成和Parquet快照导出"""
+    from warehouse_manager_tool import WarehouseManagerTool
+    from warehouse_management_excel import WarehouseManagementSystemExcel
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        tool = WarehouseManagerTool(db_path, os.devnull, report_delay=None)
+        tool.connect_database()
+        try:
+            elapsed, data = timed(tool.get_all_data_for_excel)
+            results["get_all_data_for_excel"] = {
+                "seconds": round(elapsed, 4), "rows": sum(len(rows) for rows in data.values()),
+            }
+        finally:
+            tool.close_database()
+
+        for mode in modes:
+            if mode == "parquet":
+                snapshot_dir = os.path.join(work_dir, "snapshot")
+                tool = WarehouseManagerTool(db_path, os.devnull, report_delay=None)
+                elapsed, ok = timed(tool.export_snapshot, snapshot_dir)
+                results["export_snapshot_parquet"] = {
+                    "seconds": round(elapsed, 4), "ok": bool(ok),
+                    "file_kb": round(directory_size(snapshot_dir) / 1024, 1) if ok else None,
+                }
+                continue
+            excel_path = os.path.join(work_dir, f"report_{mode}.xlsx")
+            system = WarehouseManagementSystemExcel(db_path, excel_path)
+            system.connect_database()
+            try:
+                elapsed, ok = timed(system.generate_excel_report, "基准测试",
+                                    streaming=(mode == "streaming"), parallel=(mode == "parallel"))
+            finally:
+                system.close_database()
+            results[f"generate_excel_report_{mode}"] = {
+                "seconds": round(elapsed, 4), "ok": bool(ok),
+                "file_kb": round(os.path.getsize(excel_path) / 1024, 1) if ok else None,
+            }
+    return results
+
+
+def run_size(name: str, warehouses: int, skus: int, ledger_rows: int, ops: int,
+             export_modes: List[str], seed: int = 42) -> Dict:
+    """在临时目录中完成一个规模的全部测量（由独立子进程执行，峰值内存互不影响）"""
+    work_dir = tempfile.mkdtemp(prefix="warehouse_bench_")
+    db_path = os.path.join(work_dir, "bench.db")
+    try:
+        result = {"size": name, "warehouses": warehouses, "skus": skus, "ledger_rows": ledger_rows}
+        elapsed, rows = timed(generate_dataset, db_path, warehouses, skus, ledger_rows, seed)
+        result["generate_seconds"] = round(elapsed, 3)
+        result["rows"] = rows
+        result["rss_after_generate_mb"] = peak_rss_mb()
+
+        result["operations"] = benchmark_operations(db_path, skus, ops, seed)
+        result["rss_after_operations_mb"] = peak_rss_mb()
+
+        result["export"] = benchmark_export(db_path, work_dir, export_modes)
+        result["peak_rss_mb"] = peak_rss_mb()
+        result["db_size_mb"] = round(os.path.getsize(db_path) / 1024 / 1024, 2)
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# 启动耗时测量：名称 -> 在子进程中执行的代码；{db}替换为数据库路径
+STARTUP_COMMANDS: Dict[str, str] = {
+    "python": "pass",
+    "import_core": "import warehouse_manager_tool",
+    "cli_status": "import warehouse_cli; warehouse_cli.main(['--db', {db!r}, 'status'])",
+    "import_report_stack": "import pandas, openpyxl",
+}
+
+# 核心模块导入后检查是否误加载了报表依赖
+STARTUP_HEAVY_MODULES = ("pandas", "openpyxl", "numpy")
+
+
+def benchmark_startup(repeats: int = 5) -> Dict[str, Dict]:
+    """
+    测量命令行调用的启动耗时（每项取多次子进程运行的中位数）
+
+    import_report_stack是核心引擎不再在启动时加载的部分，与import_core对比即为延迟导入节省的时间。
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    work_dir = tempfile.mkdtemp(prefix="warehouse_startup_")
+    db_path = os.path.join(work_dir, "startup.db")
+    results = {}
+    try:
+        generate_dataset(db_path, 2, 20, 100)
+        for name, code in STARTUP_COMMANDS.items():
+            code = code.format(db=db_path)
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                completed = subprocess.run([sys.executable, "-c", code], cwd=here,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            results[name] = {
+                "median_ms": round(samples[len(samples) // 2] * 1000, 1),
+                "min_ms": round(samples[0] * 1000, 1),
+                "ok": completed.returncode == 0,
+            }
+
+        check = ("import sys, warehouse_manager_tool, warehouse_cli; "
+                 f"print(','.join(m for m in {STARTUP_HEAVY_MODULES!r} if m in sys.modules))")
+        loaded = subprocess.run([sys.executable, "-c", check], cwd=here, capture_output=True, text=True)
+        results["heavy_modules_loaded_by_core"] = [m for m in loaded.stdout.strip().split(",") if m]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def print_startup(startup: Dict, previous: Optional[Dict] = None):
+    """打印启动耗时"""
+    print("\n⏱️ 启动耗时（中位数）")
+    for name in STARTUP_COMMANDS:
+        stats = startup[name]
+        line = f"  {name:<24} {stats['median_ms']} ms"
+        old = (previous or {}).get(name, {}).get("median_ms")
+        if old:
+            line += f"  ({(stats['median_ms'] - old) / old * 100:+.1f}%)"
+        print(line)
+    loaded = startup["heavy_modules_loaded_by_core"]
+    print(f"  核心模块加载的报表依赖: {', '.join(loaded) if loaded else '无'}")
+
+
+def environment_info() -> Dict[str, str]:
+    """记录运行环境，便于比较不同机器或版本的结果"""
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": f"{platform.system()} {platform.release()}",
+        "machine": platform.machine(),
+    }
+
+
+def load_history(path: str) -> List[Dict]:
+    """读取已有的结果文件，不存在或格式不对时返回空列表"""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            history = json.load(f)
+        return history if isinstance(history, list) else []
+    except (OSError, ValueError):
+        return []
+
+
+def find_previous(history: List[Dict], result: Dict) -> Optional[Dict]:
+    """在历史结果中找到最近一次相同规模（仓库数、库存数、流水行数）的测量"""
+    key = (result["warehouses"], result["skus"], result["ledger_rows"])
+    for run in reversed(history):
+        for previous in run.get("results", []):
+            if (previous.get("warehouses"), previous.get("skus"), previous.get("ledger_rows")) == key:
+                return previous
+    return None
+
+
+def print_result(result: Dict, previous: Optional[Dict] = None):
+    """打印一个规模的结果，有历史结果时附上吞吐量/耗时的变化百分比"""
+    print(f"\n📊 {result['size']}: {result['warehouses']} 仓库 / {result['skus']} 库存 / "
+          f"{result['ledger_rows']} 流水（生成 {result['generate_seconds']} 秒）")
+
+    def change(new, old) -> str:
+        if not new or not old:
+            return ""
+        return f"  ({(new - old) / old * 100:+.1f}%)"
+
+    for name, stats in result["operations"].items():
+        old = (previous or {}).get("operations", {}).get(name, {})
+        line = f"  {name:<24} {stats.get('ops_per_sec')} ops/s"
+        line += change(stats.get("ops_per_sec"), old.get("ops_per_sec"))
+        if "p50_ms" in stats:
+            line += f"  p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms"
+        print(line)
+    for name, stats in result["export"].items():
+        old = (previous or {}).get("export", {}).get(name, {})
+        print(f"  {name:<24} {stats['seconds']} 秒{change(stats['seconds'], old.get('seconds'))}")
+    if result.get("peak_rss_mb") is not None:
+        print(f"  峰值内存 {result['peak_rss_mb']} MB，数据库 {result['db_size_mb']} MB")
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="仓库管理系统 - 性能基准测试")
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"],
+                        choices=sorted(BENCHMARK_SIZES), help="预设规模")
+    parser.add_argument("--custom", nargs=3, type=int, metavar=("N", "M", "K"),
+                        help="自定义规模：仓库数 库存数 流水行数（替代--sizes）")
+    parser.add_argument("--ops", type=int, default=1000, help="每项写操作测量的次数")
+    parser.add_argument("--export", nargs="*", default=["full", "streaming", "parallel"],
+                        choices=["full", "streaming", "parallel", "parquet"],
+                        help="测量的报表导出方式（parquet需要安装pyarrow）")
+    parser.add_argument("--seed", type=int, default=42, help="随机数种子")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果JSON文件（追加写入）")
+    parser.add_argument("--label", default="", help="本次运行的标记，例如版本号")
+    parser.add_argument("--startup-repeats", type=int, default=5,
+                        help="启动耗时每项的运行次数，0表示不测量")
+    args = parser.parse_args()
+
+    if args.custom:
+        sizes = [("custom", *args.custom)]
+    else:
+        sizes = [(name, *BENCHMARK_SIZES[name]) for name in args.sizes]
+
+    history = load_history(args.output)
+    run = {
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "label": args.label,
+        "environment": environment_info(),
+        "ops": args.ops,
+        "results": [],
+    }
+
+    print("🚀 仓库管理系统 - 性能基准测试")
+    if args.startup_repeats > 0:
+        run["startup"] = benchmark_startup(args.startup_repeats)
+        previous = next((old["startup"] for old in reversed(history) if "startup" in old), None)
+        print_startup(run["startup"], previous)
+    # 每个规模使用新的子进程，峰值内存只反映该规模
+    # （进程池的工作进程不是守护进程，并行导出可以在其中再启动子进程）
+    context = multiprocessing.get_context("spawn")
+    for name, warehouses, skus, ledger_rows in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_size, name, warehouses, skus, ledger_rows,
+                                 args.ops, args.export, args.seed).result()
+        print_result(result, find_previous(history, result))
+        run["results"].append(result)
+
+    history.append(run)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 基准测试结果已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
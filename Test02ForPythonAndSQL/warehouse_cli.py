@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 命令行工具
+功能：提供inbound/outbound/import/report/snapshot/archive/journal/as-of/analytics/migrate-v2/serve/status子命令，供脚本和定时任务调用；
+      --batch 从文件或标准输入读取一批入库/出库操作，在一个进程、一个事务中执行，最后只重建一次报表
+作者：AI Assistant
+日期：2024
+"""
+
+import argparse
+import json
+import shlex
+import sys
+from typing import List, Optional, Sequence, TextIO, Tuple
+
+from operation_journal import OperationJournal
+from warehouse_manager_tool import (
+    INBOUND_FIELDS, OUTBOUND_FIELDS, WarehouseManagerTool, normalize_batch_lines
+)
+
+# 批量文件中每种操作的参数个数
+OPERATION_FIELDS = {"inbound": INBOUND_FIELDS, "outbound": OUTBOUND_FIELDS}
+
+
+def parse_batch_line(line: str) -> Optional[Tuple[str, object]]:
+    """
+    解析批量文件中的一行
+
+    支持两种格式：
+    - 与子命令相同的参数：inbound RK001 INV001 G001 10 电子元件 50.0 北京电子有限公司
+    - JSON对象：{"op": "outbound", "outbound_code": "CK001", "inventory_code": "INV001", ...}
+
+    Returns:
+        (操作类型, 参数)；空行和#开头的注释行返回None
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        record = json.loads(line)
+        kind = record.pop("op", None)
+        if kind not in OPERATION_FIELDS:
+            raise ValueError(f"未知操作类型: {kind}")
+        missing = [field for field in OPERATION_FIELDS[kind] if field not in record]
+        if missing:
+            raise ValueError(f"缺少字段: {', '.join(missing)}")
+        return kind, record
+    parts = shlex.split(line)
+    kind, params = parts[0], parts[1:]
+    if kind not in OPERATION_FIELDS:
+        raise ValueError(f"未知操作类型: {kind}")
+    if len(params) != len(OPERATION_FIELDS[kind]):
+        raise ValueError(f"{kind} 需要 {len(OPERATION_FIELDS[kind])} 个参数，实际 {len(params)} 个")
+    return kind, params
+
+
+def read_batch(stream: TextIO) -> Tuple[List[Tuple[str, object]], List[str]]:
+    """读取全部批量操作，返回 (操作列表, 解析错误列表)"""
+    operations = []
+    errors = []
+    for number, line in enumerate(stream, 1):
+        try:
+            operation = parse_batch_line(line)
+        except ValueError as e:
+            errors.append(f"第 {number} 行: {e}")
+            continue
+        if operation is not None:
+            operations.append(operation)
+    return operations, errors
+
+
+def run_batch(tool: WarehouseManagerTool, source: str, atomic: bool = False) -> int:
+    """执行批量文件（"-" 表示标准输入），返回进程退出码"""
+    if source == "-":
+        operations, errors = read_batch(sys.stdin)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            operations, errors = read_batch(f)
+    for error in errors:
+        print(f"❌ {error}")
+    if errors and atomic:
+        print("❌ 批量文件有格式错误，未执行任何操作")
+        return 1
+    if not operations:
+        print("❌ 没有可执行的操作")
+        return 1 if errors else 0
+
+    results = tool.run_operations(operations, atomic=atomic)
+    for code, ok, message in results:
+        if not ok:
+            print(f"❌ {code}: {message}")
+    return 0 if not errors and all(ok for _, ok, _ in results) else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="仓库管理系统 - 命令行工具")
+    parser.add_argument("--db", default="warehouse.db", help="数据库文件路径")
+    parser.add_argument("--excel", default="warehouse_report.xlsx", help="Excel报表文件路径")
+    parser.add_argument("--profile", default="durable", help="SQLite连接配置")
+    parser.add_argument("--no-report", action="store_true", help="写操作后不重建Excel报表")
+    parser.add_argument("--batch", metavar="FILE", help="从文件（- 表示标准输入）读取一批入库/出库操作")
+    parser.add_argument("--atomic", action="store_true", help="批量模式下任一操作失败则全部回滚")
+    parser.add_argument("--stats", action="store_true", help="结束时打印各操作的耗时统计")
+    parser.add_argument("--journal", metavar="DIR", help="操作日志和库存快照目录，写操作同时追加到日志")
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    inbound = subparsers.add_parser("inbound", help="处理入库")
+    for field in INBOUND_FIELDS:
+        inbound.add_argument(field)
+
+    outbound = subparsers.add_parser("outbound", help="处理出库")
+    for field in OUTBOUND_FIELDS:
+        outbound.add_argument(field)
+
+    importer = subparsers.add_parser("import", help="从CSV/JSONL文件批量导入")
+    importer.add_argument("pairs", nargs="+", help="成对出现的 表名 文件路径")
+    importer.add_argument("--chunk-size", type=int, default=50000, help="每个事务的行数")
+    importer.add_argument("--apply-stock", action="store_true", help="导入流水时同步更新库存数量")
+
+    report = subparsers.add_parser("report", help="重新生成Excel报表")
+    report.add_argument("--streaming", action="store_true", help="流式只写导出")
+    report.add_argument("--parallel", action="store_true", help="由进程池并行生成各工作表")
+    report.add_argument("--incremental", action="store_true", help="只追加新增的出入库记录")
+
+    snapshot = subparsers.add_parser("snapshot", help="导出Parquet列式快照（需要pyarrow）")
+    snapshot.add_argument("--output", default="warehouse_snapshot", help="快照目录")
+    snapshot.add_argument("--partition", choices=["month", "day"], default="month",
+                          help="入库/出库流水的分区粒度")
+    snapshot.add_argument("--batch-size", type=int, default=50000, help="每批读取的行数")
+
+    archive = subparsers.add_parser("archive", help="把已结束月份的流水移入归档数据库")
+    archive.add_argument("--before", help="YYYY-MM，早于该月的流水被归档（默认当前月）")
+    archive.add_argument("--archive-dir", help="归档目录（默认数据库所在目录下的archive）")
+
+    journal = subparsers.add_parser("journal", help="按操作日志查询某一时刻的库存（需要--journal）")
+    journal.add_argument("--as-of", help="YYYY-MM-DD（当天结束时）或 YYYY-MM-DD HH:MM:SS")
+    journal.add_argument("--code", action="append", help="只查询这些库存编号（可重复）")
+    journal.add_argument("--snapshot", action="store_true", help="立即写出一个库存快照")
+    journal.add_argument("--verify", action="store_true", help="核对日志与数据库中的库存")
+
+    as_of = subparsers.add_parser("as-of", help="查询某日结束时的库存和仓库汇总（按流水逐日累计）")
+    as_of.add_argument("date", nargs="?", help="YYYY-MM-DD")
+    as_of.add_argument("--code", action="append", help="只查询这些库存编号（可重复）")
+    as_of.add_argument("--warehouse", help="只查询该仓库")
+    as_of.add_argument("--summary", action="store_true", help="只显示仓库汇总")
+    as_of.add_argument("--rebuild", action="store_true", help="先按全部流水（含归档）重建逐日累计表")
+
+    analytics = subparsers.add_parser("analytics", help="库存估值、周转率、可用天数和ABC分类（需要pandas）")
+    analytics.add_argument("--start", help="期间第一天 YYYY-MM-DD（默认最早的流水日期）")
+    analytics.add_argument("--end", help="期间最后一天 YYYY-MM-DD（默认今天）")
+    analytics.add_argument("--yearly", action="store_true", help="按自然年输出各仓库的指标")
+    analytics.add_argument("--output", metavar="DIR", help="把库存编号和仓库指标写成CSV文件")
+    analytics.add_argument("--no-archives", action="store_true", help="不包含已归档月份的流水")
+
+    migrate = subparsers.add_parser("migrate-v2", help="把数据库一次性迁移为v2类型化结构的新文件")
+    migrate.add_argument("--output", required=True, help="新建的v2数据库文件")
+    migrate.add_argument("--overwrite", action="store_true", help="目标文件已存在时覆盖")
+
+    serve = subparsers.add_parser("serve", help="启动异步HTTP服务（入库、出库、库存查询、仓库汇总）")
+    serve.add_argument("--host", default="127.0.0.1", help="监听地址")
+    serve.add_argument("--port", type=int, default=8080, help="监听端口")
+    serve.add_argument("--readers", type=int, default=4, help="只读连接和读线程的数量")
+    serve.add_argument("--queue-size", type=int, default=1000, help="写队列的最大长度，队列满时返回503")
+    serve.add_argument("--report-delay", type=float, default=5.0, help="Excel报表合并窗口（秒）")
+    serve.add_argument("--max-batch", type=int, default=500, help="每个事务最多合并的写操作数")
+    serve.add_argument("--max-delay", type=float, default=0.0, help="凑组时最多等待的秒数")
+
+    subparsers.add_parser("status", help="显示库存和仓库汇总")
+    return parser
+
+
+def run_import(args) -> int:
+    """import子命令：交给批量导入工具，不经过WarehouseManagerTool"""
+    from warehouse_importer import IMPORT_COLUMNS, BulkImporter
+
+    if len(args.pairs) % 2:
+        print("❌ 参数必须是成对的 表名 文件路径")
+        return 2
+    files = dict(zip(args.pairs[0::2], args.pairs[1::2]))
+    unknown = set(files) - set(IMPORT_COLUMNS)
+    if unknown:
+        print(f"❌ 不支持导入的表: {', '.join(sorted(unknown))}")
+        return 2
+    with BulkImporter(args.db, chunk_size=args.chunk_size, apply_stock=args.apply_stock) as importer:
+        results = importer.import_files(files)
+    return 0 if all(r["rejected"] == 0 for r in results) else 1
+
+
+def run_migrate_v2(args) -> int:
+    """migrate-v2子命令：只读打开原数据库，生成新的v2文件"""
+    from warehouse_schema_v2 import migrate_to_v2, print_migration_report
+
+    try:
+        report = migrate_to_v2(args.db, args.output, overwrite=args.overwrite)
+    except Exception as e:
+        print(f"❌ 迁移失败: {e}")
+        return 1
+    print(f"✅ 已迁移为v2结构: {args.output}")
+    print_migration_report(report)
+    return 1 if report["mismatches"] else 0
+
+
+def run_journal(tool: WarehouseManagerTool, args) -> int:
+    """journal子命令：写快照、核对或查询某一时刻的库存；不写快照时只读打开日志，可与写入方同时运行"""
+    journal = tool.journal
+    if args.snapshot:
+        print(f"✅ 已写出库存快照: {journal.snapshot(reason='手动')}")
+    if journal is None:
+        journal = OperationJournal(args.journal)
+        journal.open_read_only()
+    if args.verify:
+        differences = journal.verify(tool.conn)
+        if differences:
+            print(f"❌ 日志与数据库有 {len(differences)} 个库存编号不一致")
+            for code, (logged, actual) in sorted(differences.items()):
+                print(f"  {code:<12} 日志 {logged}  数据库 {actual}")
+            return 1
+        print("✅ 日志与数据库库存一致")
+    if args.as_of:
+        state = journal.stock_as_of(args.as_of, args.code)
+        print(f"📊 {args.as_of} 的库存（操作日志）")
+        print(f"{'库存编号':<12} {'仓库名称':<12} {'数量':<8} {'单价':<10}")
+        print("-" * 46)
+        for code, (warehouse, quantity, price) in sorted(state.items()):
+            print(f"{code:<12} {warehouse:<12} {quantity:<8} {price:<10}")
+    return 0
+
+
+def run_as_of(tool: WarehouseManagerTool, args) -> int:
+    """as-of子命令：打印某日结束时的库存明细和仓库汇总"""
+    from row_source import Column, RowSource, print_row_source
+
+    if args.rebuild and not tool.rebuild_stock_history():
+        return 1
+    if not args.date:
+        return 0
+    try:
+        if not args.summary:
+            rows = tool.stock_as_of(args.date, args.code, args.warehouse)
+            print(f"📊 {args.date} 结束时的库存")
+            print_row_source(RowSource("库存", [Column('库存编号'), Column('仓库名称'), Column('数量', int, 8),
+                                              Column('单价', float, 10), Column('总价值', float)], rows))
+        if not args.code:
+            summary = tool.warehouse_stock_as_of(args.date)
+            if args.warehouse:
+                summary = [row for row in summary if row[0] == args.warehouse]
+            print(f"\n📊 {args.date} 结束时的仓库汇总")
+            print_row_source(RowSource("仓库汇总", [Column('仓库名称'), Column('库存种类', int, 8),
+                                                Column('总数量', int, 8), Column('总价值', float)], summary))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    return 0
+
+
+def run_analytics(tool: WarehouseManagerTool, args) -> int:
+    """analytics子命令：打印各仓库的估值和周转指标，可导出CSV"""
+    import os
+    from row_source import Column, RowSource, print_row_source
+
+    try:
+        analytics = tool.load_analytics(with_archives=not args.no_archives)
+        skus = analytics.sku_metrics(args.start, args.end)
+        warehouses = analytics.warehouse_metrics(args.start, args.end, sku_metrics=skus)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ 库存分析失败: {e}")
+        return 1
+
+    columns = [Column('仓库名称'), Column('库存种类', int, 8), Column('期末数量', int, 10),
+               Column('加权平均估值', float, 14), Column('FIFO估值', float, 14), Column('销货成本', float, 14),
+               Column('周转率', float, 8), Column('可用天数', float, 10), Column('A/B/C', str, 12)]
+
+    def table_rows(frame):
+        return [
+            (name, row.skus, row.closing_qty, round(row.closing_value, 2), round(row.fifo_value, 2),
+             round(row.cogs, 2), round(row.turnover, 2), round(row.days_of_stock, 1),
+             f"{row.a_skus}/{row.b_skus}/{row.c_skus}")
+            for name, row in zip(frame.index, frame.itertuples())
+        ]
+
+    start, end, _ = analytics.period(args.start, args.end)
+    print(f"📊 库存分析 {start:%Y-%m-%d} ~ {end:%Y-%m-%d}（{len(analytics.movements)} 条流水）")
+    print_row_source(RowSource("仓库指标", columns, table_rows(warehouses)))
+    yearly = analytics.yearly_warehouse_metrics() if args.yearly else None
+    if yearly is not None and not yearly.empty:
+        for year, frame in yearly.groupby(level="year"):
+            print(f"\n📊 {year} 年")
+            print_row_source(RowSource(str(year), columns, table_rows(frame.droplevel("year"))))
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        skus.to_csv(os.path.join(args.output, "sku_metrics.csv"), encoding="utf-8-sig", index_label="code")
+        warehouses.to_csv(os.path.join(args.output, "warehouse_metrics.csv"), encoding="utf-8-sig",
+                          index_label="warehouse")
+        if yearly is not None and not yearly.empty:
+            yearly.to_csv(os.path.join(args.output, "warehouse_metrics_yearly.csv"), encoding="utf-8-sig")
+        print(f"✅ 分析结果已写入: {args.output}")
+    return 0
+
+
+def run_serve(args) -> int:
+    """serve子命令：服务自行管理连接池、写线程和报表调度"""
+    from warehouse_service import run_service
+
+    return run_service(args.db, args.excel, args.host, args.port, readers=args.readers,
+                       queue_size=args.queue_size, report_delay=args.report_delay,
+                       profile=args.profile, auto_report=not args.no_report,
+                       max_batch=args.max_batch, max_delay=args.max_delay, journal_dir=args.journal)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """命令行入口，返回进程退出码"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.batch and args.command:
+        parser.error("--batch 不能与子命令同时使用")
+    if not args.batch and not args.command:
+        parser.error("请指定子命令或 --batch")
+
+    if args.command == "import":
+        return run_import(args)
+    if args.command == "migrate-v2":
+        return run_migrate_v2(args)
+    if args.command == "serve":
+        return run_serve(args)
+    if args.command == "journal" and not args.journal:
+        parser.error("journal 子命令需要 --journal 指定日志目录")
+
+    # 一次性进程：报表同步生成（批量模式只在最后生成一次），不预加载库存缓存；
+    # journal子命令只有写快照时才以写入方式打开日志（会锁定日志目录）
+    writes_journal = args.command != "journal" or args.snapshot
+    tool = WarehouseManagerTool(args.db, args.excel, report_delay=None, profile=args.profile,
+                                stock_cache=False, instrument=args.stats, auto_report=not args.no_report,
+                                archive_dir=getattr(args, "archive_dir", None),
+                                journal_dir=args.journal if writes_journal else None)
+    if not tool.connect_database():
+        return 1
+    try:
+        if args.batch:
+            return run_batch(tool, args.batch, args.atomic)
+        if args.command in OPERATION_FIELDS:
+            try:
+                row = normalize_batch_lines([vars(args)], OPERATION_FIELDS[args.command])[0]
+            except ValueError as e:
+                print(f"❌ {e}")
+                return 2
+            operation = tool.process_inbound if args.command == "inbound" else tool.process_outbound
+            return 0 if operation(*row) else 1
+        if args.command == "report":
+            return 0 if tool.update_excel_report("命令行生成", incremental=args.incremental,
+                                                 streaming=args.streaming,
+                                                 parallel=args.parallel) else 1
+        if args.command == "snapshot":
+            return 0 if tool.export_snapshot(args.output, args.partition, args.batch_size) else 1
+        if args.command == "archive":
+            return 0 if tool.archive_ledgers(args.before) else 1
+        if args.command == "analytics":
+            return run_analytics(tool, args)
+        if args.command == "as-of":
+            return run_as_of(tool, args)
+        if args.command == "journal":
+            return run_journal(tool, args)
+        if args.command == "status":
+            tool.show_current_status()
+            return 0
+        return 2
+    finally:
+        if tool.instrumentation:
+            print(tool.instrumentation.format_summary())
+        tool.close_database()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
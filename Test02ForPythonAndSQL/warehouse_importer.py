@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 批量导入工具
+功能：从CSV/JSONL文件分块读取主数据和出入库流水，按内存中的键集合校验外键，
+      用executemany在大事务中写入，导入期间放宽SQLite同步设置，并报告行数和速率
+作者：AI Assistant
+日期：2024
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from stock_history import missing_daily_triggers, restore_daily_triggers, suspend_daily_triggers
+from warehouse_schema import LEDGER_DATE_COLUMNS
+
+# 可导入的表：表名 -> 字段列表（与create_tables中的字段顺序一致）
+IMPORT_COLUMNS: Dict[str, List[str]] = {
+    "caozuoyuan": ["xingming", "caozuoyuanlianxifangshi"],
+    "gongyingshang": ["gongyingshangbianhao", "gongyingshangmingcheng", "lianxirren", "lianxifangshi"],
+    "cangku": ["cangkumingcheng", "xingming", "cangkufuzeren", "cangkuchuangjianriqi"],
+    "kucun": ["bianhao", "cangkumingcheng", "shuliang", "danjia"],
+    "ruku": ["rukubianhao", "bianhao", "huowubianhao", "shuliang", "mingcheng",
+             "rukuriqi", "danjia", "gongyingshangmingcheng"],
+    "chuku": ["chukubianhao", "bianhao", "huowubianhao", "shuliang", "mingcheng",
+              "chukuriqi", "danjia"],
+    "gongying": ["gongyingshangbianhao", "cangkumingcheng"],
+}
+
+# 外键：表名 -> [(字段, 被引用表)]，被引用表的主键集合常驻内存用于校验
+FOREIGN_KEYS: Dict[str, List[Tuple[str, str]]] = {
+    "cangku": [("xingming", "caozuoyuan")],
+    "kucun": [("cangkumingcheng", "cangku")],
+    "ruku": [("bianhao", "kucun")],
+    "chuku": [("bianhao", "kucun")],
+    "gongying": [("gongyingshangbianhao", "gongyingshang"), ("cangkumingcheng", "cangku")],
+}
+
+# 被引用表的主键字段
+PRIMARY_KEYS = {
+    "caozuoyuan": "xingming",
+    "gongyingshang": "gongyingshangbianhao",
+    "cangku": "cangkumingcheng",
+    "kucun": "bianhao",
+}
+
+# 按依赖关系排列的导入顺序
+IMPORT_ORDER = ["caozuoyuan", "gongyingshang", "cangku", "kucun", "gongying", "ruku", "chuku"]
+
+INTEGER_COLUMNS = {"shuliang"}
+REAL_COLUMNS = {"danjia"}
+
+# 导入期间使用的放宽设置，结束后恢复原值
+BULK_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": "-262144",  # 约256MB页缓存
+    "temp_store": "MEMORY",
+}
+
+
+class BulkImporter:
+    """CSV/JSONL批量导入器"""
+
+    def __init__(self, db_path: str = "warehouse.db", chunk_size: int = 50000,
+                 apply_stock: bool = False, max_errors_shown: int = 10,
+                 defer_daily: Optional[bool] = None, archive_dir: Optional[str] = None):
+        """
+        初始化批量导入器
+
+        Args:
+            db_path: 数据库文件路径
+            chunk_size: 每次executemany和每个事务包含的行数
+            apply_stock: 导入ruku/chuku时是否同步增减kucun.shuliang（导入历史流水且库存已单独导入时应为False）
+            max_errors_shown: 每个文件最多打印的错误行数
+            defer_daily: 导入ruku/chuku时是否暂停逐行维护kucun_riji的触发器，结束后一次重算；
+                None表示文件至少有一整块（chunk_size行）流水时才暂停，少量流水逐行维护比全量重算快
+            archive_dir: 流水归档目录，重算kucun_riji时包含其中的归档，默认为数据库所在目录下的archive
+        """
+        self.db_path = db_path
+        self.chunk_size = chunk_size
+        self.apply_stock = apply_stock
+        self.max_errors_shown = max_errors_shown
+        self.defer_daily = defer_daily
+        self.archive_dir = archive_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "archive")
+        self.conn = None
+        self.cursor = None
+        self.key_sets: Dict[str, Set[str]] = {}
+        self._saved_pragmas: Dict[str, str] = {}
+        # 已暂停逐日触发器的流水表
+        self._suspended: Set[str] = set()
+
+    def connect(self):
+        """连接数据库、加载外键校验所需的主键集合并放宽同步设置"""
+        self.conn = sqlite3.connect(self.db_path)
+        self.cursor = self.conn.cursor()
+        # 与connection_profiles一致，保证汇总表触发器在REPLACE时正确扣减
+        self.cursor.execute("PRAGMA recursive_triggers = ON")
+        for table, column in PRIMARY_KEYS.items():
+            self.cursor.execute(f"SELECT {column} FROM {table}")
+            self.key_sets[table] = {row[0] for row in self.cursor.fetchall()}
+        missing = missing_daily_triggers(self.conn)
+        if missing:
+            # 上次导入在重建触发器之前中断，kucun_riji缺少中断前写入的流水
+            print(f"🔧 逐日触发器缺失（{', '.join(missing)}），重算kucun_riji并重建触发器")
+            restore_daily_triggers(self.conn, self.archive_dir)
+        self._relax_pragmas()
+        print(f"✅ 批量导入连接成功: {self.db_path}")
+
+    def close(self):
+        """重建暂停的逐日触发器、恢复同步设置并关闭连接"""
+        if self.conn:
+            self.conn.commit()
+            self.resume_daily()
+            self._restore_pragmas()
+            self.conn.close()
+            self.conn = None
+            print("🔒 批量导入连接已关闭")
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _relax_pragmas(self):
+        """放宽同步和缓存设置，记录原值"""
+        for name, value in BULK_PRAGMAS.items():
+            self.cursor.execute(f"PRAGMA {name}")
+            self._saved_pragmas[name] = str(self.cursor.fetchone()[0])
+            self.cursor.execute(f"PRAGMA {name} = {value}")
+        # WAL数据库保持WAL，其余改用内存回滚日志
+        self.cursor.execute("PRAGMA journal_mode")
+        journal_mode = self.cursor.fetchone()[0]
+        if journal_mode.lower() != "wal":
+            self._saved_pragmas["journal_mode"] = journal_mode
+            self.cursor.execute("PRAGMA journal_mode = MEMORY")
+
+    def _restore_pragmas(self):
+        """恢复导入前的设置"""
+        for name, value in self._saved_pragmas.items():
+            self.cursor.execute(f"PRAGMA {name} = {value}")
+        self._saved_pragmas = {}
+
+    def read_records(self, path: str, file_format: Optional[str] = None) -> Iterator[Dict]:
+        """逐行读取CSV（首行为字段名）或JSONL文件"""
+        file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+        if file_format == "csv":
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                yield from csv.DictReader(f)
+        elif file_format in ("jsonl", "ndjson", "json"):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+        else:
+            raise ValueError(f"不支持的文件格式: {file_format}")
+
+    def convert_record(self, table: str, record: Dict) -> Tuple:
+        """按字段顺序取值并转换数值类型，缺少字段或外键不存在时抛出ValueError"""
+        row = []
+        for column in IMPORT_COLUMNS[table]:
+            value = record.get(column)
+            if value == "":
+                value = None
+            if value is not None:
+                if column in INTEGER_COLUMNS:
+                    value = int(value)
+                elif column in REAL_COLUMNS:
+                    value = float(value)
+                else:
+                    value = str(value)
+            row.append(value)
+
+        if row[0] is None:
+            raise ValueError(f"缺少主键字段 {IMPORT_COLUMNS[table][0]}")
+        for column, ref_table in FOREIGN_KEYS.get(table, []):
+            value = row[IMPORT_COLUMNS[table].index(column)]
+            if value is not None and value not in self.key_sets[ref_table]:
+                raise ValueError(f"{column}={value} 在 {ref_table} 中不存在")
+        return tuple(row)
+
+    def import_file(self, table: str, path: str, file_format: Optional[str] = None) -> Dict:
+        """
+        导入一个文件到指定表
+
+        Returns:
+            导入统计：读取行数、写入行数、重复行数、无效行数、耗时和速率
+        """
+        if table not in IMPORT_COLUMNS:
+            raise ValueError(f"不支持导入的表: {table}")
+
+        columns = IMPORT_COLUMNS[table]
+        insert_sql = (f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' * len(columns))})")
+        key_set = self.key_sets.get(table)
+        stats = {"table": table, "file": path, "read": 0, "inserted": 0,
+                 "duplicates": 0, "rejected": 0}
+        start = time.perf_counter()
+
+        chunk = []
+        for record in self.read_records(path, file_format):
+            stats["read"] += 1
+            try:
+                chunk.append(self.convert_record(table, record))
+            except (ValueError, TypeError) as e:
+                stats["rejected"] += 1
+                if stats["rejected"] <= self.max_errors_shown:
+                    print(f"❌ {path} 第 {stats['read']} 行无效: {e}")
+                continue
+            if len(chunk) >= self.chunk_size:
+                self._suspend_daily(table, large=True)
+                self._write_chunk(table, insert_sql, chunk, key_set, stats)
+                chunk = []
+        if chunk:
+            self._suspend_daily(table, large=False)
+            self._write_chunk(table, insert_sql, chunk, key_set, stats)
+
+        stats["seconds"] = time.perf_counter() - start
+        stats["rows_per_sec"] = stats["read"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+        print(f"✅ {table} 导入完成: 读取 {stats['read']} 行，写入 {stats['inserted']} 行，"
+              f"重复 {stats['duplicates']} 行，无效 {stats['rejected']} 行，"
+              f"耗时 {stats['seconds']:.2f} 秒（{stats['rows_per_sec']:.0f} 行/秒）")
+        return stats
+
+    def _suspend_daily(self, table: str, large: bool):
+        """
+        写入流水前决定是否暂停该表的逐日触发器
+
+        每行流水触发器要维护当天及之后各天的累计值，大批量导入时它是主要开销；
+        暂停后在resume_daily中按全部流水重算一次kucun_riji
+        """
+        if table not in LEDGER_DATE_COLUMNS or table in self._suspended:
+            return
+        if self.defer_daily or (self.defer_daily is None and large):
+            suspend_daily_triggers(self.conn, [table])
+            self._suspended.add(table)
+
+    def resume_daily(self):
+        """重算kucun_riji并重建暂停的逐日触发器（close时自动执行）"""
+        if not self._suspended:
+            return
+        start = time.perf_counter()
+        rows = restore_daily_triggers(self.conn, self.archive_dir)
+        self._suspended = set()
+        print(f"✅ 逐日库存累计表已重算: {rows} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+
+    def _write_chunk(self, table: str, insert_sql: str, chunk: List[Tuple],
+                     key_set: Optional[Set[str]], stats: Dict):
+        """在一个事务中写入一块数据，并维护内存中的主键集合"""
+        total = len(chunk)
+        try:
+            if self.apply_stock and table in ("ruku", "chuku"):
+                # 只有真正写入的流水才能影响库存，先剔除已存在和块内重复的单据
+                chunk = self._drop_existing(table, chunk)
+            self.cursor.executemany(insert_sql, chunk)
+            inserted = self.cursor.rowcount
+            if self.apply_stock and table in ("ruku", "chuku"):
+                sign = 1 if table == "ruku" else -1
+                deltas: Dict[str, int] = {}
+                for row in chunk:
+                    deltas[row[1]] = deltas.get(row[1], 0) + sign * (row[3] or 0)
+                self.cursor.executemany(
+                    "UPDATE kucun SET shuliang = shuliang + ? WHERE bianhao = ?",
+                    [(delta, code) for code, delta in deltas.items()]
+                )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if key_set is not None:
+            key_set.update(row[0] for row in chunk)
+        stats["inserted"] += inserted
+        stats["duplicates"] += total - inserted
+
+    def _drop_existing(self, table: str, chunk: List[Tuple]) -> List[Tuple]:
+        """去掉主键已在库中或在本块中重复出现的行"""
+        key_column = IMPORT_COLUMNS[table][0]
+        keys = list({row[0] for row in chunk})
+        seen = set()
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            placeholders = ", ".join("?" * len(part))
+            self.cursor.execute(
+                f"SELECT {key_column} FROM {table} WHERE {key_column} IN ({placeholders})", part
+            )
+            seen.update(row[0] for row in self.cursor.fetchall())
+        rows = []
+        for row in chunk:
+            if row[0] not in seen:
+                seen.add(row[0])
+                rows.append(row)
+        return rows
+
+    def import_files(self, files: Dict[str, str]) -> List[Dict]:
+        """按依赖顺序导入多个文件，files为 表名 -> 文件路径"""
+        results = []
+        for table in IMPORT_ORDER:
+            if table in files:
+                results.append(self.import_file(table, files[table]))
+        self.resume_daily()
+        return results
+
+
+def main():
+    """命令行入口：python warehouse_importer.py 表名 文件 [表名 文件 ...]"""
+    parser = argparse.ArgumentParser(description="仓库管理系统 - CSV/JSONL批量导入")
+    parser.add_argument("pairs", nargs="+", help="成对出现的 表名 文件路径")
+    parser.add_argument("--db", default="warehouse.db", help="数据库文件路径")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="每个事务的行数")
+    parser.add_argument("--apply-stock", action="store_true", help="导入流水时同步更新库存数量")
+    args = parser.parse_args()
+
+    if len(args.pairs) % 2:
+        parser.error("参数必须是成对的 表名 文件路径")
+    files = dict(zip(args.pairs[0::2], args.pairs[1::2]))
+    unknown = set(files) - set(IMPORT_COLUMNS)
+    if unknown:
+        parser.error(f"不支持导入的表: {', '.join(sorted(unknown))}")
+
+    with BulkImporter(args.db, chunk_size=args.chunk_size, apply_stock=args.apply_stock) as importer:
+        results = importer.import_files(files)
+    total = sum(r["inserted"] for r in results)
+    seconds = sum(r["seconds"] for r in results)
+    print(f"📊 共写入 {total} 行，耗时 {seconds:.2f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,36 +7,41 @@
 日期：2024
 """
 
-import sqlite3
 import datetime
-import pandas as pd
 import os
-from typing import List, Dict, Optional, Tuple
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
+from typing import Dict, Optional, Union
+
+from connection_profiles import open_connection
+from outbound_engine import OutboundEngine
+from row_source import RowSource, fetch_report_source, fetch_report_sources, print_row_source
+from warehouse_schema import migrate_database
 
 class WarehouseManagementSystemExcel:
     """仓库管理系统主类 - Excel报表版本"""
     
-    def __init__(self, db_path: str = "warehouse.db", excel_path: str = "warehouse_report.xlsx"):
+    def __init__(self, db_path: str = "warehouse.db", excel_path: str = "warehouse_report.xlsx",
+                 profile: Union[str, Dict, None] = "durable"):
         """
         初始化仓库管理系统
         
         Args:
             db_path: 数据库文件路径
             excel_path: Excel报表文件路径
+            profile: SQLite连接配置，预设名称（durable / fast-ingest / read-replica）或参数字典
         """
         self.db_path = db_path
         self.excel_path = excel_path
+        self.profile = profile
         self.conn = None
         self.cursor = None
         
     def connect_database(self):
         """连接数据库"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = open_connection(self.db_path, self.profile)
             self.cursor = self.conn.cursor()
+            # 原地升级已有数据库的结构
+            migrate_database(self.conn)
             print("✅ 数据库连接成功")
             return True
         except Exception as e:
@@ -133,6 +138,9 @@ class WarehouseManagementSystemExcel:
             ''')
             
             self.conn.commit()
+            
+            # 建立索引等结构升级
+            migrate_database(self.conn)
             print("✅ 数据库表创建成功")
             return True
             
@@ -208,91 +216,32 @@ class WarehouseManagementSystemExcel:
             print(f"❌ 插入示例数据失败: {e}")
             return False
     
-    def get_all_data_for_excel(self) -> Dict[str, pd.DataFrame]:
-        """获取所有数据用于Excel报表"""
-        data = {}
-        
+    def get_all_data_for_excel(self) -> Dict[str, RowSource]:
+        """获取所有数据用于Excel报表（工作表名 -> 行数据）"""
         try:
-            # 操作员数据
-            self.cursor.execute('SELECT * FROM caozuoyuan')
-            operators_data = self.cursor.fetchall()
-            data['操作员'] = pd.DataFrame(operators_data, columns=['姓名', '联系方式'])
-            
-            # 供应商数据
-            self.cursor.execute('SELECT * FROM gongyingshang')
-            suppliers_data = self.cursor.fetchall()
-            data['供应商'] = pd.DataFrame(suppliers_data, columns=['供应商编号', '供应商名称', '联系人', '联系方式'])
-            
-            # 仓库数据
-            self.cursor.execute('SELECT * FROM cangku')
-            warehouses_data = self.cursor.fetchall()
-            data['仓库'] = pd.DataFrame(warehouses_data, columns=['仓库名称', '操作员', '负责人', '创建日期'])
-            
-            # 库存数据
-            self.cursor.execute('''
-                SELECT k.bianhao, k.cangkumingcheng, k.shuliang, k.danjia,
-                       c.cangkufuzeren, (k.shuliang * k.danjia) as 总价值
-                FROM kucun k
-                LEFT JOIN cangku c ON k.cangkumingcheng = c.cangkumingcheng
-                ORDER BY k.cangkumingcheng, k.bianhao
-            ''')
-            inventory_data = self.cursor.fetchall()
-            data['库存'] = pd.DataFrame(inventory_data, columns=['库存编号', '仓库名称', '数量', '单价', '负责人', '总价值'])
-            
-            # 入库记录
-            self.cursor.execute('''
-                SELECT r.rukubianhao, r.huowubianhao, r.mingcheng, r.shuliang, 
-                       r.danjia, r.rukuriqi, r.gongyingshangmingcheng,
-                       (r.shuliang * r.danjia) as 入库金额
-                FROM ruku r
-                ORDER BY r.rukuriqi DESC
-            ''')
-            inbound_data = self.cursor.fetchall()
-            data['入库记录'] = pd.DataFrame(inbound_data, columns=['入库编号', '货物编号', '货物名称', '数量', '单价', '入库日期', '供应商', '入库金额'])
-            
-            # 出库记录
-            self.cursor.execute('''
-                SELECT c.chukubianhao, c.huowubianhao, c.mingcheng, c.shuliang, 
-                       c.danjia, c.chukuriqi, (c.shuliang * c.danjia) as 出库金额
-                FROM chuku c
-                ORDER BY c.chukuriqi DESC
-            ''')
-            outbound_data = self.cursor.fetchall()
-            data['出库记录'] = pd.DataFrame(outbound_data, columns=['出库编号', '货物编号', '货物名称', '数量', '单价', '出库日期', '出库金额'])
-            
-            # 仓库汇总
-            self.cursor.execute('''
-                SELECT c.cangkumingcheng, c.cangkufuzeren, c.xingming,
-                       COUNT(k.bianhao) as 库存种类,
-                       SUM(k.shuliang) as 总数量,
-                       SUM(k.shuliang * k.danjia) as 总价值
-                FROM cangku c
-                LEFT JOIN kucun k ON c.cangkumingcheng = k.cangkumingcheng
-                GROUP BY c.cangkumingcheng, c.cangkufuzeren, c.xingming
-                ORDER BY c.cangkumingcheng
-            ''')
-            summary_data = self.cursor.fetchall()
-            data['仓库汇总'] = pd.DataFrame(summary_data, columns=['仓库名称', '负责人', '操作员', '库存种类', '总数量', '总价值'])
-            
-            # 供应关系
-            self.cursor.execute('''
-                SELECT g.gongyingshangbianhao, s.gongyingshangmingcheng, 
-                       g.cangkumingcheng, s.lianxirren, s.lianxifangshi
-                FROM gongying g
-                LEFT JOIN gongyingshang s ON g.gongyingshangbianhao = s.gongyingshangbianhao
-                ORDER BY g.gongyingshangbianhao, g.cangkumingcheng
-            ''')
-            supply_data = self.cursor.fetchall()
-            data['供应关系'] = pd.DataFrame(supply_data, columns=['供应商编号', '供应商名称', '仓库名称', '联系人', '联系方式'])
-            
-            return data
-            
+            return fetch_report_sources(self.cursor)
         except Exception as e:
             print(f"❌ 获取数据失败: {e}")
             return {}
     
-    def generate_excel_report(self, operation_name: str = ""):
-        """生成Excel报表"""
+    def generate_excel_report(self, operation_name: str = "", streaming: bool = False,
+                              parallel: bool = False):
+        """
+        生成Excel报表
+        
+        streaming为True时分批流式写入只写工作簿（适合大量流水）；
+        parallel为True时由进程池并行生成各工作表
+        """
+        if parallel:
+            return self.generate_excel_report_parallel(operation_name)
+        if streaming:
+            return self.generate_excel_report_streaming(operation_name)
+        
+        # openpyxl只在生成报表时导入
+        from openpyxl import Workbook
+        from openpyxl.styles import Font
+        from excel_incremental import write_rows_sheet
+        
         try:
             # 获取所有数据
             data = self.get_all_data_for_excel()
@@ -300,11 +249,6 @@ class WarehouseManagementSystemExcel:
             # 创建Excel工作簿
             wb = Workbook()
             
-            # 设置样式
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center")
-            
             # 创建报表信息工作表
             info_sheet = wb.active
             info_sheet.title = "报表信息"
@@ -316,46 +260,11 @@ class WarehouseManagementSystemExcel:
             info_sheet['A4'] = f"操作类型: {operation_name}" if operation_name else "操作类型: 系统状态查看"
             info_sheet['A5'] = f"数据库文件: {self.db_path}"
             
-            # 为每个数据表创建工作表
-            for sheet_name, df in data.items():
-                if not df.empty:
-                    # 创建工作表
+            # 为每个数据表创建工作表（表头样式、列宽和边框）
+            for sheet_name, source in data.items():
+                if not source.empty:
                     ws = wb.create_sheet(title=sheet_name)
-                    
-                    # 写入数据
-                    for r in dataframe_to_rows(df, index=False, header=True):
-                        ws.append(r)
-                    
-                    # 设置表头样式
-                    for cell in ws[1]:
-                        cell.font = header_font
-                        cell.fill = header_fill
-                        cell.alignment = header_alignment
-                    
-                    # 设置列宽
-                    for column in ws.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        ws.column_dimensions[column_letter].width = adjusted_width
-                    
-                    # 添加边框
-                    thin_border = Border(
-                        left=Side(style='thin'),
-                        right=Side(style='thin'),
-                        top=Side(style='thin'),
-                        bottom=Side(style='thin')
-                    )
-                    
-                    for row in ws.iter_rows(min_row=1, max_row=len(df)+1, min_col=1, max_col=len(df.columns)):
-                        for cell in row:
-                            cell.border = thin_border
+                    write_rows_sheet(ws, source)
             
             # 保存Excel文件
             wb.save(self.excel_path)
@@ -371,6 +280,43 @@ class WarehouseManagementSystemExcel:
             print(f"❌ 生成Excel报表失败: {e}")
             return False
     
+    def generate_excel_report_streaming(self, operation_name: str = "", chunk_size: int = 5000):
+        """流式生成Excel报表"""
+        from excel_streaming import stream_excel_report
+        
+        try:
+            counts = stream_excel_report(self.cursor, self.excel_path, self.db_path,
+                                         operation_name, chunk_size)
+            print(f"✅ Excel报表已流式生成: {self.excel_path}（共 {sum(counts.values())} 行）")
+            
+            # 显示文件信息
+            file_size = os.path.getsize(self.excel_path) / 1024  # KB
+            print(f"📊 文件大小: {file_size:.2f} KB")
+            
+            return True
+            
+        except Exception as e:
+            print(f"❌ 流式生成Excel报表失败: {e}")
+            return False
+    
+    def generate_excel_report_parallel(self, operation_name: str = "", workers: Optional[int] = None):
+        """并行生成Excel报表（子进程读取的是已提交的数据）"""
+        from excel_parallel import parallel_excel_report
+        
+        try:
+            counts = parallel_excel_report(self.db_path, self.excel_path, operation_name, workers)
+            print(f"✅ Excel报表已并行生成: {self.excel_path}（共 {sum(counts.values())} 行）")
+            
+            # 显示文件信息
+            file_size = os.path.getsize(self.excel_path) / 1024  # KB
+            print(f"📊 文件大小: {file_size:.2f} KB")
+            
+            return True
+            
+        except Exception as e:
+            print(f"❌ 并行生成Excel报表失败: {e}")
+            return False
+    
     def add_operator(self, name: str, contact: str) -> bool:
         """添加操作员"""
         try:
@@ -446,34 +392,15 @@ class WarehouseManagementSystemExcel:
     
     def process_outbound(self, outbound_code: str, inventory_code: str,
                         goods_code: str, quantity: int, name: str, price: float) -> bool:
-        """处理出库操作"""
+        """处理出库操作（库存校验与扣减在同一条条件UPDATE中完成，并发出库不会超卖）"""
         try:
-            # 检查库存是否足够
-            self.cursor.execute(
-                "SELECT shuliang FROM kucun WHERE bianhao = ?", 
-                (inventory_code,)
+            success, message = OutboundEngine(self.conn).outbound(
+                outbound_code, inventory_code, goods_code, quantity, name, price
             )
-            current_quantity = self.cursor.fetchone()
-            
-            if not current_quantity or current_quantity[0] < quantity:
-                print(f"❌ 库存不足，当前库存: {current_quantity[0] if current_quantity else 0}, 需要: {quantity}")
+            if not success:
+                print(f"❌ {message}")
                 return False
             
-            # 记录出库信息
-            outbound_date = datetime.datetime.now().strftime("%Y-%m-%d")
-            self.cursor.execute(
-                "INSERT INTO chuku VALUES (?, ?, ?, ?, ?, ?, ?)", 
-                (outbound_code, inventory_code, goods_code, quantity, 
-                 name, outbound_date, price)
-            )
-            
-            # 更新库存数量
-            self.cursor.execute(
-                "UPDATE kucun SET shuliang = shuliang - ? WHERE bianhao = ?", 
-                (quantity, inventory_code)
-            )
-            
-            self.conn.commit()
             print(f"✅ 出库操作 {outbound_code} 处理成功")
             self.generate_excel_report(f"出库操作: {outbound_code}")
             return True
@@ -488,20 +415,9 @@ class WarehouseManagementSystemExcel:
         print("="*60)
         
         try:
-            self.cursor.execute('''
-                SELECT k.bianhao, k.cangkumingcheng, k.shuliang, k.danjia,
-                       c.cangkufuzeren, (k.shuliang * k.danjia) as 总价值
-                FROM kucun k
-                LEFT JOIN cangku c ON k.cangkumingcheng = c.cangkumingcheng
-                ORDER BY k.cangkumingcheng, k.bianhao
-            ''')
-            
-            results = self.cursor.fetchall()
-            if results:
-                print(f"{'库存编号':<12} {'仓库名称':<12} {'数量':<8} {'单价':<10} {'负责人':<10} {'总价值':<12}")
-                print("-" * 70)
-                for row in results:
-                    print(f"{row[0]:<12} {row[1]:<12} {row[2]:<8} {row[3]:<10} {row[4]:<10} {row[5]:<12}")
+            source = fetch_report_source(self.cursor, "库存")
+            if not source.empty:
+                print_row_source(source)
             else:
                 print("暂无库存数据")
         except Exception as e:
@@ -514,23 +430,9 @@ class WarehouseManagementSystemExcel:
         print("="*80)
         
         try:
-            self.cursor.execute('''
-                SELECT c.cangkumingcheng, c.cangkufuzeren, c.xingming,
-                       COUNT(k.bianhao) as 库存种类,
-                       SUM(k.shuliang) as 总数量,
-                       SUM(k.shuliang * k.danjia) as 总价值
-                FROM cangku c
-                LEFT JOIN kucun k ON c.cangkumingcheng = k.cangkumingcheng
-                GROUP BY c.cangkumingcheng, c.cangkufuzeren, c.xingming
-                ORDER BY c.cangkumingcheng
-            ''')
-            
-            results = self.cursor.fetchall()
-            if results:
-                print(f"{'仓库名称':<12} {'负责人':<10} {'操作员':<10} {'库存种类':<8} {'总数量':<8} {'总价值':<12}")
-                print("-" * 80)
-                for row in results:
-                    print(f"{row[0]:<12} {row[1]:<10} {row[2]:<10} {row[3]:<8} {row[4]:<8} {row[5]:<12}")
+            source = fetch_report_source(self.cursor, "仓库汇总")
+            if not source.empty:
+                print_row_source(source)
             else:
                 print("暂无仓库数据")
         except Exception as e:
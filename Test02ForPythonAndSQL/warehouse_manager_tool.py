@@ -9,29 +9,145 @@
 
 import sqlite3
 import datetime
-import pandas as pd
 import os
+import shutil
 import sys
-from typing import List, Dict, Optional, Tuple
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
+import threading
+import functools
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Dict, Mapping, Optional, Sequence, Set, Tuple, Union
+
+# openpyxl及报表模块导入较慢，只在第一次生成报表时在方法内导入，
+# 入库、出库、状态查看等命令行调用不需要加载它们
+from connection_pool import ConnectionPool
+from connection_profiles import open_connection
+from instrumentation import Instrumentation, instrumented
+from operation_journal import OperationJournal
+from outbound_engine import OutboundEngine, begin_immediate
+from report_scheduler import ReportScheduler
+from row_source import RowSource, fetch_report_sources
+from stock_cache import StockCache
+from warehouse_schema import migrate_database
+
+# 批量接口中入库/出库行的字段顺序（与process_inbound/process_outbound的参数一致）
+INBOUND_FIELDS = ("inbound_code", "inventory_code", "goods_code", "quantity", "name", "price", "supplier")
+OUTBOUND_FIELDS = ("outbound_code", "inventory_code", "goods_code", "quantity", "name", "price")
+
+# 单条SQL中IN (...)参数的最大个数，低于SQLite默认的变量上限
+SQL_IN_CHUNK = 500
+
+
+def normalize_batch_lines(lines: Iterable, fields: Tuple[str, ...]) -> List[Tuple]:
+    """把字典或元组形式的批量行统一成按fields排列的元组，并规范数量和单价的类型"""
+    rows = []
+    for line in lines:
+        if isinstance(line, Mapping):
+            row = [line[field] for field in fields]
+        else:
+            row = list(line)
+            if len(row) != len(fields):
+                raise ValueError(f"批量行字段数应为 {len(fields)}: {line!r}")
+        try:
+            row[3] = int(row[3])
+        except (TypeError, ValueError):
+            raise ValueError(f"数量应为整数: {row[3]!r}") from None
+        try:
+            row[5] = float(row[5])
+        except (TypeError, ValueError):
+            raise ValueError(f"单价应为数字: {row[5]!r}") from None
+        rows.append(tuple(row))
+    return rows
+
+
+def fetch_existing_keys(cursor: sqlite3.Cursor, table: str, column: str, keys: Set[str]) -> Set[str]:
+    """分批查询keys中已存在于table.column的值"""
+    keys = list(keys)
+    existing = set()
+    for start in range(0, len(keys), SQL_IN_CHUNK):
+        chunk = keys[start:start + SQL_IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor.execute(f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+
+def fetch_stock_levels(cursor: sqlite3.Cursor, codes: Set[str]) -> Dict[str, int]:
+    """分批查询库存编号对应的当前数量"""
+    codes = list(codes)
+    stock = {}
+    for start in range(0, len(codes), SQL_IN_CHUNK):
+        chunk = codes[start:start + SQL_IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor.execute(f"SELECT bianhao, shuliang FROM kucun WHERE bianhao IN ({placeholders})", chunk)
+        stock.update(cursor.fetchall())
+    return stock
+
+
+def serialized_write(method):
+    """写操作装饰器：启用连接池时持有写连接锁，多线程下同一时刻只有一个写事务"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.pool is None:
+            return method(self, *args, **kwargs)
+        with self.pool.write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class WarehouseManagerTool:
     """仓库管理便捷工具"""
     
-    def __init__(self, db_path: str = "warehouse.db", excel_path: str = "warehouse_report.xlsx"):
+    def __init__(self, db_path: str = "warehouse.db", excel_path: str = "warehouse_report.xlsx",
+                 report_delay: Optional[float] = 1.0, incremental_report: bool = False,
+                 streaming_report: bool = False, parallel_report: bool = False, profile: Union[str, Dict, None] = "durable",
+                 pool_readers: int = 0, stock_cache: bool = True, instrument: bool = False,
+                 stats_dump_interval: Optional[float] = None, stats_dump_path: Optional[str] = None,
+                 auto_report: bool = True, archive_dir: Optional[str] = None,
+                 journal_dir: Optional[str] = None):
         """
         初始化仓库管理工具
         
         Args:
             db_path: 数据库文件路径
             excel_path: Excel报表文件路径
+            report_delay: Excel报表合并窗口（秒），写操作只登记变更，由后台线程合并后重建报表；
+                          为None时每次写操作后同步重建报表
+            incremental_report: 是否增量更新报表（入库/出库记录只渲染新增行，新行按写入顺序排在表尾；
+                                工作表内容缓存在报表路径加 .parts 的目录中）
+            streaming_report: 全量生成报表时是否使用流式只写导出（适合大量流水，内存占用不随行数增长）
+            parallel_report: 全量生成报表时是否由进程池并行生成各工作表（优先于streaming_report）
+            profile: SQLite连接配置，预设名称（durable / fast-ingest / read-replica）或参数字典
+            pool_readers: 大于0时使用连接池（一个写连接加pool_readers个只读连接），
+                          实例可被多个线程共享，写操作串行执行，报表和状态查询并行读取
+            stock_cache: 是否启用内存库存缓存（出库前的库存校验和状态查看直接读取缓存）
+            instrument: 是否记录各操作、阶段（SQL、提交、报表重建）和SQL语句的耗时，通过stats()查看
+            stats_dump_interval: 启用计时时定期输出统计的间隔（秒），None表示不定期输出
+            stats_dump_path: 定期输出写入的JSON文件，None表示打印文本摘要
+            auto_report: 写操作后是否自动更新Excel报表，为False时只在调用update_excel_report时生成
+            archive_dir: 已结束月份的流水归档目录，默认为数据库所在目录下的archive
+            journal_dir: 操作日志和库存快照目录，给出时每次提交后把库存变动追加到日志（见operation_journal）
         """
         self.db_path = db_path
         self.excel_path = excel_path
         self.conn = None
         self.cursor = None
+        self.incremental_report = incremental_report
+        self.streaming_report = streaming_report
+        self.parallel_report = parallel_report
+        self.profile = profile
+        self.auto_report = auto_report
+        self.archive_dir = archive_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "archive")
+        self.pool_readers = pool_readers
+        self.pool = None
+        self.stock_cache = StockCache() if stock_cache else None
+        self.journal = OperationJournal(journal_dir) if journal_dir else None
+        self.instrumentation = Instrumentation() if instrument else None
+        if self.instrumentation and stats_dump_interval:
+            self.instrumentation.start_periodic_dump(stats_dump_interval, stats_dump_path)
+        self.report_lock = threading.Lock()
+        self.report_scheduler = None
+        if report_delay is not None:
+            self.report_scheduler = ReportScheduler(self.regenerate_excel_report, delay=report_delay)
         
     def create_blank_database(self):
         """创建空白数据库"""
@@ -40,13 +156,20 @@ class WarehouseManagerTool:
             if os.path.exists(self.db_path):
                 os.remove(self.db_path)
                 print(f"🗑️ 删除旧数据库文件: {self.db_path}")
+            # WAL模式遗留的日志文件必须一并删除，否则会被应用到新数据库上
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
             
             # 连接数据库（会自动创建文件）
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = self.instrument_connection(open_connection(self.db_path, self.profile))
             self.cursor = self.conn.cursor()
             
             # 创建表结构
             self.create_tables()
+            if self.stock_cache is not None:
+                self.stock_cache.load(self.conn)
+            self.open_journal()
             
             print(f"✅ 空白数据库创建成功: {self.db_path}")
             return True
@@ -57,11 +180,16 @@ class WarehouseManagerTool:
     
     def create_blank_excel(self):
         """创建空白Excel文档"""
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment
+        
         try:
             # 如果Excel文件已存在，先删除
             if os.path.exists(self.excel_path):
                 os.remove(self.excel_path)
                 print(f"🗑️ 删除旧Excel文件: {self.excel_path}")
+            # 增量报表的流水工作表缓存属于旧文件
+            shutil.rmtree(f"{self.excel_path}.parts", ignore_errors=True)
             
             # 创建Excel工作簿
             wb = Workbook()
@@ -206,6 +334,9 @@ class WarehouseManagerTool:
             ''')
             
             self.conn.commit()
+            
+            # 建立索引等结构升级
+            migrate_database(self.conn)
             print("✅ 数据库表结构创建成功")
             return True
             
@@ -216,8 +347,19 @@ class WarehouseManagerTool:
     def connect_database(self):
         """连接数据库"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            if self.pool_readers > 0:
+                self.pool = ConnectionPool(self.db_path, readers=self.pool_readers,
+                                           writer_profile=self.profile)
+                self.conn = self.instrument_connection(self.pool.writer_connection)
+            else:
+                self.conn = self.instrument_connection(open_connection(self.db_path, self.profile))
             self.cursor = self.conn.cursor()
+            # 原地升级已有数据库的结构
+            migrate_database(self.conn)
+            self.repair_stock_history_triggers()
+            if self.stock_cache is not None:
+                self.stock_cache.load(self.conn)
+            self.open_journal()
             print("✅ 数据库连接成功")
             return True
         except Exception as e:
@@ -226,24 +368,158 @@ class WarehouseManagerTool:
     
     def close_database(self):
         """关闭数据库连接"""
-        if self.conn:
+        if self.report_scheduler:
+            # 退出前把尚未写入的变更落到报表中
+            self.report_scheduler.stop(flush=True)
+        if self.instrumentation:
+            self.instrumentation.stop_periodic_dump()
+        if self.journal is not None:
+            self.journal.close()
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+            print("🔒 数据库连接池已关闭")
+        elif self.conn:
             self.conn.close()
             print("🔒 数据库连接已关闭")
     
-    def update_excel_report(self, operation_name: str = ""):
-        """更新Excel报表"""
+    def open_journal(self):
+        """打开操作日志：加载最近的快照并重放日志，与数据库不一致时追加校正事件"""
+        if self.journal is None:
+            return
+        if not self.journal.open(self.conn):
+            print(f"🔧 操作日志与数据库库存不一致，已按数据库追加校正事件: {self.journal.journal_dir}")
+    
+    def record_journal(self, events: List[Dict]):
+        """把已提交的库存变动追加到操作日志；日志写入失败不影响已提交的数据库操作"""
+        if self.journal is None or not events:
+            return
         try:
-            # 获取所有数据
-            data = self.get_all_data_for_excel()
+            self.journal.append(events)
+        except Exception as e:
+            print(f"❌ 写入操作日志失败: {e}")
+    
+    def instrument_connection(self, conn: sqlite3.Connection):
+        """启用计时时返回计时代理，否则原样返回连接"""
+        if self.instrumentation is None:
+            return conn
+        return self.instrumentation.wrap_connection(conn)
+    
+    def instrument_cursor(self, cursor: sqlite3.Cursor):
+        """启用计时时返回计时代理，否则原样返回游标"""
+        if self.instrumentation is None:
+            return cursor
+        return self.instrumentation.wrap_cursor(cursor)
+    
+    def stats(self) -> Dict:
+        """返回计时统计（操作、阶段、SQL语句），未启用计时时返回空字典"""
+        if self.instrumentation is None:
+            return {}
+        return self.instrumentation.stats()
+    
+    def sync_stock_cache(self) -> Optional[StockCache]:
+        """
+        返回与数据库同步的库存缓存，未启用缓存或未连接时返回None
+        
+        其他连接或进程提交过写入时（data_version变化）重新加载；本实例的写入已写穿到缓存。
+        """
+        if self.stock_cache is None or self.conn is None:
+            return None
+        if self.pool:
+            # data_version必须在写连接上读取，与写操作串行
+            with self.pool.write_lock:
+                self.stock_cache.validate(self.conn)
+        else:
+            self.stock_cache.validate(self.conn)
+        return self.stock_cache
+    
+    @instrumented
+    def get_stock(self, inventory_code: str) -> Optional[int]:
+        """查询库存编号的当前数量，不存在时返回None"""
+        cache = self.sync_stock_cache()
+        if cache is not None:
+            item = cache.get(inventory_code)
+            return item[0] if item else None
+        with self.read_cursor() as cursor:
+            cursor.execute("SELECT shuliang FROM kucun WHERE bianhao = ?", (inventory_code,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def schedule_excel_report(self, operation_name: str = ""):
+        """登记报表变更：启用后台调度时合并后异步重建，否则同步重建"""
+        if not self.auto_report:
+            return
+        if self.report_scheduler:
+            self.report_scheduler.mark_dirty(operation_name)
+        else:
+            self.update_excel_report(operation_name)
+    
+    @contextmanager
+    def read_cursor(self) -> Iterator[sqlite3.Cursor]:
+        """获取用于查询的游标：启用连接池时借出只读连接，否则使用当前连接"""
+        if self.pool:
+            with self.pool.reader() as cursor:
+                yield self.instrument_cursor(cursor)
+        else:
+            yield self.cursor
+    
+    @instrumented
+    def regenerate_excel_report(self, operation_name: str = "") -> bool:
+        """后台线程使用独立的只读连接重建Excel报表（WAL模式下不阻塞前台写入）"""
+        if self.pool:
+            with self.pool.reader() as cursor:
+                return self.update_excel_report(operation_name, cursor=self.instrument_cursor(cursor))
+        conn = open_connection(self.db_path, "read-replica")
+        try:
+            return self.update_excel_report(operation_name, cursor=self.instrument_cursor(conn.cursor()))
+        finally:
+            conn.close()
+    
+    @instrumented
+    def update_excel_report(self, operation_name: str = "", cursor: Optional[sqlite3.Cursor] = None,
+                            incremental: Optional[bool] = None, streaming: Optional[bool] = None,
+                            parallel: Optional[bool] = None):
+        """
+        更新Excel报表
+        
+        Args:
+            operation_name: 触发更新的操作说明
+            cursor: 读取数据使用的游标，默认使用当前连接
+            incremental: 是否只向入库/出库记录追加新增行，默认取初始化参数incremental_report
+            streaming: 全量生成时是否使用流式只写导出，默认取初始化参数streaming_report
+            parallel: 全量生成时是否并行生成各工作表，默认取初始化参数parallel_report
+        """
+        if cursor is None and self.pool:
+            with self.pool.reader() as cursor:
+                return self.update_excel_report(operation_name, self.instrument_cursor(cursor),
+                                                incremental, streaming, parallel)
+        cursor = cursor or self.cursor
+        if incremental is None:
+            incremental = self.incremental_report
+        if incremental:
+            return self.append_excel_report(operation_name, cursor)
+        if parallel is None:
+            parallel = self.parallel_report
+        if parallel:
+            return self.parallel_excel_report(operation_name)
+        if streaming is None:
+            streaming = self.streaming_report
+        if streaming:
+            return self.stream_excel_report(operation_name, cursor)
+        
+        from openpyxl import Workbook
+        from openpyxl.styles import Font
+        from excel_incremental import read_snapshot, read_ledger_marks, write_mark_sheet, write_rows_sheet
+        
+        try:
+            # 在同一个读事务中获取数据和导出水位
+            with read_snapshot(cursor):
+                marks = read_ledger_marks(cursor)
+                data = self.get_all_data_for_excel(cursor, marks=marks)
             
             # 创建Excel工作簿
             wb = Workbook()
             
-            # 设置样式
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center")
-            
             # 创建报表信息工作表
             info_sheet = wb.active
             info_sheet.title = "报表信息"
@@ -256,48 +532,17 @@ class WarehouseManagerTool:
             info_sheet['A5'] = f"数据库文件: {self.db_path}"
             
             # 为每个数据表创建工作表
-            for sheet_name, df in data.items():
-                if not df.empty:
-                    # 创建工作表
+            for sheet_name, source in data.items():
+                if not source.empty:
                     ws = wb.create_sheet(title=sheet_name)
-                    
-                    # 写入数据
-                    for r in dataframe_to_rows(df, index=False, header=True):
-                        ws.append(r)
-                    
-                    # 设置表头样式
-                    for cell in ws[1]:
-                        cell.font = header_font
-                        cell.fill = header_fill
-                        cell.alignment = header_alignment
-                    
-                    # 设置列宽
-                    for column in ws.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        ws.column_dimensions[column_letter].width = adjusted_width
-                    
-                    # 添加边框
-                    thin_border = Border(
-                        left=Side(style='thin'),
-                        right=Side(style='thin'),
-                        top=Side(style='thin'),
-                        bottom=Side(style='thin')
-                    )
-                    
-                    for row in ws.iter_rows(min_row=1, max_row=len(df)+1, min_col=1, max_col=len(df.columns)):
-                        for cell in row:
-                            cell.border = thin_border
+                    write_rows_sheet(ws, source)
             
-            # 保存Excel文件
-            wb.save(self.excel_path)
+            # 记录导出水位，供后续增量更新使用
+            write_mark_sheet(wb, marks)
+            
+            # 保存Excel文件（前台与后台线程可能同时写同一个文件）
+            with self.report_lock:
+                wb.save(self.excel_path)
             print(f"✅ Excel报表已更新: {self.excel_path}")
             
             return True
@@ -306,89 +551,98 @@ class WarehouseManagerTool:
             print(f"❌ 更新Excel报表失败: {e}")
             return False
     
-    def get_all_data_for_excel(self) -> Dict[str, pd.DataFrame]:
-        """获取所有数据用于Excel报表"""
-        data = {}
+    @instrumented
+    def stream_excel_report(self, operation_name: str = "", cursor: Optional[sqlite3.Cursor] = None,
+                            chunk_size: int = 5000) -> bool:
+        """流式生成Excel报表：分批读取游标写入只写工作簿，不在内存中保留整张工作表"""
+        from excel_streaming import stream_excel_report
         
         try:
-            # 操作员数据
-            self.cursor.execute('SELECT * FROM caozuoyuan')
-            operators_data = self.cursor.fetchall()
-            data['操作员'] = pd.DataFrame(operators_data, columns=['姓名', '联系方式'])
-            
-            # 供应商数据
-            self.cursor.execute('SELECT * FROM gongyingshang')
-            suppliers_data = self.cursor.fetchall()
-            data['供应商'] = pd.DataFrame(suppliers_data, columns=['供应商编号', '供应商名称', '联系人', '联系方式'])
-            
-            # 仓库数据
-            self.cursor.execute('SELECT * FROM cangku')
-            warehouses_data = self.cursor.fetchall()
-            data['仓库'] = pd.DataFrame(warehouses_data, columns=['仓库名称', '操作员', '负责人', '创建日期'])
-            
-            # 库存数据
-            self.cursor.execute('''
-                SELECT k.bianhao, k.cangkumingcheng, k.shuliang, k.danjia,
-                       c.cangkufuzeren, (k.shuliang * k.danjia) as 总价值
-                FROM kucun k
-                LEFT JOIN cangku c ON k.cangkumingcheng = c.cangkumingcheng
-                ORDER BY k.cangkumingcheng, k.bianhao
-            ''')
-            inventory_data = self.cursor.fetchall()
-            data['库存'] = pd.DataFrame(inventory_data, columns=['库存编号', '仓库名称', '数量', '单价', '负责人', '总价值'])
-            
-            # 入库记录
-            self.cursor.execute('''
-                SELECT r.rukubianhao, r.huowubianhao, r.mingcheng, r.shuliang, 
-                       r.danjia, r.rukuriqi, r.gongyingshangmingcheng,
-                       (r.shuliang * r.danjia) as 入库金额
-                FROM ruku r
-                ORDER BY r.rukuriqi DESC
-            ''')
-            inbound_data = self.cursor.fetchall()
-            data['入库记录'] = pd.DataFrame(inbound_data, columns=['入库编号', '货物编号', '货物名称', '数量', '单价', '入库日期', '供应商', '入库金额'])
-            
-            # 出库记录
-            self.cursor.execute('''
-                SELECT c.chukubianhao, c.huowubianhao, c.mingcheng, c.shuliang, 
-                       c.danjia, c.chukuriqi, (c.shuliang * c.danjia) as 出库金额
-                FROM chuku c
-                ORDER BY c.chukuriqi DESC
-            ''')
-            outbound_data = self.cursor.fetchall()
-            data['出库记录'] = pd.DataFrame(outbound_data, columns=['出库编号', '货物编号', '货物名称', '数量', '单价', '出库日期', '出库金额'])
-            
-            # 仓库汇总
-            self.cursor.execute('''
-                SELECT c.cangkumingcheng, c.cangkufuzeren, c.xingming,
-                       COUNT(k.bianhao) as 库存种类,
-                       SUM(k.shuliang) as 总数量,
-                       SUM(k.shuliang * k.danjia) as 总价值
-                FROM cangku c
-                LEFT JOIN kucun k ON c.cangkumingcheng = k.cangkumingcheng
-                GROUP BY c.cangkumingcheng, c.cangkufuzeren, c.xingming
-                ORDER BY c.cangkumingcheng
-            ''')
-            summary_data = self.cursor.fetchall()
-            data['仓库汇总'] = pd.DataFrame(summary_data, columns=['仓库名称', '负责人', '操作员', '库存种类', '总数量', '总价值'])
-            
-            # 供应关系
-            self.cursor.execute('''
-                SELECT g.gongyingshangbianhao, s.gongyingshangmingcheng, 
-                       g.cangkumingcheng, s.lianxirren, s.lianxifangshi
-                FROM gongying g
-                LEFT JOIN gongyingshang s ON g.gongyingshangbianhao = s.gongyingshangbianhao
-                ORDER BY g.gongyingshangbianhao, g.cangkumingcheng
-            ''')
-            supply_data = self.cursor.fetchall()
-            data['供应关系'] = pd.DataFrame(supply_data, columns=['供应商编号', '供应商名称', '仓库名称', '联系人', '联系方式'])
-            
-            return data
-            
+            with self.report_lock:
+                counts = stream_excel_report(cursor or self.cursor, self.excel_path, self.db_path,
+                                             operation_name, chunk_size)
+            print(f"✅ Excel报表已流式生成: {self.excel_path}（共 {sum(counts.values())} 行）")
+            return True
+        except Exception as e:
+            print(f"❌ 流式生成Excel报表失败: {e}")
+            return False
+    
+    @instrumented
+    def parallel_excel_report(self, operation_name: str = "", workers: Optional[int] = None) -> bool:
+        """并行生成Excel报表：每个工作表由一个子进程通过独立的只读连接生成，父进程打包xlsx"""
+        from excel_parallel import parallel_excel_report
+        
+        try:
+            with self.report_lock:
+                counts = parallel_excel_report(self.db_path, self.excel_path, operation_name, workers)
+            print(f"✅ Excel报表已并行生成: {self.excel_path}（共 {sum(counts.values())} 行）")
+            return True
+        except Exception as e:
+            print(f"❌ 并行生成Excel报表失败: {e}")
+            return False
+    
+    @instrumented
+    def export_snapshot(self, output_dir: str = "warehouse_snapshot", partition: str = "month",
+                        batch_size: int = 50000) -> bool:
+        """
+        导出Parquet列式快照（需要安装pyarrow）
+        
+        Args:
+            output_dir: 快照目录，数据表在tables/下，库存、仓库汇总、供应关系在views/下，
+                        入库/出库流水包含已归档的月份
+            partition: 入库/出库流水的分区粒度，month或day
+            batch_size: 每批从数据库读取的行数
+        """
+        try:
+            from parquet_snapshot import export_snapshot
+            results = export_snapshot(self.db_path, output_dir, partition, batch_size,
+                                      archive_dir=self.archive_dir)
+            print(f"✅ Parquet快照已导出: {output_dir}（共 {sum(r['rows'] for r in results.values())} 行，"
+                  f"{sum(r['files'] for r in results.values())} 个文件）")
+            return True
+        except Exception as e:
+            print(f"❌ 导出Parquet快照失败: {e}")
+            return False
+    
+    @instrumented
+    def append_excel_report(self, operation_name: str, cursor: sqlite3.Cursor) -> bool:
+        """
+        增量更新Excel报表：入库/出库记录的工作表内容缓存在报表旁的 .parts 目录中，只渲染水位之后的新行，
+        快照工作表整体重写后重新打包，不加载已有的工作簿（见excel_incremental.incremental_excel_report）
+        """
+        from excel_incremental import incremental_excel_report
+        
+        try:
+            with self.report_lock:
+                _, appended = incremental_excel_report(cursor, self.excel_path, self.db_path, operation_name)
+            print(f"✅ Excel报表已增量更新: {self.excel_path}（追加流水 {appended} 行）")
+            return True
+        except Exception as e:
+            print(f"❌ 增量更新Excel报表失败: {e}")
+            return False
+    
+    @instrumented
+    def get_all_data_for_excel(self, cursor: Optional[sqlite3.Cursor] = None, include_ledgers: bool = True,
+                               marks: Optional[Dict[str, int]] = None) -> Dict[str, RowSource]:
+        """
+        获取所有数据用于Excel报表
+        
+        Args:
+            cursor: 读取数据使用的游标，默认使用当前连接
+            include_ledgers: 为False时不读取入库/出库记录
+            marks: 入库/出库记录的导出水位，给出时只读取水位之内的行
+        
+        Returns:
+            工作表名 -> 行数据，需要DataFrame时调用RowSource.to_dataframe()
+        """
+        try:
+            return fetch_report_sources(cursor or self.cursor, include_ledgers, marks)
         except Exception as e:
             print(f"❌ 获取数据失败: {e}")
             return {}
     
+    @instrumented
+    @serialized_write
     def add_operator(self, name: str, contact: str) -> bool:
         """添加操作员"""
         try:
@@ -398,12 +652,14 @@ class WarehouseManagerTool:
             )
             self.conn.commit()
             print(f"✅ 操作员 {name} 添加成功")
-            self.update_excel_report(f"添加操作员: {name}")
+            self.schedule_excel_report(f"添加操作员: {name}")
             return True
         except Exception as e:
             print(f"❌ 添加操作员失败: {e}")
             return False
     
+    @instrumented
+    @serialized_write
     def add_supplier(self, code: str, name: str, contact: str, phone: str) -> bool:
         """添加供应商"""
         try:
@@ -413,12 +669,14 @@ class WarehouseManagerTool:
             )
             self.conn.commit()
             print(f"✅ 供应商 {name} 添加成功")
-            self.update_excel_report(f"添加供应商: {name}")
+            self.schedule_excel_report(f"添加供应商: {name}")
             return True
         except Exception as e:
             print(f"❌ 添加供应商失败: {e}")
             return False
     
+    @instrumented
+    @serialized_write
     def add_warehouse(self, name: str, operator: str, manager: str) -> bool:
         """添加仓库"""
         try:
@@ -428,13 +686,17 @@ class WarehouseManagerTool:
                 (name, operator, manager, create_date)
             )
             self.conn.commit()
+            if self.stock_cache is not None:
+                self.stock_cache.add_warehouse(name)
             print(f"✅ 仓库 {name} 添加成功")
-            self.update_excel_report(f"添加仓库: {name}")
+            self.schedule_excel_report(f"添加仓库: {name}")
             return True
         except Exception as e:
             print(f"❌ 添加仓库失败: {e}")
             return False
     
+    @instrumented
+    @serialized_write
     def add_inventory(self, code: str, warehouse: str, quantity: int, price: float) -> bool:
         """添加库存"""
         try:
@@ -443,75 +705,426 @@ class WarehouseManagerTool:
                 (code, warehouse, quantity, price)
             )
             self.conn.commit()
+            if self.stock_cache is not None:
+                self.stock_cache.put(code, warehouse, quantity, price)
+            self.record_journal([{"op": "set", "code": code, "warehouse": warehouse,
+                                  "quantity": int(quantity), "price": float(price)}])
             print(f"✅ 库存 {code} 添加成功")
-            self.update_excel_report(f"添加库存: {code}")
+            self.schedule_excel_report(f"添加库存: {code}")
             return True
         except Exception as e:
             print(f"❌ 添加库存失败: {e}")
             return False
     
+    @instrumented
+    @serialized_write
     def process_inbound(self, inbound_code: str, inventory_code: str, 
                        goods_code: str, quantity: int, name: str, 
                        price: float, supplier: str) -> bool:
         """处理入库操作"""
         try:
-            # 记录入库信息
-            inbound_date = datetime.datetime.now().strftime("%Y-%m-%d")
-            self.cursor.execute(
-                "INSERT INTO ruku VALUES (?, ?, ?, ?, ?, ?, ?, ?)", 
-                (inbound_code, inventory_code, goods_code, quantity, 
-                 name, inbound_date, price, supplier)
-            )
-            
-            # 更新库存数量
-            self.cursor.execute(
-                "UPDATE kucun SET shuliang = shuliang + ? WHERE bianhao = ?", 
-                (quantity, inventory_code)
-            )
-            
+            self.apply_inbound(inbound_code, inventory_code, goods_code, quantity, name, price, supplier)
             self.conn.commit()
+            if self.stock_cache is not None:
+                self.stock_cache.apply_delta(inventory_code, quantity)
+            self.record_journal([{"op": "inbound", "ref": inbound_code, "code": inventory_code,
+                                  "delta": int(quantity)}])
             print(f"✅ 入库操作 {inbound_code} 处理成功")
-            self.update_excel_report(f"入库操作: {inbound_code}")
+            self.schedule_excel_report(f"入库操作: {inbound_code}")
             return True
         except Exception as e:
+            self.conn.rollback()
             print(f"❌ 入库操作失败: {e}")
             return False
     
+    def apply_inbound(self, inbound_code: str, inventory_code: str, goods_code: str,
+                      quantity: int, name: str, price: float, supplier: str,
+                      inbound_date: Optional[str] = None):
+        """
+        在当前事务中增加库存数量并写入一条入库记录，由调用方提交
+        
+        库存编号不存在时抛出ValueError，不写入任何行；入库编号重复时INSERT抛出的异常由调用方回滚
+        """
+        inbound_date = inbound_date or datetime.datetime.now().strftime("%Y-%m-%d")
+        # 更新库存数量，影响0行即库存编号不存在
+        self.cursor.execute(
+            "UPDATE kucun SET shuliang = shuliang + ? WHERE bianhao = ?", 
+            (quantity, inventory_code)
+        )
+        if self.cursor.rowcount == 0:
+            raise ValueError(f"库存编号 {inventory_code} 不存在")
+        
+        # 记录入库信息
+        self.cursor.execute(
+            "INSERT INTO ruku VALUES (?, ?, ?, ?, ?, ?, ?, ?)", 
+            (inbound_code, inventory_code, goods_code, quantity, 
+             name, inbound_date, price, supplier)
+        )
+    
+    @instrumented
+    @serialized_write
     def process_outbound(self, outbound_code: str, inventory_code: str,
                         goods_code: str, quantity: int, name: str, price: float) -> bool:
-        """处理出库操作"""
+        """处理出库操作（库存校验与扣减在同一条条件UPDATE中完成，并发出库不会超卖）"""
         try:
-            # 检查库存是否足够
-            self.cursor.execute(
-                "SELECT shuliang FROM kucun WHERE bianhao = ?", 
-                (inventory_code,)
-            )
-            current_quantity = self.cursor.fetchone()
+            # 先用缓存快速拒绝库存不足的请求，不进入写事务
+            cache = self.sync_stock_cache()
+            if cache is not None and not cache.has_stock(inventory_code, quantity):
+                item = cache.get(inventory_code)
+                if item is None:
+                    print(f"❌ 库存编号 {inventory_code} 不存在")
+                else:
+                    print(f"❌ 库存不足，当前库存: {item[0]}, 需要: {quantity}")
+                return False
             
-            if not current_quantity or current_quantity[0] < quantity:
-                print(f"❌ 库存不足，当前库存: {current_quantity[0] if current_quantity else 0}, 需要: {quantity}")
+            # 数据库中的条件UPDATE仍是最终校验
+            success, message = OutboundEngine(self.conn).outbound(
+                outbound_code, inventory_code, goods_code, quantity, name, price
+            )
+            if not success:
+                if cache is not None:
+                    # 缓存与数据库不一致（或出库编号重复），下次查询时重新加载
+                    cache.invalidate()
+                print(f"❌ {message}")
                 return False
             
-            # 记录出库信息
+            if cache is not None:
+                cache.apply_delta(inventory_code, -quantity)
+            self.record_journal([{"op": "outbound", "ref": outbound_code, "code": inventory_code,
+                                  "delta": -int(quantity)}])
+            print(f"✅ 出库操作 {outbound_code} 处理成功")
+            self.schedule_excel_report(f"出库操作: {outbound_code}")
+            return True
+        except Exception as e:
+            print(f"❌ 出库操作失败: {e}")
+            return False
+    
+    @instrumented
+    @serialized_write
+    def process_inbound_batch(self, lines: Iterable, atomic: bool = False) -> List[Tuple[str, bool, str]]:
+        """
+        批量处理入库操作：全部有效行在一个事务中用executemany写入，库存按库存编号汇总后一次更新
+        
+        Args:
+            lines: 入库行，每行为字典（键同process_inbound的参数）或按
+                   (入库编号, 库存编号, 货物编号, 数量, 货物名称, 单价, 供应商) 排列的元组
+            atomic: 为True时只要有一行无效，整批都不写入
+        
+        Returns:
+            每行的处理结果 (入库编号, 是否成功, 说明)，顺序与输入一致
+        """
+        rows = []
+        results = []
+        try:
+            rows = normalize_batch_lines(lines, INBOUND_FIELDS)
+            inventory = fetch_existing_keys(self.cursor, "kucun", "bianhao", {row[1] for row in rows})
+            used_codes = fetch_existing_keys(self.cursor, "ruku", "rukubianhao", {row[0] for row in rows})
+            
+            inbound_date = datetime.datetime.now().strftime("%Y-%m-%d")
+            accepted = []
+            deltas: Dict[str, int] = {}
+            for code, inventory_code, goods_code, quantity, name, price, supplier in rows:
+                if code in used_codes:
+                    results.append((code, False, "入库编号重复"))
+                elif inventory_code not in inventory:
+                    results.append((code, False, f"库存编号 {inventory_code} 不存在"))
+                elif quantity <= 0:
+                    results.append((code, False, "入库数量必须大于0"))
+                else:
+                    used_codes.add(code)
+                    accepted.append((code, inventory_code, goods_code, quantity,
+                                     name, inbound_date, price, supplier))
+                    deltas[inventory_code] = deltas.get(inventory_code, 0) + quantity
+                    results.append((code, True, "入库成功"))
+            
+            if atomic and len(accepted) < len(rows):
+                print(f"❌ 批量入库已取消：{len(rows) - len(accepted)} 行无效")
+                return [(code, False, message if not ok else "整批取消")
+                        for code, ok, message in results]
+            
+            if accepted:
+                self.cursor.executemany(
+                    "INSERT INTO ruku VALUES (?, ?, ?, ?, ?, ?, ?, ?)", accepted
+                )
+                self.cursor.executemany(
+                    "UPDATE kucun SET shuliang = shuliang + ? WHERE bianhao = ?",
+                    [(delta, inventory_code) for inventory_code, delta in deltas.items()]
+                )
+                self.conn.commit()
+                if self.stock_cache is not None:
+                    self.stock_cache.apply_deltas(deltas)
+                self.record_journal([{"op": "inbound", "ref": row[0], "code": row[1], "delta": row[3]}
+                                     for row in accepted])
+                self.schedule_excel_report(f"批量入库: {len(accepted)} 行")
+            print(f"✅ 批量入库完成：成功 {len(accepted)} 行，失败 {len(rows) - len(accepted)} 行")
+            return results
+        except Exception as e:
+            self.conn.rollback()
+            print(f"❌ 批量入库失败: {e}")
+            return [(row[0], False, str(e)) for row in rows]
+    
+    @instrumented
+    @serialized_write
+    def process_outbound_batch(self, lines: Iterable, atomic: bool = False) -> List[Tuple[str, bool, str]]:
+        """
+        批量处理出库操作：先按输入顺序对全部行做库存校验，再在一个事务中写入有效行
+        
+        Args:
+            lines: 出库行，每行为字典（键同process_outbound的参数）或按
+                   (出库编号, 库存编号, 货物编号, 数量, 货物名称, 单价) 排列的元组
+            atomic: 为True时只要有一行无效（含库存不足），整批都不写入
+        
+        Returns:
+            每行的处理结果 (出库编号, 是否成功, 说明)，顺序与输入一致
+        """
+        rows = []
+        results = []
+        try:
+            rows = normalize_batch_lines(lines, OUTBOUND_FIELDS)
+            # 先取得写锁再读库存，校验结果在提交前不会被其他连接改变
+            if not self.conn.in_transaction:
+                begin_immediate(self.conn)
+            stock = fetch_stock_levels(self.cursor, {row[1] for row in rows})
+            used_codes = fetch_existing_keys(self.cursor, "chuku", "chukubianhao", {row[0] for row in rows})
+            
             outbound_date = datetime.datetime.now().strftime("%Y-%m-%d")
-            self.cursor.execute(
-                "INSERT INTO chuku VALUES (?, ?, ?, ?, ?, ?, ?)", 
-                (outbound_code, inventory_code, goods_code, quantity, 
-                 name, outbound_date, price)
-            )
+            accepted = []
+            deltas: Dict[str, int] = {}
+            for code, inventory_code, goods_code, quantity, name, price in rows:
+                available = stock.get(inventory_code)
+                if code in used_codes:
+                    results.append((code, False, "出库编号重复"))
+                elif available is None:
+                    results.append((code, False, f"库存编号 {inventory_code} 不存在"))
+                elif quantity <= 0:
+                    results.append((code, False, "出库数量必须大于0"))
+                elif available < quantity:
+                    results.append((code, False, f"库存不足，当前库存: {available}, 需要: {quantity}"))
+                else:
+                    # 同一库存编号的后续行基于扣减后的余量校验
+                    stock[inventory_code] = available - quantity
+                    used_codes.add(code)
+                    accepted.append((code, inventory_code, goods_code, quantity,
+                                     name, outbound_date, price))
+                    deltas[inventory_code] = deltas.get(inventory_code, 0) + quantity
+                    results.append((code, True, "出库成功"))
             
-            # 更新库存数量
-            self.cursor.execute(
-                "UPDATE kucun SET shuliang = shuliang - ? WHERE bianhao = ?", 
-                (quantity, inventory_code)
-            )
+            if atomic and len(accepted) < len(rows):
+                self.conn.rollback()
+                print(f"❌ 批量出库已取消：{len(rows) - len(accepted)} 行无效")
+                return [(code, False, message if not ok else "整批取消")
+                        for code, ok, message in results]
+            
+            if accepted:
+                self.cursor.executemany(
+                    "INSERT INTO chuku VALUES (?, ?, ?, ?, ?, ?, ?)", accepted
+                )
+                self.cursor.executemany(
+                    "UPDATE kucun SET shuliang = shuliang - ? WHERE bianhao = ?",
+                    [(delta, inventory_code) for inventory_code, delta in deltas.items()]
+                )
+                self.conn.commit()
+                if self.stock_cache is not None:
+                    self.stock_cache.apply_deltas({code: -delta for code, delta in deltas.items()})
+                self.record_journal([{"op": "outbound", "ref": row[0], "code": row[1], "delta": -row[3]}
+                                     for row in accepted])
+                self.schedule_excel_report(f"批量出库: {len(accepted)} 行")
+            else:
+                # 释放校验前取得的写锁
+                self.conn.rollback()
+            print(f"✅ 批量出库完成：成功 {len(accepted)} 行，失败 {len(rows) - len(accepted)} 行")
+            return results
+        except Exception as e:
+            self.conn.rollback()
+            print(f"❌ 批量出库失败: {e}")
+            return [(row[0], False, str(e)) for row in rows]
+    
+    @instrumented
+    @serialized_write
+    def run_operations(self, operations: Iterable[Tuple[str, Sequence]],
+                       atomic: bool = False) -> List[Tuple[str, bool, str]]:
+        """
+        在一个事务中按顺序执行一组入库/出库操作，全部完成后只登记一次报表更新
+        
+        每个操作使用一个保存点，失败的操作只撤销自身，其余操作一起提交。
+        
+        Args:
+            operations: (操作类型, 参数) 序列，操作类型为 "inbound" 或 "outbound"，
+                        参数为字典或按process_inbound/process_outbound参数顺序排列的元组
+            atomic: 为True时只要有一个操作失败，全部回滚
+        
+        Returns:
+            每个操作的处理结果 (入库/出库编号, 是否成功, 说明)，顺序与输入一致
+        """
+        results = []
+        deltas: Dict[str, int] = {}
+        events: List[Dict] = []
+        engine = OutboundEngine(self.conn)
+        try:
+            if not self.conn.in_transaction:
+                begin_immediate(self.conn)
+            for kind, params in operations:
+                fields = INBOUND_FIELDS if kind == "inbound" else OUTBOUND_FIELDS
+                code = params.get(fields[0], "") if isinstance(params, Mapping) else (params[0] if params else "")
+                if kind not in ("inbound", "outbound"):
+                    results.append((code, False, f"未知操作类型: {kind}"))
+                    continue
+                self.cursor.execute("SAVEPOINT batch_line")
+                try:
+                    row = normalize_batch_lines([params], fields)[0]
+                    if kind == "inbound":
+                        if row[3] <= 0:
+                            ok, message = False, "入库数量必须大于0"
+                        else:
+                            self.apply_inbound(*row)
+                            ok, message = True, "入库成功"
+                        delta = row[3]
+                    else:
+                        ok, message = engine.outbound(*row)
+                        delta = -row[3]
+                except Exception as e:
+                    ok, message = False, str(e)
+                if ok:
+                    self.cursor.execute("RELEASE batch_line")
+                    deltas[row[1]] = deltas.get(row[1], 0) + delta
+                    events.append({"op": kind, "ref": code, "code": row[1], "delta": delta})
+                else:
+                    self.cursor.execute("ROLLBACK TO batch_line")
+                    self.cursor.execute("RELEASE batch_line")
+                results.append((code, ok, message))
+            
+            succeeded = sum(1 for _, ok, _ in results if ok)
+            if atomic and succeeded < len(results):
+                self.conn.rollback()
+                print(f"❌ 批量操作已取消：{len(results) - succeeded} 个操作失败")
+                return [(code, False, message if not ok else "整批取消")
+                        for code, ok, message in results]
             
             self.conn.commit()
-            print(f"✅ 出库操作 {outbound_code} 处理成功")
-            self.update_excel_report(f"出库操作: {outbound_code}")
+            if self.stock_cache is not None:
+                self.stock_cache.apply_deltas(deltas)
+            self.record_journal(events)
+            if succeeded:
+                self.schedule_excel_report(f"批量操作: {succeeded} 项")
+            print(f"✅ 批量操作完成：成功 {succeeded} 项，失败 {len(results) - succeeded} 项")
+            return results
+        except Exception as e:
+            self.conn.rollback()
+            print(f"❌ 批量操作失败: {e}")
+            return [(code, False, str(e)) for code, _, _ in results]
+    
+    @instrumented
+    @serialized_write
+    def archive_ledgers(self, before: Optional[str] = None) -> bool:
+        """
+        把已结束月份的入库/出库流水移入按年划分的归档数据库（archive_dir下）
+        
+        Args:
+            before: YYYY-MM，早于该月的流水被归档，默认为当前月
+        """
+        from ledger_archive import archive_closed_periods
+        
+        try:
+            results = archive_closed_periods(self.conn, self.archive_dir, before)
+        except Exception as e:
+            print(f"❌ 归档流水失败: {e}")
+            return False
+        
+        moved = sum(sum(counts.values()) for counts in results.values())
+        for period, counts in results.items():
+            print(f"🗑️ {period}: 入库 {counts['ruku']} 行，出库 {counts['chuku']} 行已移入归档")
+        print(f"✅ 流水归档完成：{len(results)} 个月份，共 {moved} 行（归档目录: {self.archive_dir}）")
+        if moved and self.auto_report:
+            # 已导出的流水行被移走，增量追加无法反映，重新全量生成报表
+            self.update_excel_report("归档流水", incremental=False)
+        return True
+    
+    def open_history_connection(self, years: Optional[List[str]] = None) -> sqlite3.Connection:
+        """
+        打开附加了流水归档的只读连接，通过临时视图 ruku_all / chuku_all 查询完整历史
+        
+        Args:
+            years: 只附加这些年份的归档（默认全部，受SQLite附加数量上限限制）
+        """
+        from ledger_archive import attach_archives
+        
+        conn = open_connection(self.db_path, "read-replica")
+        try:
+            attach_archives(conn, self.archive_dir, years)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+    
+    @instrumented
+    def stock_as_of(self, day, codes: Optional[List[str]] = None,
+                    warehouse: Optional[str] = None) -> List[Tuple[str, str, int, float, float]]:
+        """某日结束时的库存 (库存编号, 仓库名称, 数量, 单价, 价值)，由逐日累计表kucun_riji计算"""
+        from stock_history import stock_as_of
+        
+        with self.read_cursor() as cursor:
+            return stock_as_of(cursor, day, codes, warehouse)
+    
+    @instrumented
+    def warehouse_stock_as_of(self, day) -> List[Tuple[str, int, int, float]]:
+        """某日结束时的仓库汇总 (仓库名称, 库存种类, 总数量, 总价值)"""
+        from stock_history import warehouse_stock_as_of
+        
+        with self.read_cursor() as cursor:
+            return warehouse_stock_as_of(cursor, day)
+    
+    def load_analytics(self, with_archives: bool = True):
+        """
+        一次性读取库存和流水，返回可按任意期间计算估值、周转和ABC分类的InventoryAnalytics（需要pandas）
+        
+        Args:
+            with_archives: 是否包含已归档月份的流水
+        """
+        from inventory_analytics import InventoryAnalytics
+        from ledger_archive import archive_files
+        
+        if with_archives and archive_files(self.archive_dir):
+            conn = self.open_history_connection()
+            try:
+                return InventoryAnalytics.from_cursor(conn.cursor(), with_archives=True)
+            finally:
+                conn.close()
+        with self.read_cursor() as cursor:
+            return InventoryAnalytics.from_cursor(cursor)
+    
+    def repair_stock_history_triggers(self):
+        """批量导入中途退出会留下已删除的逐日触发器，连接时重算kucun_riji并重建"""
+        from stock_history import missing_daily_triggers, restore_daily_triggers
+
+        missing = missing_daily_triggers(self.conn)
+        if missing:
+            print(f"🔧 逐日触发器缺失（{', '.join(missing)}），重算kucun_riji并重建触发器")
+            restore_daily_triggers(self.conn, self.archive_dir)
+
+    @instrumented
+    @serialized_write
+    def rebuild_stock_history(self) -> bool:
+        """按当期流水和全部归档重新计算逐日累计表kucun_riji（核对或修复用）"""
+        from ledger_archive import attach_archives, detach_archives
+        from stock_history import rebuild_daily
+        
+        try:
+            attach_archives(self.conn, self.archive_dir)
+            try:
+                begin_immediate(self.conn)
+                try:
+                    rows = rebuild_daily(self.cursor, include_archived=True)
+                    self.conn.commit()
+                except Exception:
+                    # 分离归档前会提交，失败时必须先回滚，不能留下清空了一半的累计表
+                    self.conn.rollback()
+                    raise
+            finally:
+                detach_archives(self.conn)
+            print(f"✅ 库存逐日累计表已重建: {rows} 行")
             return True
         except Exception as e:
-            print(f"❌ 出库操作失败: {e}")
+            print(f"❌ 重建库存逐日累计表失败: {e}")
             return False
     
     def show_menu(self):
@@ -589,6 +1202,7 @@ class WarehouseManagerTool:
             else:
                 print("❌ 无效选择，请重新输入")
     
+    @instrumented
     def show_current_status(self):
         """显示当前状态"""
         print("\n" + "="*60)
@@ -596,40 +1210,46 @@ class WarehouseManagerTool:
         print("="*60)
         
         try:
-            # 显示库存状态
-            self.cursor.execute('''
-                SELECT k.bianhao, k.cangkumingcheng, k.shuliang, k.danjia,
-                       (k.shuliang * k.danjia) as 总价值
-                FROM kucun k
-                ORDER BY k.cangkumingcheng, k.bianhao
-            ''')
+            cache = self.sync_stock_cache()
+            if cache is not None:
+                # 库存状态和仓库汇总直接由内存缓存给出
+                inventory = cache.rows()
+                summary = cache.summary()
+            else:
+                with self.read_cursor() as cursor:
+                    # 库存状态
+                    cursor.execute('''
+                        SELECT k.bianhao, k.cangkumingcheng, k.shuliang, k.danjia,
+                               (k.shuliang * k.danjia) as 总价值
+                        FROM kucun k
+                        ORDER BY k.cangkumingcheng, k.bianhao
+                    ''')
+                    inventory = cursor.fetchall()
+                    
+                    # 仓库汇总
+                    cursor.execute('''
+                        SELECT cangkumingcheng, kucunzhonglei, zongshuliang, zongjiazhi
+                        FROM cangkuhuizong
+                        ORDER BY cangkumingcheng
+                    ''')
+                    summary = cursor.fetchall()
             
-            results = self.cursor.fetchall()
-            if results:
+            # 显示库存状态
+            if inventory:
                 print("库存状态:")
                 print(f"{'库存编号':<12} {'仓库名称':<12} {'数量':<8} {'单价':<10} {'总价值':<12}")
                 print("-" * 60)
-                for row in results:
+                for row in inventory:
                     print(f"{row[0]:<12} {row[1]:<12} {row[2]:<8} {row[3]:<10} {row[4]:<12}")
             else:
                 print("暂无库存数据")
             
             # 显示仓库汇总
-            self.cursor.execute('''
-                SELECT c.cangkumingcheng, COUNT(k.bianhao) as 库存种类,
-                       SUM(k.shuliang) as 总数量, SUM(k.shuliang * k.danjia) as 总价值
-                FROM cangku c
-                LEFT JOIN kucun k ON c.cangkumingcheng = k.cangkumingcheng
-                GROUP BY c.cangkumingcheng
-                ORDER BY c.cangkumingcheng
-            ''')
-            
-            results = self.cursor.fetchall()
-            if results:
+            if summary:
                 print("\n仓库汇总:")
                 print(f"{'仓库名称':<12} {'库存种类':<8} {'总数量':<8} {'总价值':<12}")
                 print("-" * 50)
-                for row in results:
+                for row in summary:
                     print(f"{row[0]:<12} {row[1]:<8} {row[2]:<8} {row[3]:<12}")
             else:
                 print("\n暂无仓库数据")
@@ -638,7 +1258,11 @@ class WarehouseManagerTool:
             print(f"❌ 获取状态失败: {e}")
 
 def main():
-    """主函数"""
+    """主函数：带命令行参数时执行非交互命令，否则进入交互式菜单"""
+    if len(sys.argv) > 1:
+        from warehouse_cli import main as cli_main
+        return cli_main(sys.argv[1:])
+    
     print("🚀 仓库管理系统 - 便捷操作工具")
     print("="*60)
     
@@ -652,4 +1276,4 @@ def main():
     tool.close_database()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 数据库结构迁移
+功能：按版本号（PRAGMA user_version）对SQLite数据库执行结构升级，
+      新建数据库和已有的warehouse.db都会被原地升级到最新版本
+作者：AI Assistant
+日期：2024
+"""
+
+import sqlite3
+from typing import Dict, List, Tuple
+
+# 流水日期列规范为 YYYY-MM-DD 的SQL表达式（{column}为列名），用于库存逐日累计表kucun_riji
+LEDGER_DAY_SQL = "COALESCE(replace(substr({column}, 1, 10), '/', '-'), '0000-00-00')"
+
+# 按库存编号、日期汇总入库/出库流水：(编号, 日期, 当天变化, 截至当天的累计变化)，{ruku}/{chuku}为表名
+LEDGER_DAILY_SQL = f'''
+    SELECT bianhao, riqi, bianhua, SUM(bianhua) OVER (PARTITION BY bianhao ORDER BY riqi)
+    FROM (
+        SELECT bianhao, riqi, SUM(shuliang) AS bianhua
+        FROM (
+            SELECT COALESCE(bianhao, '') AS bianhao, {LEDGER_DAY_SQL.format(column="rukuriqi")} AS riqi,
+                   COALESCE(shuliang, 0) AS shuliang
+            FROM {{ruku}}
+            UNION ALL
+            SELECT COALESCE(bianhao, ''), {LEDGER_DAY_SQL.format(column="chukuriqi")}, -COALESCE(shuliang, 0)
+            FROM {{chuku}}
+        )
+        GROUP BY bianhao, riqi
+    )
+'''
+
+
+# 流水表 -> 插入时增量维护kucun_riji的触发器：当天变化加减数量，当天及之后各天的累计变化同步调整；
+# 批量导入大量流水时会临时删除，导入结束后重算kucun_riji再按此重建（见warehouse_importer）
+LEDGER_DAILY_TRIGGERS: Dict[str, str] = {
+    table: f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_riji_AI AFTER INSERT ON {table}
+        BEGIN
+            INSERT OR IGNORE INTO kucun_riji (bianhao, riqi, bianhua, leiji)
+            VALUES (COALESCE(NEW.bianhao, ''), {LEDGER_DAY_SQL.format(column="NEW." + column)}, 0, COALESCE((
+                SELECT leiji FROM kucun_riji
+                WHERE bianhao = COALESCE(NEW.bianhao, '')
+                  AND riqi < {LEDGER_DAY_SQL.format(column="NEW." + column)}
+                ORDER BY riqi DESC LIMIT 1
+            ), 0));
+            UPDATE kucun_riji SET bianhua = bianhua {sign} COALESCE(NEW.shuliang, 0)
+            WHERE bianhao = COALESCE(NEW.bianhao, '')
+              AND riqi = {LEDGER_DAY_SQL.format(column="NEW." + column)};
+            UPDATE kucun_riji SET leiji = leiji {sign} COALESCE(NEW.shuliang, 0)
+            WHERE bianhao = COALESCE(NEW.bianhao, '')
+              AND riqi >= {LEDGER_DAY_SQL.format(column="NEW." + column)};
+        END
+    '''
+    for table, column, sign in (("ruku", "rukuriqi", "+"), ("chuku", "chukuriqi", "-"))
+}
+
+
+def _item_value(row: str) -> str:
+    """一种库存舍入到分的价值（row为表名、别名或NEW/OLD），仓库汇总表的总价值是这些值之和"""
+    return f"ROUND(COALESCE({row}.shuliang * {row}.danjia, 0), 2)"
+
+
+# 迁移列表：(版本号, 说明, SQL语句列表)，按版本号递增执行，已执行的版本不会重复执行
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "建立PowerDesigner模型中的外键索引及出入库日期索引", [
+        # guanli_FK：操作员与仓库关联
+        "CREATE INDEX IF NOT EXISTS guanli_FK ON cangku (xingming)",
+        # cunfang2_FK：库存与仓库关联（SQLite结构中存放关系在kucun一侧，模型中的cunfang_FK无对应字段）
+        "CREATE INDEX IF NOT EXISTS cunfang2_FK ON kucun (cangkumingcheng)",
+        # jilu_FK / jilu2_FK：出库、入库与库存关联
+        "CREATE INDEX IF NOT EXISTS jilu_FK ON chuku (bianhao)",
+        "CREATE INDEX IF NOT EXISTS jilu2_FK ON ruku (bianhao)",
+        # gongying2_FK：仓库与供应关系关联；gongying_FK是复合主键的前缀，由主键索引覆盖
+        "CREATE INDEX IF NOT EXISTS gongying2_FK ON gongying (cangkumingcheng)",
+        # 按日期排序的流水查询
+        "CREATE INDEX IF NOT EXISTS rukuriqi_IDX ON ruku (rukuriqi)",
+        "CREATE INDEX IF NOT EXISTS chukuriqi_IDX ON chuku (chukuriqi)",
+        "ANALYZE",
+    ]),
+    # 汇总表依赖连接开启recursive_triggers（见connection_profiles），INSERT OR REPLACE才会扣减被替换的旧行
+    (2, "新增由触发器维护的仓库汇总表cangkuhuizong", [
+        '''
+            CREATE TABLE IF NOT EXISTS cangkuhuizong (
+                cangkumingcheng VARCHAR(20) PRIMARY KEY,
+                kucunzhonglei INTEGER NOT NULL DEFAULT 0,
+                zongshuliang INTEGER NOT NULL DEFAULT 0,
+                zongjiazhi DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+                FOREIGN KEY (cangkumingcheng) REFERENCES cangku (cangkumingcheng)
+            )
+        ''',
+        '''
+            INSERT OR REPLACE INTO cangkuhuizong
+            SELECT c.cangkumingcheng, COUNT(k.bianhao),
+                   COALESCE(SUM(k.shuliang), 0), COALESCE(SUM(k.shuliang * k.danjia), 0)
+            FROM cangku c
+            LEFT JOIN kucun k ON c.cangkumingcheng = k.cangkumingcheng
+            GROUP BY c.cangkumingcheng
+        ''',
+        # 新建仓库时按已有库存计算一行汇总
+        '''
+            CREATE TRIGGER IF NOT EXISTS cangku_huizong_AI AFTER INSERT ON cangku
+            BEGIN
+                INSERT OR REPLACE INTO cangkuhuizong
+                SELECT NEW.cangkumingcheng, COUNT(*),
+                       COALESCE(SUM(shuliang), 0), COALESCE(SUM(shuliang * danjia), 0)
+                FROM kucun WHERE cangkumingcheng = NEW.cangkumingcheng;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS cangku_huizong_AD AFTER DELETE ON cangku
+            BEGIN
+                DELETE FROM cangkuhuizong WHERE cangkumingcheng = OLD.cangkumingcheng;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS cangku_huizong_AU AFTER UPDATE OF cangkumingcheng ON cangku
+            BEGIN
+                DELETE FROM cangkuhuizong WHERE cangkumingcheng = OLD.cangkumingcheng;
+                INSERT OR REPLACE INTO cangkuhuizong
+                SELECT NEW.cangkumingcheng, COUNT(*),
+                       COALESCE(SUM(shuliang), 0), COALESCE(SUM(shuliang * danjia), 0)
+                FROM kucun WHERE cangkumingcheng = NEW.cangkumingcheng;
+            END
+        ''',
+        # 库存增删改时只调整所在仓库的一行汇总
+        '''
+            CREATE TRIGGER IF NOT EXISTS kucun_huizong_AI AFTER INSERT ON kucun
+            BEGIN
+                UPDATE cangkuhuizong
+                SET kucunzhonglei = kucunzhonglei + 1,
+                    zongshuliang = zongshuliang + COALESCE(NEW.shuliang, 0),
+                    zongjiazhi = zongjiazhi + COALESCE(NEW.shuliang * NEW.danjia, 0)
+                WHERE cangkumingcheng = NEW.cangkumingcheng;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS kucun_huizong_AD AFTER DELETE ON kucun
+            BEGIN
+                UPDATE cangkuhuizong
+                SET kucunzhonglei = kucunzhonglei - 1,
+                    zongshuliang = zongshuliang - COALESCE(OLD.shuliang, 0),
+                    zongjiazhi = zongjiazhi - COALESCE(OLD.shuliang * OLD.danjia, 0)
+                WHERE cangkumingcheng = OLD.cangkumingcheng;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS kucun_huizong_AU
+            AFTER UPDATE OF cangkumingcheng, shuliang, danjia ON kucun
+            BEGIN
+                UPDATE cangkuhuizong
+                SET kucunzhonglei = kucunzhonglei - 1,
+                    zongshuliang = zongshuliang - COALESCE(OLD.shuliang, 0),
+                    zongjiazhi = zongjiazhi - COALESCE(OLD.shuliang * OLD.danjia, 0)
+                WHERE cangkumingcheng = OLD.cangkumingcheng;
+                UPDATE cangkuhuizong
+                SET kucunzhonglei = kucunzhonglei + 1,
+                    zongshuliang = zongshuliang + COALESCE(NEW.shuliang, 0),
+                    zongjiazhi = zongjiazhi + COALESCE(NEW.shuliang * NEW.danjia, 0)
+                WHERE cangkumingcheng = NEW.cangkumingcheng;
+            END
+        ''',
+    ]),
+    (3, "新增流水归档登记表ledger_periods", [
+        '''
+            CREATE TABLE IF NOT EXISTS ledger_periods (
+                ledger VARCHAR(20) NOT NULL,
+                period VARCHAR(7) NOT NULL,
+                archive_file VARCHAR(100) NOT NULL,
+                rows INTEGER NOT NULL DEFAULT 0,
+                archived_at VARCHAR(20),
+                PRIMARY KEY (ledger, period)
+            )
+        ''',
+    ]),
+    # 流水日期取前10位并把斜杠写法统一为横线，空日期记为最早的一天
+    (4, "新增由触发器维护的库存逐日累计表kucun_riji（按日期查询历史库存）", [
+        '''
+            CREATE TABLE IF NOT EXISTS kucun_riji (
+                bianhao VARCHAR(20) NOT NULL,
+                riqi VARCHAR(10) NOT NULL,
+                bianhua INTEGER NOT NULL DEFAULT 0,
+                leiji INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bianhao, riqi)
+            ) WITHOUT ROWID
+        ''',
+        # 回填：按库存编号、日期汇总已有流水，leiji为截至当天（含）的累计变化；
+        # 只能看到当期表，升级前已归档的月份需执行 as-of --rebuild（rebuild_stock_history）补入
+        "INSERT OR REPLACE INTO kucun_riji (bianhao, riqi, bianhua, leiji) "
+        + LEDGER_DAILY_SQL.format(ruku="ruku", chuku="chuku"),
+        *LEDGER_DAILY_TRIGGERS.values(),
+    ]),
+    # 每种库存的价值先四舍五入到分，再按增量调整并舍入到分：总价值恒等于各行舍入值之和，浮点误差不会累积
+    (5, "仓库汇总表cangkuhuizong的总价值按分舍入，避免增量维护的浮点误差累积", [
+        *[f"DROP TRIGGER IF EXISTS {name}" for name in (
+            "cangku_huizong_AI", "cangku_huizong_AU", "kucun_huizong_AI", "kucun_huizong_AD", "kucun_huizong_AU"
+        )],
+        f'''
+            UPDATE cangkuhuizong SET zongjiazhi = (
+                SELECT ROUND(COALESCE(SUM({_item_value("k")}), 0), 2)
+                FROM kucun k WHERE k.cangkumingcheng = cangkuhuizong.cangkumingcheng
+            )
+        ''',
+        f'''
+            CREATE TRIGGER cangku_huizong_AI AFTER INSERT ON cangku
+            BEGIN
+                INSERT OR REPLACE INTO cangkuhuizong
+                SELECT NEW.cangkumingcheng, COUNT(*),
+                       COALESCE(SUM(shuliang), 0), ROUND(COALESCE(SUM({_item_value("kucun")}), 0), 2)
+                FROM kucun WHERE cangkumingcheng = NEW.cangkumingcheng;
+            END
+        ''',
+        f'''
+            CREATE TRIGGER cangku_huizong_AU AFTER UPDATE OF cangkumingcheng ON cangku
+            BEGIN
+                DELETE FROM cangkuhuizong WHERE cangkumingcheng = OLD.cangkumingcheng;
+                INSERT OR REPLACE INTO cangkuhuizong
+                SELECT NEW.cangkumingcheng, COUNT(*),
+                       COALESCE(SUM(shuliang), 0), ROUND(COALESCE(SUM({_item_value("kucun")}), 0), 2)
+                FROM kucun WHERE cangkumingcheng = NEW.cangkumingcheng;
+            END
+        ''',
+        f'''
+            CREATE TRIGGER kucun_huizong_AI AFTER INSERT ON kucun
+            BEGIN
+                UPDATE cangkuhuizong
+                SET kucunzhonglei = kucunzhonglei + 1,
+                    zongshuliang = zongshuliang + COALESCE(NEW.shuliang, 0),
+                    zongjiazhi = ROUND(zongjiazhi + {_item_value("NEW")}, 2)
+                WHERE cangkumingcheng = NEW.cangkumingcheng;
+            END
+        ''',
+        f'''
+            CREATE TRIGGER kucun_huizong_AD AFTER DELETE ON kucun
+            BEGIN
+                UPDATE cangkuhuizong
+                SET kucunzhonglei = kucunzhonglei - 1,
+                    zongshuliang = zongshuliang - COALESCE(OLD.shuliang, 0),
+                    zongjiazhi = ROUND(zongjiazhi - {_item_value("OLD")}, 2)
+                WHERE cangkumingcheng = OLD.cangkumingcheng;
+            END
+        ''',
+        f'''
+            CREATE TRIGGER kucun_huizong_AU
+            AFTER UPDATE OF cangkumingcheng, shuliang, danjia ON kucun
+            BEGIN
+                UPDATE cangkuhuizong
+                SET kucunzhonglei = kucunzhonglei - 1,
+                    zongshuliang = zongshuliang - COALESCE(OLD.shuliang, 0),
+                    zongjiazhi = ROUND(zongjiazhi - {_item_value("OLD")}, 2)
+                WHERE cangkumingcheng = OLD.cangkumingcheng;
+                UPDATE cangkuhuizong
+                SET kucunzhonglei = kucunzhonglei + 1,
+                    zongshuliang = zongshuliang + COALESCE(NEW.shuliang, 0),
+                    zongjiazhi = ROUND(zongjiazhi + {_item_value("NEW")}, 2)
+                WHERE cangkumingcheng = NEW.cangkumingcheng;
+            END
+        ''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# v2类型化结构（warehouse_schema_v2）数据库的user_version，高于全部v1迁移版本，v1迁移不会作用于v2数据库
+SCHEMA_V2_VERSION = 1000
+
+# 流水表 -> 日期列（VARCHAR，按 YYYY-MM-DD 字符串比较），用于分区导出和按月归档
+LEDGER_DATE_COLUMNS = {"ruku": "rukuriqi", "chuku": "chukuriqi"}
+
+# 仓库汇总查询：直接读取触发器维护的cangkuhuizong，代价与仓库数量成正比
+WAREHOUSE_SUMMARY_SQL = '''
+    SELECT c.cangkumingcheng, c.cangkufuzeren, c.xingming,
+           h.kucunzhonglei as 库存种类,
+           h.zongshuliang as 总数量,
+           h.zongjiazhi as 总价值
+    FROM cangku c
+    JOIN cangkuhuizong h ON c.cangkumingcheng = h.cangkumingcheng
+    ORDER BY c.cangkumingcheng
+'''
+
+# 迁移依赖的基础表，缺少时说明数据库尚未建表
+BASE_TABLES = ("caozuoyuan", "gongyingshang", "cangku", "kucun", "ruku", "chuku", "gongying")
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """读取数据库当前的结构版本"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def has_base_tables(conn: sqlite3.Connection) -> bool:
+    """数据库中是否已建好全部基础表"""
+    placeholders = ", ".join("?" * len(BASE_TABLES))
+    count = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+        BASE_TABLES
+    ).fetchone()[0]
+    return count == len(BASE_TABLES)
+
+
+def migrate_database(conn: sqlite3.Connection) -> int:
+    """
+    把数据库升级到最新结构版本
+
+    每个版本在一个事务中执行并更新user_version，失败时回滚该版本。
+
+    Returns:
+        本次执行的迁移数量；数据库尚未建表时不做任何操作，返回0
+    """
+    if not has_base_tables(conn):
+        return 0
+
+    current = get_schema_version(conn)
+    if current >= SCHEMA_V2_VERSION:
+        raise ValueError("这是v2类型化结构的数据库（见warehouse_schema_v2），当前程序只支持v1结构")
+    applied = 0
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.commit()
+            conn.execute("BEGIN")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"🔧 数据库结构已升级到版本 {version}: {description}")
+        applied += 1
+    return applied
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - v2类型化数据库结构
+功能：各表以INTEGER rowid为主键，原来的编号/名称改为唯一索引，表之间用整数id关联；
+      金额以整数“分”保存，日期以整数YYYYMMDD保存，汇总金额不再累积浮点误差；
+      提供从现有v1数据库（warehouse.db）一次性迁移到新文件的工具，以及还原为v1形式的*_v1视图
+作者：AI Assistant
+日期：2024
+"""
+
+import os
+import sqlite3
+from typing import Dict, List, Tuple
+from urllib.request import pathname2url
+
+from connection_profiles import open_connection
+from warehouse_schema import BASE_TABLES, SCHEMA_V2_VERSION, has_base_tables
+
+# v2建表语句：先建表和唯一索引，数据导入后再建普通索引和触发器
+SCHEMA_V2_TABLES: List[str] = [
+    '''
+        CREATE TABLE caozuoyuan (
+            id INTEGER PRIMARY KEY,
+            xingming TEXT NOT NULL,
+            lianxifangshi TEXT
+        )
+    ''',
+    "CREATE UNIQUE INDEX caozuoyuan_xingming_UK ON caozuoyuan (xingming)",
+    '''
+        CREATE TABLE gongyingshang (
+            id INTEGER PRIMARY KEY,
+            gongyingshangbianhao TEXT NOT NULL,
+            gongyingshangmingcheng TEXT,
+            lianxirren TEXT,
+            lianxifangshi TEXT
+        )
+    ''',
+    "CREATE UNIQUE INDEX gongyingshang_bianhao_UK ON gongyingshang (gongyingshangbianhao)",
+    '''
+        CREATE TABLE cangku (
+            id INTEGER PRIMARY KEY,
+            cangkumingcheng TEXT NOT NULL,
+            caozuoyuan_id INTEGER REFERENCES caozuoyuan (id),
+            cangkufuzeren TEXT,
+            chuangjianriqi INTEGER
+        )
+    ''',
+    "CREATE UNIQUE INDEX cangku_mingcheng_UK ON cangku (cangkumingcheng)",
+    '''
+        CREATE TABLE kucun (
+            id INTEGER PRIMARY KEY,
+            bianhao TEXT NOT NULL,
+            cangku_id INTEGER REFERENCES cangku (id),
+            shuliang INTEGER NOT NULL DEFAULT 0,
+            danjia_fen INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+    "CREATE UNIQUE INDEX kucun_bianhao_UK ON kucun (bianhao)",
+    '''
+        CREATE TABLE ruku (
+            id INTEGER PRIMARY KEY,
+            rukubianhao TEXT NOT NULL,
+            kucun_id INTEGER REFERENCES kucun (id),
+            huowubianhao TEXT,
+            shuliang INTEGER,
+            mingcheng TEXT,
+            rukuriqi INTEGER,
+            danjia_fen INTEGER,
+            gongyingshangmingcheng TEXT
+        )
+    ''',
+    "CREATE UNIQUE INDEX ruku_bianhao_UK ON ruku (rukubianhao)",
+    '''
+        CREATE TABLE chuku (
+            id INTEGER PRIMARY KEY,
+            chukubianhao TEXT NOT NULL,
+            kucun_id INTEGER REFERENCES kucun (id),
+            huowubianhao TEXT,
+            shuliang INTEGER,
+            mingcheng TEXT,
+            chukuriqi INTEGER,
+            danjia_fen INTEGER
+        )
+    ''',
+    "CREATE UNIQUE INDEX chuku_bianhao_UK ON chuku (chukubianhao)",
+    '''
+        CREATE TABLE gongying (
+            gongyingshang_id INTEGER NOT NULL REFERENCES gongyingshang (id),
+            cangku_id INTEGER NOT NULL REFERENCES cangku (id),
+            PRIMARY KEY (gongyingshang_id, cangku_id)
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE TABLE cangkuhuizong (
+            cangku_id INTEGER PRIMARY KEY REFERENCES cangku (id),
+            kucunzhonglei INTEGER NOT NULL DEFAULT 0,
+            zongshuliang INTEGER NOT NULL DEFAULT 0,
+            zongjiazhi_fen INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+]
+
+# 外键和日期索引、汇总触发器（与v1迁移版本1、2对应，金额按分计算）
+SCHEMA_V2_INDEXES_AND_TRIGGERS: List[str] = [
+    "CREATE INDEX cangku_caozuoyuan_FK ON cangku (caozuoyuan_id)",
+    "CREATE INDEX kucun_cangku_FK ON kucun (cangku_id)",
+    "CREATE INDEX ruku_kucun_FK ON ruku (kucun_id)",
+    "CREATE INDEX chuku_kucun_FK ON chuku (kucun_id)",
+    "CREATE INDEX gongying_cangku_FK ON gongying (cangku_id)",
+    "CREATE INDEX rukuriqi_IDX ON ruku (rukuriqi)",
+    "CREATE INDEX chukuriqi_IDX ON chuku (chukuriqi)",
+    '''
+        CREATE TRIGGER cangku_huizong_AI AFTER INSERT ON cangku
+        BEGIN
+            INSERT OR REPLACE INTO cangkuhuizong
+            SELECT NEW.id, COUNT(*), COALESCE(SUM(shuliang), 0), COALESCE(SUM(shuliang * danjia_fen), 0)
+            FROM kucun WHERE cangku_id = NEW.id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER cangku_huizong_AD AFTER DELETE ON cangku
+        BEGIN
+            DELETE FROM cangkuhuizong WHERE cangku_id = OLD.id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER kucun_huizong_AI AFTER INSERT ON kucun
+        BEGIN
+            UPDATE cangkuhuizong
+            SET kucunzhonglei = kucunzhonglei + 1,
+                zongshuliang = zongshuliang + NEW.shuliang,
+                zongjiazhi_fen = zongjiazhi_fen + NEW.shuliang * NEW.danjia_fen
+            WHERE cangku_id = NEW.cangku_id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER kucun_huizong_AD AFTER DELETE ON kucun
+        BEGIN
+            UPDATE cangkuhuizong
+            SET kucunzhonglei = kucunzhonglei - 1,
+                zongshuliang = zongshuliang - OLD.shuliang,
+                zongjiazhi_fen = zongjiazhi_fen - OLD.shuliang * OLD.danjia_fen
+            WHERE cangku_id = OLD.cangku_id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER kucun_huizong_AU AFTER UPDATE OF cangku_id, shuliang, danjia_fen ON kucun
+        BEGIN
+            UPDATE cangkuhuizong
+            SET kucunzhonglei = kucunzhonglei - 1,
+                zongshuliang = zongshuliang - OLD.shuliang,
+                zongjiazhi_fen = zongjiazhi_fen - OLD.shuliang * OLD.danjia_fen
+            WHERE cangku_id = OLD.cangku_id;
+            UPDATE cangkuhuizong
+            SET kucunzhonglei = kucunzhonglei + 1,
+                zongshuliang = zongshuliang + NEW.shuliang,
+                zongjiazhi_fen = zongjiazhi_fen + NEW.shuliang * NEW.danjia_fen
+            WHERE cangku_id = NEW.cangku_id;
+        END
+    ''',
+]
+
+
+def iso_date(column: str) -> str:
+    """整数YYYYMMDD还原为 YYYY-MM-DD 文本的SQL表达式"""
+    return (f"CASE WHEN {column} IS NULL THEN NULL "
+            f"ELSE printf('%04d-%02d-%02d', {column} / 10000, {column} / 100 % 100, {column} % 100) END")
+
+
+# 还原为v1列名和单位的视图，供按v1结构编写的查询和报表读取
+SCHEMA_V2_VIEWS: List[str] = [
+    '''
+        CREATE VIEW cangku_v1 AS
+        SELECT c.cangkumingcheng, o.xingming, c.cangkufuzeren,
+               ''' + iso_date("c.chuangjianriqi") + ''' AS cangkuchuangjianriqi
+        FROM cangku c LEFT JOIN caozuoyuan o ON o.id = c.caozuoyuan_id
+    ''',
+    '''
+        CREATE VIEW kucun_v1 AS
+        SELECT k.bianhao, c.cangkumingcheng, k.shuliang, k.danjia_fen / 100.0 AS danjia
+        FROM kucun k LEFT JOIN cangku c ON c.id = k.cangku_id
+    ''',
+    '''
+        CREATE VIEW ruku_v1 AS
+        SELECT r.rukubianhao, k.bianhao, r.huowubianhao, r.shuliang, r.mingcheng,
+               ''' + iso_date("r.rukuriqi") + ''' AS rukuriqi,
+               r.danjia_fen / 100.0 AS danjia, r.gongyingshangmingcheng
+        FROM ruku r LEFT JOIN kucun k ON k.id = r.kucun_id
+    ''',
+    '''
+        CREATE VIEW chuku_v1 AS
+        SELECT h.chukubianhao, k.bianhao, h.huowubianhao, h.shuliang, h.mingcheng,
+               ''' + iso_date("h.chukuriqi") + ''' AS chukuriqi,
+               h.danjia_fen / 100.0 AS danjia
+        FROM chuku h LEFT JOIN kucun k ON k.id = h.kucun_id
+    ''',
+    '''
+        CREATE VIEW gongying_v1 AS
+        SELECT s.gongyingshangbianhao, c.cangkumingcheng
+        FROM gongying g
+        JOIN gongyingshang s ON s.id = g.gongyingshang_id
+        JOIN cangku c ON c.id = g.cangku_id
+    ''',
+    '''
+        CREATE VIEW cangkuhuizong_v1 AS
+        SELECT c.cangkumingcheng, h.kucunzhonglei, h.zongshuliang, h.zongjiazhi_fen / 100.0 AS zongjiazhi
+        FROM cangkuhuizong h JOIN cangku c ON c.id = h.cangku_id
+    ''',
+]
+
+
+def v1_date(column: str) -> str:
+    """v1的VARCHAR日期转换为整数YYYYMMDD的SQL表达式（YYYY-MM-DD或YYYY/MM/DD开头，其余为NULL）"""
+    return (f"CASE WHEN {column} GLOB '[0-9][0-9][0-9][0-9][-/][0-9][0-9][-/][0-9][0-9]*' "
+            f"THEN CAST(substr({column}, 1, 4) || substr({column}, 6, 2) || substr({column}, 9, 2) AS INTEGER) "
+            f"END")
+
+
+def v1_cents(column: str) -> str:
+    """v1的DECIMAL金额转换为整数分的SQL表达式（四舍五入）"""
+    return f"CASE WHEN {column} IS NULL THEN NULL ELSE CAST(ROUND({column} * 100) AS INTEGER) END"
+
+
+# 一次性迁移：从附加为v1的旧库按依赖顺序导入，编号/名称通过唯一索引换成整数id
+# 按自然键排序插入，唯一索引按顺序构建，页面更紧凑
+MIGRATION_V2_STEPS: List[Tuple[str, str]] = [
+    ("caozuoyuan", '''
+        INSERT INTO caozuoyuan (xingming, lianxifangshi)
+        SELECT xingming, caozuoyuanlianxifangshi FROM v1.caozuoyuan ORDER BY xingming
+    '''),
+    ("gongyingshang", '''
+        INSERT INTO gongyingshang (gongyingshangbianhao, gongyingshangmingcheng, lianxirren, lianxifangshi)
+        SELECT gongyingshangbianhao, gongyingshangmingcheng, lianxirren, lianxifangshi
+        FROM v1.gongyingshang ORDER BY gongyingshangbianhao
+    '''),
+    ("cangku", f'''
+        INSERT INTO cangku (cangkumingcheng, caozuoyuan_id, cangkufuzeren, chuangjianriqi)
+        SELECT c.cangkumingcheng, o.id, c.cangkufuzeren, {v1_date("c.cangkuchuangjianriqi")}
+        FROM v1.cangku c LEFT JOIN caozuoyuan o ON o.xingming = c.xingming
+        ORDER BY c.cangkumingcheng
+    '''),
+    ("kucun", f'''
+        INSERT INTO kucun (bianhao, cangku_id, shuliang, danjia_fen)
+        SELECT k.bianhao, c.id, COALESCE(CAST(k.shuliang AS INTEGER), 0), COALESCE({v1_cents("k.danjia")}, 0)
+        FROM v1.kucun k LEFT JOIN cangku c ON c.cangkumingcheng = k.cangkumingcheng
+        ORDER BY k.bianhao
+    '''),
+    ("ruku", f'''
+        INSERT INTO ruku (rukubianhao, kucun_id, huowubianhao, shuliang, mingcheng, rukuriqi,
+                          danjia_fen, gongyingshangmingcheng)
+        SELECT r.rukubianhao, k.id, r.huowubianhao, CAST(r.shuliang AS INTEGER), r.mingcheng,
+               {v1_date("r.rukuriqi")}, {v1_cents("r.danjia")}, r.gongyingshangmingcheng
+        FROM v1.ruku r LEFT JOIN kucun k ON k.bianhao = r.bianhao
+        ORDER BY r.rowid
+    '''),
+    ("chuku", f'''
+        INSERT INTO chuku (chukubianhao, kucun_id, huowubianhao, shuliang, mingcheng, chukuriqi, danjia_fen)
+        SELECT h.chukubianhao, k.id, h.huowubianhao, CAST(h.shuliang AS INTEGER), h.mingcheng,
+               {v1_date("h.chukuriqi")}, {v1_cents("h.danjia")}
+        FROM v1.chuku h LEFT JOIN kucun k ON k.bianhao = h.bianhao
+        ORDER BY h.rowid
+    '''),
+    ("gongying", '''
+        INSERT INTO gongying (gongyingshang_id, cangku_id)
+        SELECT s.id, c.id
+        FROM v1.gongying g
+        JOIN gongyingshang s ON s.gongyingshangbianhao = g.gongyingshangbianhao
+        JOIN cangku c ON c.cangkumingcheng = g.cangkumingcheng
+        ORDER BY s.id, c.id
+    '''),
+    ("cangkuhuizong", '''
+        INSERT INTO cangkuhuizong (cangku_id, kucunzhonglei, zongshuliang, zongjiazhi_fen)
+        SELECT c.id, COUNT(k.id), COALESCE(SUM(k.shuliang), 0), COALESCE(SUM(k.shuliang * k.danjia_fen), 0)
+        FROM cangku c LEFT JOIN kucun k ON k.cangku_id = c.id
+        GROUP BY c.id
+    '''),
+]
+
+# 迁移后的核对：(说明, v1中的SQL, v2中的SQL)，结果不一致说明有值未能转换
+MIGRATION_V2_CHECKS: List[Tuple[str, str, str]] = [
+    ("仓库的操作员", "SELECT COUNT(*) FROM v1.cangku WHERE xingming IS NOT NULL",
+     "SELECT COUNT(*) FROM cangku WHERE caozuoyuan_id IS NOT NULL"),
+    ("仓库创建日期", "SELECT COUNT(*) FROM v1.cangku WHERE cangkuchuangjianriqi IS NOT NULL",
+     "SELECT COUNT(*) FROM cangku WHERE chuangjianriqi IS NOT NULL"),
+    ("库存的仓库", "SELECT COUNT(*) FROM v1.kucun WHERE cangkumingcheng IS NOT NULL",
+     "SELECT COUNT(*) FROM kucun WHERE cangku_id IS NOT NULL"),
+    ("库存总数量", "SELECT COALESCE(SUM(shuliang), 0) FROM v1.kucun",
+     "SELECT COALESCE(SUM(shuliang), 0) FROM kucun"),
+    ("入库的库存编号", "SELECT COUNT(*) FROM v1.ruku WHERE bianhao IS NOT NULL",
+     "SELECT COUNT(*) FROM ruku WHERE kucun_id IS NOT NULL"),
+    ("入库日期", "SELECT COUNT(*) FROM v1.ruku WHERE rukuriqi IS NOT NULL",
+     "SELECT COUNT(*) FROM ruku WHERE rukuriqi IS NOT NULL"),
+    ("出库的库存编号", "SELECT COUNT(*) FROM v1.chuku WHERE bianhao IS NOT NULL",
+     "SELECT COUNT(*) FROM chuku WHERE kucun_id IS NOT NULL"),
+    ("出库日期", "SELECT COUNT(*) FROM v1.chuku WHERE chukuriqi IS NOT NULL",
+     "SELECT COUNT(*) FROM chuku WHERE chukuriqi IS NOT NULL"),
+    ("供应关系", "SELECT COUNT(*) FROM v1.gongying", "SELECT COUNT(*) FROM gongying"),
+]
+
+
+def is_v2_database(conn: sqlite3.Connection) -> bool:
+    """数据库是否为v2类型化结构"""
+    return conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_V2_VERSION
+
+
+def read_only_uri(path: str) -> str:
+    """只读打开数据库文件的URI（mode=ro，不改变文件头中的日志模式等持久设置）"""
+    return f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+
+
+def migrate_to_v2(source_path: str, target_path: str, overwrite: bool = False) -> Dict:
+    """
+    把v1数据库一次性迁移为v2结构的新文件，原数据库不做任何修改
+
+    在临时文件中以关闭日志的方式批量导入（中途失败直接丢弃临时文件），
+    全部完成并核对后再改名为target_path，之后按默认连接配置切换为WAL模式。
+    流水归档文件（ledger_archive）保持v1结构，不在迁移范围内。
+
+    Args:
+        source_path: v1数据库文件
+        target_path: 新建的v2数据库文件
+        overwrite: target_path已存在时是否覆盖
+
+    Returns:
+        {"rows": {表名: 行数}, "checks": {核对项: (v1值, v2值)}, "mismatches": [不一致的核对项],
+         "value": (v1浮点总价值, v2按分计算的总价值), "size": (v1字节数, v2字节数)}
+    """
+    if os.path.exists(target_path) and not overwrite:
+        raise FileExistsError(f"目标文件已存在: {target_path}")
+
+    # 原数据库只读打开：连接预设会执行 PRAGMA journal_mode=WAL，永久改写文件头
+    source = sqlite3.connect(read_only_uri(source_path), uri=True)
+    try:
+        if not has_base_tables(source):
+            raise ValueError(f"{source_path} 不是v1结构的仓库数据库")
+        if is_v2_database(source):
+            raise ValueError(f"{source_path} 已经是v2结构")
+    finally:
+        source.close()
+
+    temp_path = f"{target_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("ATTACH DATABASE ? AS v1", (read_only_uri(source_path),))
+        conn.execute("BEGIN")
+        for statement in SCHEMA_V2_TABLES:
+            conn.execute(statement)
+        rows = {}
+        for table, statement in MIGRATION_V2_STEPS:
+            rows[table] = conn.execute(statement).rowcount
+        for statement in SCHEMA_V2_INDEXES_AND_TRIGGERS + SCHEMA_V2_VIEWS:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_V2_VERSION}")
+        conn.commit()
+
+        checks = {}
+        for description, v1_sql, v2_sql in MIGRATION_V2_CHECKS:
+            checks[description] = (conn.execute(v1_sql).fetchone()[0], conn.execute(v2_sql).fetchone()[0])
+        value = (
+            conn.execute("SELECT COALESCE(SUM(shuliang * danjia), 0) FROM v1.kucun").fetchone()[0],
+            conn.execute("SELECT COALESCE(SUM(zongjiazhi_fen), 0) FROM cangkuhuizong").fetchone()[0] / 100,
+        )
+        # v1可能处于WAL模式且尚未检查点，按页数计算实际大小
+        source_size = (conn.execute("PRAGMA v1.page_count").fetchone()[0]
+                       * conn.execute("PRAGMA v1.page_size").fetchone()[0])
+        conn.execute("ANALYZE main")
+        conn.commit()
+        conn.execute("DETACH DATABASE v1")
+    except Exception:
+        conn.close()
+        os.remove(temp_path)
+        raise
+    conn.close()
+
+    os.replace(temp_path, target_path)
+    # 切换为与v1相同的默认连接配置（WAL）
+    open_connection(target_path).close()
+    return {
+        "rows": rows,
+        "checks": checks,
+        "mismatches": [name for name, (old, new) in checks.items() if old != new],
+        "value": value,
+        "size": (source_size, os.path.getsize(target_path)),
+    }
+
+
+def print_migration_report(report: Dict):
+    """打印迁移结果"""
+    for table in BASE_TABLES + ("cangkuhuizong",):
+        print(f"  {table:<16} {report['rows'].get(table, 0):>10} 行")
+    for name in report["mismatches"]:
+        old, new = report["checks"][name]
+        print(f"❌ {name}: v1 {old} / v2 {new}（未能转换的值已置为NULL）")
+    old_value, new_value = report["value"]
+    print(f"📊 库存总价值: v1 {old_value:.2f} / v2 {new_value:.2f}")
+    old_size, new_size = report["size"]
+    print(f"📊 文件大小: v1 {old_size / 1024:.1f} KB / v2 {new_size / 1024:.1f} KB")
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仓库管理系统 - 异步HTTP服务
+功能：基于asyncio的本地HTTP/JSON接口（入库、出库、库存查询、仓库汇总），供扫码枪等大量并发客户端调用；
+      写操作进入有界队列，由唯一的写线程分组提交（见group_commit），读操作在有界的读线程池中并行执行，
+      库存查询和汇总直接由内存库存缓存给出，汇总结果按缓存版本缓存
+作者：AI Assistant
+日期：2024
+"""
+
+import asyncio
+import json
+import queue
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from group_commit import GroupCommitWriter
+from warehouse_manager_tool import WarehouseManagerTool
+
+# 请求体上限（字节）
+MAX_BODY_SIZE = 1024 * 1024
+
+# 请求头行数上限
+MAX_HEADER_LINES = 100
+
+# 空闲连接保持时间（秒）
+KEEP_ALIVE_TIMEOUT = 30.0
+
+# 流水查询：接口名称 -> (表名, [(数据库列, 返回的字段名)])
+LEDGER_ENDPOINTS = {
+    "inbound": ("ruku", [("rukubianhao", "inbound_code"), ("bianhao", "inventory_code"),
+                         ("huowubianhao", "goods_code"), ("shuliang", "quantity"), ("mingcheng", "name"),
+                         ("danjia", "price"), ("rukuriqi", "date"), ("gongyingshangmingcheng", "supplier")]),
+    "outbound": ("chuku", [("chukubianhao", "outbound_code"), ("bianhao", "inventory_code"),
+                           ("huowubianhao", "goods_code"), ("shuliang", "quantity"), ("mingcheng", "name"),
+                           ("danjia", "price"), ("chukuriqi", "date")]),
+}
+
+
+class ServiceBusy(Exception):
+    """写队列已满"""
+
+
+class HttpError(Exception):
+    """以指定状态码结束请求"""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class WarehouseService:
+    """包装WarehouseManagerTool的异步服务：一个分组提交写线程 + 有界读线程池 + 内存库存缓存"""
+
+    def __init__(self, db_path: str = "warehouse.db", excel_path: str = "warehouse_report.xlsx",
+                 readers: int = 4, queue_size: int = 1000, report_delay: Optional[float] = 5.0,
+                 sync_interval: float = 1.0, profile: str = "durable", auto_report: bool = True,
+                 max_batch: int = 500, max_delay: float = 0.0, journal_dir: Optional[str] = None):
+        """
+        Args:
+            db_path: 数据库文件路径
+            excel_path: Excel报表文件路径
+            readers: 只读连接和读线程的数量
+            queue_size: 写队列的最大长度，队列满时新的写请求返回503
+            report_delay: Excel报表合并窗口（秒），服务中不宜同步重建报表
+            sync_interval: 检查其他进程写入（data_version）并同步库存缓存的间隔（秒）
+            profile: 写连接的SQLite连接配置
+            auto_report: 写操作后是否自动更新Excel报表
+            max_batch: 每个事务最多合并的写操作数
+            max_delay: 每轮收到第一个写操作后最多再等待的秒数，0表示只合并已在排队的操作
+            journal_dir: 操作日志和库存快照目录，每组提交后追加一次日志
+        """
+        self.readers = readers
+        self.queue_size = queue_size
+        self.sync_interval = sync_interval
+        self.tool = WarehouseManagerTool(db_path, excel_path, report_delay=report_delay, profile=profile,
+                                         pool_readers=readers, stock_cache=True, auto_report=auto_report,
+                                         journal_dir=journal_dir)
+        self.writer = GroupCommitWriter(self.tool, max_batch=max_batch, max_delay=max_delay,
+                                        max_pending=queue_size)
+        self.reader_executor: Optional[ThreadPoolExecutor] = None
+        self.read_slots: Optional[asyncio.Semaphore] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._tasks: List[asyncio.Task] = []
+        self._summary: Optional[Tuple[int, Dict]] = None
+        self.started = time.time()
+        self.counters = {"requests": 0, "rejected": 0, "errors": 0}
+
+    # ------------------------------------------------------------------ 生命周期
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        """连接数据库、启动写线程和HTTP监听"""
+        self.reader_executor = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="warehouse-reader")
+        # 等待读线程的请求数有上限，超出的请求在事件循环中排队，不在线程池里无限堆积
+        self.read_slots = asyncio.Semaphore(self.readers * 2)
+        # 连接时完成结构升级和库存缓存加载，不阻塞事件循环
+        if not await asyncio.get_running_loop().run_in_executor(None, self.tool.connect_database):
+            raise RuntimeError(f"无法连接数据库: {self.tool.db_path}")
+        self.writer.start()
+        self._tasks = [asyncio.create_task(self._sync_loop())]
+        self.server = await asyncio.start_server(self._handle_connection, host, port,
+                                                 limit=MAX_BODY_SIZE, backlog=1024)
+        self.started = time.time()
+
+    async def stop(self):
+        """停止监听，执行完队列中已接受的写操作后关闭数据库"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.writer.stop)
+        await loop.run_in_executor(None, self.tool.close_database)
+        if self.reader_executor:
+            self.reader_executor.shutdown(wait=True)
+
+    # ------------------------------------------------------------------ 写操作
+
+    async def submit(self, operations: Sequence[Tuple[str, object]],
+                     atomic: bool = False) -> List[Tuple[str, bool, str]]:
+        """
+        把一组入库/出库操作放入写队列并等待执行结果
+
+        Raises:
+            ServiceBusy: 写队列已满
+        """
+        try:
+            future = self.writer.submit_many(operations, atomic)
+        except queue.Full:
+            self.counters["rejected"] += 1
+            raise ServiceBusy(f"写队列已满（{self.queue_size}）")
+        return await asyncio.wrap_future(future)
+
+    async def _sync_loop(self):
+        """定期检查其他进程的写入；本服务的写入已写穿到缓存，查询时无需逐次检查"""
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.run_read(self.tool.sync_stock_cache)
+            except Exception as e:
+                print(f"❌ 同步库存缓存失败: {e}")
+
+    # ------------------------------------------------------------------ 读操作
+
+    async def run_read(self, function, *args):
+        """在读线程池中执行阻塞的查询"""
+        async with self.read_slots:
+            return await asyncio.get_running_loop().run_in_executor(self.reader_executor, function, *args)
+
+    def stock(self, inventory_code: str) -> Optional[Dict]:
+        """从库存缓存查询一个库存编号"""
+        item = self.tool.stock_cache.get(inventory_code)
+        if item is None:
+            return None
+        quantity, price = item
+        return {"inventory_code": inventory_code, "quantity": quantity, "price": price}
+
+    async def summary(self) -> Dict:
+        """仓库汇总，缓存内容不变（version相同）时直接返回上次的结果"""
+        cache = self.tool.stock_cache
+        version = cache.version
+        if self._summary is None or self._summary[0] != version:
+            rows = await self.run_read(cache.summary)
+            warehouses = [
+                {"warehouse": name, "kinds": kinds, "quantity": quantity, "value": round(value, 2)}
+                for name, kinds, quantity, value in rows
+            ]
+            self._summary = (version, {
+                "warehouses": warehouses,
+                "total_quantity": sum(row["quantity"] for row in warehouses),
+                "total_value": round(sum(row["value"] for row in warehouses), 2),
+            })
+        return self._summary[1]
+
+    def ledger_record(self, table: str, columns: List[Tuple[str, str]], code: str) -> Optional[Dict]:
+        """按编号查询一条入库/出库流水（读线程中执行）"""
+        with self.tool.read_cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(column for column, _ in columns)} FROM {table} "
+                           f"WHERE {columns[0][0]} = ?", (code,))
+            row = cursor.fetchone()
+        return dict(zip((name for _, name in columns), row)) if row else None
+
+    def status(self) -> Dict:
+        """服务运行状态"""
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "queue_size": self.queue_size,
+            "writer": self.writer.stats(),
+            "readers": self.readers,
+            "stock_items": len(self.tool.stock_cache),
+            **self.counters,
+        }
+
+    # ------------------------------------------------------------------ 路由
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[HTTPStatus, Dict]:
+        """按方法和路径处理请求，返回 (状态码, JSON对象)"""
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+
+        if method == "GET":
+            if parts == ["health"]:
+                return HTTPStatus.OK, {"ok": True}
+            if parts == ["stats"]:
+                return HTTPStatus.OK, {"ok": True, "service": self.status(), "timing": self.tool.stats()}
+            if parts == ["summary"]:
+                return HTTPStatus.OK, {"ok": True, **await self.summary()}
+            if len(parts) == 2 and parts[0] == "stock":
+                item = self.stock(parts[1])
+                if item is None:
+                    raise HttpError(HTTPStatus.NOT_FOUND, f"库存编号不存在: {parts[1]}")
+                return HTTPStatus.OK, {"ok": True, **item}
+            if parts == ["stock"]:
+                codes = parse_qs(url.query).get("code", [])
+                return HTTPStatus.OK, {"ok": True, "items": [self.stock(code) for code in codes]}
+            if len(parts) == 2 and parts[0] in LEDGER_ENDPOINTS:
+                record = await self.run_read(self.ledger_record, *LEDGER_ENDPOINTS[parts[0]], parts[1])
+                if record is None:
+                    raise HttpError(HTTPStatus.NOT_FOUND, f"流水编号不存在: {parts[1]}")
+                return HTTPStatus.OK, {"ok": True, **record}
+            raise HttpError(HTTPStatus.NOT_FOUND, f"未知的接口: {url.path}")
+
+        if method == "POST":
+            payload = parse_json(body)
+            if len(parts) == 1 and parts[0] in LEDGER_ENDPOINTS:
+                if not isinstance(payload, dict):
+                    raise HttpError(HTTPStatus.BAD_REQUEST, "请求体应为JSON对象")
+                code, ok, message = (await self.submit([(parts[0], payload)]))[0]
+                status = HTTPStatus.OK if ok else HTTPStatus.UNPROCESSABLE_ENTITY
+                return status, {"ok": ok, "code": code, "message": message}
+            if parts == ["operations"]:
+                operations = payload.get("operations") if isinstance(payload, dict) else None
+                if not isinstance(operations, list) or not all(
+                        isinstance(op, dict) and isinstance(op.get("params"), dict) for op in operations):
+                    raise HttpError(HTTPStatus.BAD_REQUEST,
+                                    '请求体应为 {"operations": [{"type": ..., "params": {...}}], "atomic": false}')
+                results = await self.submit([(op.get("type"), op["params"]) for op in operations],
+                                            atomic=bool(payload.get("atomic")))
+                return HTTPStatus.OK, {
+                    "ok": all(ok for _, ok, _ in results),
+                    "results": [{"code": code, "ok": ok, "message": message} for code, ok, message in results],
+                }
+            raise HttpError(HTTPStatus.NOT_FOUND, f"未知的接口: {url.path}")
+
+        raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"不支持的方法: {method}")
+
+    # ------------------------------------------------------------------ HTTP
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """一个客户端连接：HTTP/1.1，支持keep-alive，按顺序处理请求"""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except HttpError as e:
+                    await write_response(writer, e.status, {"ok": False, "error": e.message}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                method, target, keep_alive, body = request
+                self.counters["requests"] += 1
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {"ok": False, "error": e.message}
+                except ServiceBusy as e:
+                    status, payload = HTTPStatus.SERVICE_UNAVAILABLE, {"ok": False, "error": str(e)}
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"ok": False, "error": str(e)}
+                await write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def parse_json(body: bytes):
+    """解析JSON请求体"""
+    try:
+        return json.loads(body.decode("utf-8")) if body else {}
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"请求体不是有效的JSON: {e}")
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bool, bytes]]:
+    """
+    读取一个HTTP请求
+
+    Returns:
+        (方法, 路径, 是否保持连接, 请求体)，客户端已关闭连接时返回None
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "请求行格式错误")
+
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "请求头过多")
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(HTTPStatus.LENGTH_REQUIRED, "请使用Content-Length发送请求体")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length无效")
+    if length < 0:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length无效")
+    if length > MAX_BODY_SIZE:
+        raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"请求体超过 {MAX_BODY_SIZE} 字节")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method.upper(), target, keep_alive, body
+
+
+async def write_response(writer: asyncio.StreamWriter, status: HTTPStatus, payload: Dict, keep_alive: bool):
+    """写出JSON响应"""
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = [
+        f"HTTP/1.1 {status.value} {status.phrase}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == HTTPStatus.SERVICE_UNAVAILABLE:
+        headers.append("Retry-After: 1")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(service: WarehouseService, host: str = "127.0.0.1", port: int = 8080):
+    """启动服务并一直运行，收到SIGINT/SIGTERM后停止"""
+    await service.start(host, port)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):  # Windows不支持add_signal_handler
+            pass
+    print(f"✅ 仓库服务已启动: http://{host}:{port}（读线程 {service.readers}，写队列 {service.queue_size}）")
+    try:
+        await stop_event.wait()
+    finally:
+        await service.stop()
+        print("🔒 仓库服务已停止")
+
+
+def run_service(db_path: str = "warehouse.db", excel_path: str = "warehouse_report.xlsx",
+                host: str = "127.0.0.1", port: int = 8080, **options) -> int:
+    """同步入口：运行服务直到被中断，options传给WarehouseService"""
+    try:
+        asyncio.run(serve(WarehouseService(db_path, excel_path, **options), host, port))
+        return 0
+    except KeyboardInterrupt:
+        return 0
+    except Exception as e:
+        print(f"❌ 仓库服务启动失败: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(run_service())